@@ -1,15 +1,38 @@
+"""Serverless (Vercel) entry point.
+
+Kept lean for cold starts: only the extract and download routes are mounted, and the services
+import PyMuPDF, pdfplumber, openpyxl, httpx, numpy and google.generativeai on first use.
+Cheap singletons (compiled templates, LLM client objects) are created during init so the
+first request does not pay for them. bench/import_budget.py guards the import time.
+"""
+import os
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.routes.extract import router as extract_router
 from app.routes.download import router as download_router
-from app.settings import settings
+from app.services.llm_client import get_gemini_client, get_openai_client
+from app.services.templates import load_template
+
+WARM_TEMPLATES = ("template1", "template2")
+
+
+def warm_up() -> None:
+    for template_id in WARM_TEMPLATES:
+        try:
+            load_template(template_id)
+        except FileNotFoundError:
+            pass
+    # Client objects only; their HTTP pool / SDK are created on the first LLM call
+    get_openai_client()
+    get_gemini_client()
+
 
 app = FastAPI(title="PDF Data Extraction API", version="1.0.0")
 
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=[settings.FRONTEND_ORIGIN, "https://*.vercel.app"],
+    allow_origins=[os.getenv("FRONTEND_ORIGIN", "http://localhost:5173"), "https://*.vercel.app"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
@@ -23,5 +46,7 @@ app.include_router(download_router, prefix="/api")
 async def health_check():
     return {"status": "ok"}
 
+warm_up()
+
 # For Vercel serverless
 handler = app
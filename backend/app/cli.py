@@ -0,0 +1,397 @@
+"""Offline bulk extraction over a directory of PDFs.
+
+Run from backend/:
+
+    python -m app.cli /data/pdfs --template my_template
+    python -m app.cli /data/pdfs --template my_template --format parquet --llm-concurrency 16
+    python -m app.cli /data/pdfs --template my_template --restart   # ignore the checkpoint
+
+Files go through a pipeline of stages connected by bounded queues, so every stage stays busy:
+hashing (threads), text and table extraction (the PDF process pool) and structured extraction (bounded
+LLM concurrency, at batch priority). Each finished file is appended to a checkpoint manifest;
+a rerun skips files whose content hash already completed with the same template, so a crash
+does not redo finished work. The rows of all files are then written as one output file, and a
+throughput summary is printed.
+"""
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, TextIO
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+from dotenv import load_dotenv
+from .services.batching import get_document_batcher
+from .services.cache import get_rows_cache, template_content_hash
+from .services.chunking import CHARS_PER_TOKEN
+from .services.lineage import MergeReport
+from .services.llm_client import shutdown_llm_clients
+from .services.llm_scheduler import get_scheduler_stats, llm_priority
+from .services.metrics import PAGE_BYTES_DROPPED
+from .services.output_formats import OUTPUT_FORMATS, write_output
+from .services.pdf_extractor import PdfTable, shutdown_process_pool
+from .services.pipeline import get_page_tables, get_page_texts, rows_cache_key, rows_from_pages_with_report, uses_first_result_only
+from .services.templates import load_template
+from .services.uploads import SpooledUpload, spooled_from_path
+from .settings import get_data_dir, get_output_dir, get_pdf_workers
+
+DEFAULT_LLM_CONCURRENCY = 8
+
+# Files hashed or parsed ahead of the next stage; bounds memory held by parsed page texts
+QUEUE_DEPTH = 32
+
+OK = "ok"
+FAILED = "failed"
+
+
+class Manifest:
+    """Append-only JSON-lines checkpoint: one record per finished (or failed) file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file: Optional[TextIO] = None
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        records: Dict[str, Dict[str, Any]] = {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # Torn last line from a crash mid-write
+                    records[record["path"]] = record
+        except FileNotFoundError:
+            pass
+        return records
+
+    def reset(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def append(self, record: Dict[str, Any]) -> None:
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+@dataclass
+class _Work:
+    rel: str
+    upload: SpooledUpload
+    pages: List[str] = field(default_factory=list)
+    tables: List[PdfTable] = field(default_factory=list)
+    rows: Optional[List[Dict[str, Any]]] = None
+    report: Optional[MergeReport] = None
+    error: Optional[str] = None
+    cached: bool = False
+    started: float = field(default_factory=time.perf_counter)
+
+
+@dataclass
+class _Totals:
+    files: int = 0
+    resumed: int = 0
+    extracted: int = 0
+    cached: int = 0
+    failed: int = 0
+    no_text: int = 0
+    revised: int = 0
+    fields_refreshed: int = 0
+    fields_reused: int = 0
+    pages: int = 0
+    rows: int = 0
+    bytes: int = 0
+    stage_s: Dict[str, float] = field(default_factory=lambda: {"hash": 0.0, "parse": 0.0, "llm": 0.0, "checkpoint": 0.0})
+
+
+def find_pdfs(root: str, recursive: bool = True) -> List[str]:
+    """PDF paths under ``root`` relative to it, sorted so output order is stable across runs."""
+    found: List[str] = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith(".")) if recursive else []
+        for name in filenames:
+            if name.lower().endswith(".pdf"):
+                found.append(os.path.relpath(os.path.join(dirpath, name), root))
+    return sorted(found)
+
+
+def default_manifest_path(root: str, template_id: str) -> str:
+    digest = hashlib.sha256(os.path.abspath(root).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(get_data_dir(), "bulk", f"{template_id}_{digest}.jsonl")
+
+
+class BulkRun:
+    def __init__(
+        self,
+        root: str,
+        template: Dict[str, Any],
+        manifest: Manifest,
+        parse_workers: int,
+        llm_concurrency: int,
+        quiet: bool = False,
+    ):
+        self.root = root
+        self.template = template
+        self.template_hash = template_content_hash(template)
+        self.manifest = manifest
+        self.parse_workers = max(1, parse_workers)
+        self.llm_concurrency = max(1, llm_concurrency)
+        self.quiet = quiet
+        self.totals = _Totals()
+        self.records: Dict[str, Dict[str, Any]] = {}
+
+    def _log(self, message: str) -> None:
+        if not self.quiet:
+            print(message, file=sys.stderr, flush=True)
+
+    def _is_done(self, record: Optional[Dict[str, Any]], sha256: str) -> bool:
+        return (
+            record is not None
+            and record.get("status") == OK
+            and record.get("sha256") == sha256
+            and record.get("template_hash") == self.template_hash
+        )
+
+    async def _hash_stage(self, paths: List[str], previous: Dict[str, Dict[str, Any]], parse_q: asyncio.Queue, done_q: asyncio.Queue) -> None:
+        rows_cache = get_rows_cache()
+        for rel in paths:
+            t0 = time.perf_counter()
+            try:
+                upload = await asyncio.to_thread(spooled_from_path, os.path.join(self.root, rel), rel)
+            except OSError as e:
+                await done_q.put(_Work(rel, SpooledUpload(rel, "", 0, ""), error=str(e)))
+                continue
+            finally:
+                self.totals.stage_s["hash"] += time.perf_counter() - t0
+            self.totals.bytes += upload.size
+            if self._is_done(previous.get(rel), upload.sha256):
+                self.records[rel] = previous[rel]
+                self.totals.resumed += 1
+                continue
+            work = _Work(rel, upload)
+            # Another run (or the API) already extracted this exact file with this template
+            work.rows = await rows_cache.aget(rows_cache_key(upload.sha256, self.template))
+            work.cached = work.rows is not None
+            await (done_q if work.cached else parse_q).put(work)
+
+    async def _parse_worker(self, parse_q: asyncio.Queue, llm_q: asyncio.Queue, done_q: asyncio.Queue) -> None:
+        while True:
+            work: _Work = await parse_q.get()
+            t0 = time.perf_counter()
+            try:
+                work.pages = await get_page_texts(work.upload)
+                work.tables = await get_page_tables(work.upload, work.pages, self.template)
+            except Exception as e:
+                work.error = f"text extraction failed: {e!r}"
+            self.totals.stage_s["parse"] += time.perf_counter() - t0
+            await (done_q if work.error else llm_q).put(work)
+            parse_q.task_done()
+
+    async def _llm_worker(self, llm_q: asyncio.Queue, done_q: asyncio.Queue) -> None:
+        while True:
+            work: _Work = await llm_q.get()
+            t0 = time.perf_counter()
+            try:
+                with get_document_batcher().in_flight():
+                    work.rows, work.report = await rows_from_pages_with_report(
+                        work.pages, work.upload.sha256, self.template, work.tables, work.upload.filename
+                    )
+            except Exception as e:
+                work.error = f"structured extraction failed: {e!r}"
+            self.totals.stage_s["llm"] += time.perf_counter() - t0
+            await done_q.put(work)
+            llm_q.task_done()
+
+    async def _checkpoint_worker(self, done_q: asyncio.Queue) -> None:
+        width = len(str(self.totals.files))
+        while True:
+            work: _Work = await done_q.get()
+            t0 = time.perf_counter()
+            status_note = ""
+            record = {
+                "path": work.rel,
+                "sha256": work.upload.sha256,
+                "size": work.upload.size,
+                "template_hash": self.template_hash,
+                "status": FAILED if work.error else OK,
+                "pages": len(work.pages),
+                "rows": work.rows or [],
+                "ms": round((time.perf_counter() - work.started) * 1000, 1),
+                "finished_at": time.time(),
+            }
+            if work.error:
+                record["error"] = work.error
+            if work.report is not None:
+                record["incremental"] = asdict(work.report)
+            await asyncio.to_thread(self.manifest.append, record)
+            self.records[work.rel] = record
+            self.totals.stage_s["checkpoint"] += time.perf_counter() - t0
+
+            if work.error:
+                self.totals.failed += 1
+            elif work.cached:
+                self.totals.cached += 1
+            else:
+                self.totals.extracted += 1
+                if work.report is not None:
+                    self.totals.revised += 1
+                    self.totals.fields_refreshed += len(work.report.refreshed)
+                    self.totals.fields_reused += len(work.report.reused)
+                    status_note = f" (revision: {len(work.report.pages_changed)} pages changed, {len(work.report.refreshed)} fields refreshed)"
+                # Scanned or broken PDFs still complete (with whatever the fallbacks produce); flag them
+                if not any(p.strip() for p in work.pages):
+                    self.totals.no_text += 1
+                    status_note = " (no extractable text)"
+            self.totals.pages += len(work.pages)
+            t = self.totals
+            finished = t.resumed + t.extracted + t.cached + t.failed
+            status = f"FAILED {work.error}" if work.error else f"{len(record['rows'])} rows, {record['ms'] / 1000:.1f} s{status_note}"
+            self._log(f"[{finished:>{width}}/{t.files}] {work.rel}: {status}")
+            done_q.task_done()
+
+    async def run(self, paths: List[str], previous: Dict[str, Dict[str, Any]]) -> None:
+        self.totals.files = len(paths)
+        parse_q: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_DEPTH)
+        llm_q: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_DEPTH)
+        done_q: asyncio.Queue = asyncio.Queue()
+
+        workers = [asyncio.create_task(self._parse_worker(parse_q, llm_q, done_q)) for _ in range(self.parse_workers)]
+        workers += [asyncio.create_task(self._llm_worker(llm_q, done_q)) for _ in range(self.llm_concurrency)]
+        workers.append(asyncio.create_task(self._checkpoint_worker(done_q)))
+        try:
+            # Bulk runs yield LLM capacity to interactive requests sharing the scheduler
+            with llm_priority("batch"):
+                await self._hash_stage(paths, previous, parse_q, done_q)
+                # Each queue drains only after the one feeding it has
+                await parse_q.join()
+                await llm_q.join()
+                await done_q.join()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    def collected_rows(self, paths: List[str]) -> List[Dict[str, Any]]:
+        """Rows of every completed file (this run and earlier ones), in path order."""
+        rows: List[Dict[str, Any]] = []
+        for rel in paths:
+            record = self.records.get(rel)
+            if record is not None and record.get("status") == OK:
+                rows.extend(record.get("rows") or [])
+        self.totals.rows = len(rows)
+        return rows
+
+
+def format_summary(totals: _Totals, wall_s: float, output_path: Optional[str], manifest_path: str) -> str:
+    processed = totals.extracted + totals.cached + totals.failed
+    wall = max(wall_s, 1e-9)
+    lines = [
+        f"Files:      {totals.files} total, {totals.extracted} extracted, {totals.cached} from rows cache, "
+        f"{totals.resumed} resumed from checkpoint, {totals.failed} failed, {totals.no_text} without extractable text",
+        f"Pages:      {totals.pages} parsed; {totals.rows} rows collected",
+        f"Wall time:  {wall_s:.1f} s; {processed / wall:.2f} files/s, {totals.pages / wall:.1f} pages/s, "
+        f"{totals.bytes / (1024 * 1024) / wall:.1f} MB/s hashed",
+        "Stage time: " + ", ".join(f"{name} {seconds:.1f} s" for name, seconds in totals.stage_s.items())
+        + " (summed over concurrent workers)",
+    ]
+    if totals.revised:
+        lines.append(
+            f"Revisions:  {totals.revised} files re-prompted on changed pages only; "
+            f"{totals.fields_refreshed} fields refreshed, {totals.fields_reused} reused"
+        )
+    dropped = PAGE_BYTES_DROPPED.total()
+    if dropped:
+        lines.append(f"Page filter: {dropped / 1024:.1f} KB of boilerplate pages left out of prompts (~{dropped / CHARS_PER_TOKEN:.0f} tokens)")
+    for provider, stats in get_scheduler_stats().items():
+        lines.append(
+            f"LLM {provider}: {stats['calls']} calls, {stats['retries']} retries, "
+            f"{stats['rate_limited']} rate limited, {stats['queued_ms'] / 1000:.1f} s queued"
+        )
+    if output_path:
+        lines.append(f"Output:     {output_path}")
+    lines.append(f"Checkpoint: {manifest_path}")
+    return "\n".join(lines)
+
+
+async def _main_async(args: argparse.Namespace) -> int:
+    root = os.path.abspath(args.input_dir)
+    if not os.path.isdir(root):
+        print(f"Not a directory: {args.input_dir}", file=sys.stderr)
+        return 2
+    try:
+        template = load_template(args.template)
+    except FileNotFoundError as e:
+        print(str(e), file=sys.stderr)
+        return 2
+
+    paths = find_pdfs(root, recursive=not args.no_recursive)
+    if uses_first_result_only(template) and len(paths) > 1:
+        print(f"{args.template} only uses the first file's rows; processing {paths[0]} only", file=sys.stderr)
+        paths = paths[:1]
+
+    manifest = Manifest(args.manifest or default_manifest_path(root, args.template))
+    if args.restart:
+        manifest.reset()
+    previous = manifest.load()
+
+    bulk = BulkRun(root, template, manifest, args.parse_workers, args.llm_concurrency, quiet=args.quiet)
+    t0 = time.perf_counter()
+    try:
+        await bulk.run(paths, previous)
+    finally:
+        manifest.close()
+        await shutdown_llm_clients()
+        shutdown_process_pool()
+
+    output_path = None
+    rows = bulk.collected_rows(paths)
+    if not args.no_output and rows:
+        filename, content = await asyncio.to_thread(write_output, rows, template, args.format)
+        output_path = os.path.join(get_output_dir(), filename)
+        await asyncio.to_thread(_write_file, output_path, content)
+    wall_s = time.perf_counter() - t0
+
+    print(format_summary(bulk.totals, wall_s, output_path, manifest.path))
+    return 1 if bulk.totals.failed else 0
+
+
+def _write_file(path: str, content: bytes) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    load_dotenv()
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Extract every PDF in a directory in one batch")
+    parser.add_argument("input_dir", help="directory of PDFs (searched recursively)")
+    parser.add_argument("--template", required=True, help="template id")
+    parser.add_argument("--format", default="xlsx", choices=OUTPUT_FORMATS, help="output format")
+    parser.add_argument("--output-dir", default=None, help="where the output file is written (default: OUTPUT_DIR)")
+    parser.add_argument("--manifest", default=None, help="checkpoint manifest path (default: under DATA_DIR/bulk/)")
+    parser.add_argument("--restart", action="store_true", help="discard the checkpoint and extract every file again")
+    parser.add_argument("--parse-workers", type=int, default=get_pdf_workers(), help="files parsed at once (default: PDF_WORKERS)")
+    parser.add_argument("--llm-concurrency", type=int, default=DEFAULT_LLM_CONCURRENCY, help="files in structured extraction at once")
+    parser.add_argument("--no-recursive", action="store_true", help="only read PDFs directly in input_dir")
+    parser.add_argument("--no-output", action="store_true", help="only fill the checkpoint, do not write the output file")
+    parser.add_argument("--quiet", action="store_true", help="no per-file progress lines")
+    args = parser.parse_args(argv)
+    if args.output_dir:
+        # The output writers read OUTPUT_DIR
+        os.environ["OUTPUT_DIR"] = args.output_dir
+    return asyncio.run(_main_async(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
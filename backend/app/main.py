@@ -2,16 +2,37 @@ from fastapi import FastAPI, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
+from contextlib import asynccontextmanager
 from typing import List
 import os
 from dotenv import load_dotenv
 
 from .routes import extract as extract_route
 from .routes import download as download_route
+from .routes import jobs as jobs_route
+from .routes import events as events_route
+from .routes import metrics as metrics_route
+from .services.llm_client import startup_llm_clients, shutdown_llm_clients
+from .services.pdf_extractor import shutdown_process_pool
+from .services.jobs import start_job_workers, stop_job_workers
 
 load_dotenv()
 
-app = FastAPI(title="PDF Extraction Tool API", version="0.1.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pooled LLM clients live as long as the app so connections are reused across requests
+    await startup_llm_clients()
+    await start_job_workers()
+    try:
+        yield
+    finally:
+        await stop_job_workers()
+        await shutdown_llm_clients()
+        shutdown_process_pool()
+
+
+app = FastAPI(title="PDF Extraction Tool API", version="0.1.0", lifespan=lifespan)
 
 frontend_origin = os.getenv("FRONTEND_ORIGIN", "http://localhost:5173")
 
@@ -41,6 +62,11 @@ async def api_health():
 
 app.include_router(extract_route.router, prefix="/api")
 app.include_router(download_route.router, prefix="/api")
+app.include_router(jobs_route.router, prefix="/api")
+app.include_router(events_route.router, prefix="/api")
+# Prometheus scrapes /metrics at the root, next to /health
+app.include_router(metrics_route.router)
+app.add_middleware(metrics_route.MetricsMiddleware)
 
 
 
@@ -1,43 +1,87 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, Response
+from typing import Optional, Tuple
 import os
-import tempfile
-import io
+import re
+from ..services.artifact_store import Artifact, get_artifact_store
+from ..services.output_formats import MEDIA_TYPES, media_type_for
 from ..settings import get_output_dir
 
 router = APIRouter()
 
-# In-memory storage for generated files (for serverless environments)
-file_storage = {}
+XLSX_MEDIA_TYPE = MEDIA_TYPES[".xlsx"]
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Single byte range as inclusive (start, end); multi-range requests are served whole."""
+    m = _RANGE_RE.match(header.strip())
+    if not m or (not m.group(1) and not m.group(2)):
+        return None
+    if m.group(1):
+        start = int(m.group(1))
+        end = int(m.group(2)) if m.group(2) else size - 1
+    else:
+        # Suffix range: the last N bytes
+        start = max(0, size - int(m.group(2)))
+        end = size - 1
+    return start, min(end, size - 1)
+
+
+def _read_range(artifact: Artifact, start: int, end: int) -> bytes:
+    if artifact.content is not None:
+        return artifact.content[start : end + 1]
+    with open(artifact.path, "rb") as f:
+        f.seek(start)
+        return f.read(end - start + 1)
+
 
 @router.get("/download/{filename}")
-async def download(filename: str):
-    print(f"Download request for: {filename}")  # Debug log
-    print(f"Files in memory: {list(file_storage.keys())}")  # Debug log
-    
-    # First try to get from in-memory storage (for serverless)
-    if filename in file_storage:
-        file_content = file_storage[filename]
-        print(f"Serving file {filename} from memory ({len(file_content)} bytes)")  # Debug log
-        return StreamingResponse(
-            io.BytesIO(file_content),
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
+async def download(filename: str, request: Request):
+    filename = os.path.basename(filename)
+    artifact = get_artifact_store().get(filename)
+    if artifact is None:
+        # Legacy outputs written straight to the output dir before the artifact store
+        path = os.path.join(get_output_dir(), filename)
+        if os.path.isfile(path):
+            return FileResponse(path, media_type=media_type_for(filename), filename=filename)
+        raise HTTPException(status_code=404, detail="File not found")
+
+    headers = {
+        "ETag": artifact.etag,
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f'attachment; filename="{filename}"',
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or artifact.etag in [t.strip() for t in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or if_range.strip() == artifact.etag):
+        byte_range = _parse_range(range_header, artifact.size)
+        if byte_range is None or byte_range[0] >= artifact.size or byte_range[0] > byte_range[1]:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{artifact.size}"})
+        start, end = byte_range
+        return Response(
+            _read_range(artifact, start, end),
+            status_code=206,
+            media_type=media_type_for(filename),
+            headers={**headers, "Content-Range": f"bytes {start}-{end}/{artifact.size}"},
         )
-    
-    # Fallback to file system (for local development)
-    output_dir = get_output_dir()
-    path = os.path.join(output_dir, filename)
-    if os.path.exists(path):
-        from fastapi.responses import FileResponse
-        return FileResponse(path, media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", filename=filename)
-    
-    raise HTTPException(status_code=404, detail="File not found")
 
-def store_file_in_memory(filename: str, file_content: bytes):
-    """Store file content in memory for serverless environments"""
-    file_storage[filename] = file_content
-    print(f"Stored file {filename} in memory ({len(file_content)} bytes)")  # Debug log
+    if artifact.path is not None:
+        # FileResponse streams the file (sendfile where the server supports it) without loading it
+        return FileResponse(artifact.path, media_type=media_type_for(filename), headers=headers)
+    return Response(artifact.content, media_type=media_type_for(filename), headers=headers)
+
 
+@router.get("/artifacts/stats")
+async def artifact_stats():
+    return get_artifact_store().stats()
 
 
+def store_file_in_memory(filename: str, file_content: bytes) -> Artifact:
+    """Store a generated file so /download/{filename} can serve it (memory tier, spilled to disk)."""
+    return get_artifact_store().put(filename, file_content)
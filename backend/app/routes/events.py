@@ -0,0 +1,99 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+import asyncio
+from ..services.pipeline import extract_rows_for_files, uses_first_result_only
+from ..services.artifact_store import get_artifact_store
+from ..services.excel_writer import write_excel
+from ..services.templates import load_template
+from ..services.uploads import load_spooled, upload_openapi
+from .extract import TEMPLATE_ID_SCHEMA, spool_upload_form
+from ..services.progress import (
+    TERMINAL_EVENTS,
+    bind_run,
+    finish_run,
+    format_sse,
+    get_run,
+    start_run,
+)
+
+router = APIRouter()
+
+# How often the stream checks whether the client went away while no events are flowing
+DISCONNECT_POLL_S = 1.0
+
+
+@router.post("/extract/stream", openapi_extra=upload_openapi(template_id=TEMPLATE_ID_SCHEMA))
+async def extract_stream(request: Request):
+    """Run an extraction and stream per-file, per-stage progress as server-sent events.
+
+    The first event carries the run id; DELETE /api/extract/stream/{run_id} or closing the
+    connection cancels the in-flight work.
+    """
+    form = await spool_upload_form(request)
+    template_id = form.fields.get("template_id")
+    try:
+        if template_id not in ("template1", "template2"):
+            raise HTTPException(status_code=400, detail="Invalid template_id")
+        try:
+            template = load_template(template_id)
+        except FileNotFoundError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        form.cleanup()
+        raise
+
+    uploads = form.files[:1] if uses_first_result_only(template) else form.files
+    run = start_run()
+
+    async def work() -> None:
+        bind_run(run)
+        try:
+            rows = await extract_rows_for_files(uploads, load_spooled, template)
+            filename, file_content = await asyncio.to_thread(write_excel, rows, template)
+            await asyncio.to_thread(get_artifact_store().put, filename, file_content)
+            run.emit("workbook_written", filename=filename, bytes=len(file_content), rows=len(rows))
+            run.emit("done", filename=filename, download_url=f"/api/download/{filename}")
+        except asyncio.CancelledError:
+            run.emit("cancelled")
+            raise
+        except Exception as e:
+            run.emit("error", detail=str(e) or repr(e))
+
+    run.task = asyncio.create_task(work())
+    # The spool outlives the handler and goes once the run ends, however it ends
+    run.task.add_done_callback(lambda _: form.cleanup())
+    run.emit("started", files=[u.filename for u in uploads], template_id=template_id)
+
+    async def stream():
+        try:
+            while True:
+                try:
+                    payload = await asyncio.wait_for(run.queue.get(), timeout=DISCONNECT_POLL_S)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        run.cancel()
+                        return
+                    # Comment line keeps proxies from timing out idle connections
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse(payload)
+                if payload["event"] in TERMINAL_EVENTS:
+                    return
+        finally:
+            # Covers the client going away mid-stream as well
+            run.cancel()
+            finish_run(run)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.delete("/extract/stream/{run_id}")
+async def cancel_stream(run_id: str):
+    run = get_run(run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    return {"run_id": run_id, "cancelled": run.cancel()}
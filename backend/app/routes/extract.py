@@ -1,51 +1,152 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from fastapi.responses import JSONResponse, StreamingResponse
-from typing import List
-import os
-import time
-import io
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request
+from fastapi.responses import JSONResponse, Response
+from dataclasses import asdict
+from typing import Any, Dict, List, Optional
+import asyncio
 import base64
-from ..services.pdf_extractor import extract_text_from_pdf
-from ..services.llm_extract import extract_structured_data
-from ..services.excel_writer import write_excel
+from ..services.pipeline import extract_rows_for_files, get_page_texts
+from ..services.page_classifier import select_pages
+from ..services.retrieval import explain_selection
+from ..services.cache import get_cache_stats
+from ..services.lineage import MergeReport
+from ..services.artifact_store import get_artifact_store
+from ..services.output_formats import OUTPUT_FORMATS, media_type_for, write_output
 from ..services.templates import load_template
+from ..services.uploads import SpooledForm, UploadError, UploadTooLarge, load_spooled, spool_multipart, upload_openapi
+from ..settings import get_llm_retrieval_top_k, get_llm_retrieval_group_size, is_page_filter_enabled
+from .download import XLSX_MEDIA_TYPE
 
 router = APIRouter()
 
 
-@router.post("/extract")
-async def extract(files: List[UploadFile] = File(...), template_id: str = Form(...)):
+RESPONSE_FORMATS = ("base64", "binary", "reference")
+
+
+def _negotiate_response_format(requested: Optional[str], accept: str) -> str:
+    """Explicit response_format wins; otherwise a spreadsheet/octet-stream Accept header selects binary."""
+    if requested:
+        if requested not in RESPONSE_FORMATS:
+            raise HTTPException(status_code=400, detail=f"Invalid response_format, expected one of {', '.join(RESPONSE_FORMATS)}")
+        return requested
+    accept = accept.lower()
+    if XLSX_MEDIA_TYPE in accept or "application/octet-stream" in accept:
+        return "binary"
+    return "base64"
+
+
+async def spool_upload_form(request: Request) -> SpooledForm:
+    """Stream the multipart body to disk; oversized uploads are 413, malformed ones 400."""
+    try:
+        form = await spool_multipart(request)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not form.files:
+        form.cleanup()
+        raise HTTPException(status_code=400, detail="No files uploaded")
+    return form
+
+
+TEMPLATE_ID_SCHEMA = {"type": "string", "enum": ["template1", "template2"]}
+
+
+@router.post(
+    "/extract",
+    openapi_extra=upload_openapi(
+        template_id=TEMPLATE_ID_SCHEMA,
+        response_format={"type": "string", "enum": list(RESPONSE_FORMATS)},
+        output_format={"type": "string", "enum": list(OUTPUT_FORMATS), "default": "xlsx"},
+    ),
+)
+async def extract(request: Request):
+    form = await spool_upload_form(request)
+    try:
+        return await _extract(request, form)
+    finally:
+        form.cleanup()
+
+
+async def _extract(request: Request, form: SpooledForm):
+    template_id = form.fields.get("template_id")
     if template_id not in ("template1", "template2"):
         raise HTTPException(status_code=400, detail="Invalid template_id")
+    mode = _negotiate_response_format(form.fields.get("response_format") or None, request.headers.get("accept", ""))
+    output_format = form.fields.get("output_format") or "xlsx"
+    if output_format not in OUTPUT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid output_format, expected one of {', '.join(OUTPUT_FORMATS)}")
 
     # Extract text & run LLM per file to produce rows per PDF
     try:
         template = load_template(template_id)
     except FileNotFoundError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    rows = []
-    for f in files:
-        content = await f.read()
-        text = extract_text_from_pdf(content)
-        structured_rows = extract_structured_data(text, template)
-        # For template1 and template2, we only want the template structure once
-        if template_id in ("template1", "template2"):
-            if not rows:  # Only add template structure once
-                rows.extend(structured_rows)
-        else:
-            # For other templates, extend as before
-            rows.extend(structured_rows)
-
-    filename, file_content = write_excel(rows, template)
-    
-    # For serverless environments, return the file directly as base64
-    # This ensures the file is available immediately without storage issues
-    file_base64 = base64.b64encode(file_content).decode('utf-8')
-    
+    # For template1 and template2 only the first file's rows are used; files run concurrently in upload order.
+    # Spooled uploads are opened by path, so the PDFs are never read into memory here
+    reports: Dict[int, MergeReport] = {}
+    rows = await extract_rows_for_files(form.files, load_spooled, template, reports=reports)
+
+    try:
+        filename, file_content = write_output(rows, template, output_format)
+    except RuntimeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if mode == "base64":
+        # Backward-compatible mode: the workbook inline as base64 in JSON
+        file_base64 = base64.b64encode(file_content).decode('utf-8')
+        return JSONResponse({
+            "filename": filename,
+            "file_data": file_base64,
+            "message": "Extraction complete. File ready for download.",
+            **_incremental_summary(form, reports),
+        })
+
+    if mode == "binary":
+        # The bytes are already here: no round trip through the store, and no conditional/range
+        # handling, which belongs to GET /download
+        return Response(
+            file_content,
+            media_type=media_type_for(filename),
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        )
+
+    # The store keeps (or spills) this same bytes object, so no further copies are made
+    artifact = await asyncio.to_thread(get_artifact_store().put, filename, file_content)
+    del file_content
     return JSONResponse({
         "filename": filename,
-        "file_data": file_base64,
-        "message": "Extraction complete. File ready for download."
+        "download_url": f"/api/download/{filename}",
+        "size": artifact.size,
+        "etag": artifact.etag,
+        "message": "Extraction complete. File ready for download.",
+        **_incremental_summary(form, reports),
     })
 
 
+def _incremental_summary(form: SpooledForm, reports: Dict[int, MergeReport]) -> Dict[str, List[Dict[str, Any]]]:
+    """``{"incremental": [...]}`` naming the fields refreshed and reused per revised file; empty when none was."""
+    if not reports:
+        return {}
+    return {"incremental": [{"file": form.files[i].filename, **asdict(r)} for i, r in sorted(reports.items())]}
+
+
+@router.get("/cache/stats")
+async def cache_stats():
+    return get_cache_stats()
+
+
+@router.post("/retrieval/preview")
+async def retrieval_preview(file: UploadFile = File(...), template_id: str = Form(...), top_k: Optional[int] = Form(None)):
+    """Show which passages each field group would send to the LLM, for debugging recall."""
+    try:
+        template = load_template(template_id)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    pages = await get_page_texts(await file.read())
+    selection = select_pages(pages, template)
+    prompt_pages = selection.pages if is_page_filter_enabled() else pages
+    preview = explain_selection(prompt_pages, template, top_k or get_llm_retrieval_top_k(), get_llm_retrieval_group_size())
+    preview["page_labels"] = selection.labels
+    preview["pages_dropped"] = selection.dropped
+    preview["bytes_dropped"] = selection.bytes_dropped
+    return preview
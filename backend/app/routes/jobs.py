@@ -0,0 +1,37 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse
+import asyncio
+from ..services.jobs import QueueFullError, describe_job, get_job_manager
+from ..services.uploads import upload_openapi
+from .extract import TEMPLATE_ID_SCHEMA, spool_upload_form
+
+router = APIRouter()
+
+
+@router.post("/jobs", status_code=202, openapi_extra=upload_openapi(template_id=TEMPLATE_ID_SCHEMA))
+async def create_job(request: Request):
+    manager = get_job_manager()
+    # Reject before reading the uploads when there is no room
+    if manager.queue.full():
+        raise HTTPException(status_code=429, detail="Job queue is full, retry later")
+    form = await spool_upload_form(request)
+    try:
+        template_id = form.fields.get("template_id")
+        if template_id not in ("template1", "template2"):
+            raise HTTPException(status_code=400, detail="Invalid template_id")
+        try:
+            # The spooled files are moved into the job directory, not copied
+            job_id = await manager.submit(template_id, form.files)
+        except QueueFullError as e:
+            raise HTTPException(status_code=429, detail=str(e))
+    finally:
+        form.cleanup()
+    return JSONResponse({"job_id": job_id, "status": "queued", "status_url": f"/api/jobs/{job_id}"}, status_code=202)
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await asyncio.to_thread(get_job_manager().store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return describe_job(job)
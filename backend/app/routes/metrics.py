@@ -0,0 +1,119 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
+from typing import Any, Dict, Iterable, List
+import asyncio
+import time
+from ..services.artifact_store import get_artifact_store
+from ..services.cache import get_cache_stats
+from ..services.llm_scheduler import get_scheduler_stats
+from ..services.metrics import BYTES_IN, BYTES_OUT, HTTP_SECONDS, Family, register_collector, render_metrics
+from ..services.profiler import StackSampler, get_profile, new_profile_id, save_profile
+from ..settings import is_profiling_enabled, get_profile_interval
+
+router = APIRouter()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@router.get("/metrics")
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@router.get("/metrics/profiles/{profile_id}")
+async def profile(profile_id: str):
+    collapsed = get_profile(profile_id)
+    if collapsed is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(collapsed)
+
+
+def _cache_families() -> Iterable[Family]:
+    stats = get_cache_stats()
+    lookups: List = []
+    for namespace, counts in stats.items():
+        if not isinstance(counts, dict) or "misses" not in counts:
+            continue
+        for result in ("memory_hits", "disk_hits", "misses"):
+            lookups.append(({"namespace": namespace, "result": result}, counts[result]))
+    yield ("extraction_cache_lookups_total", "counter", "Extraction cache lookups by namespace and result", lookups)
+    yield ("extraction_cache_disk_bytes", "gauge", "Size of the on-disk extraction cache", [({}, stats.get("disk_bytes", 0))])
+
+
+def _scheduler_families() -> Iterable[Family]:
+    stats = get_scheduler_stats()
+    for key, kind in (("calls", "counter"), ("coalesced", "counter"), ("retries", "counter"), ("rate_limited", "counter"), ("failures", "counter")):
+        yield (f"llm_scheduler_{key}_total", kind, f"LLM scheduler {key.replace('_', ' ')}", [({"provider": p}, s[key]) for p, s in stats.items()])
+    yield ("llm_scheduler_queued_seconds_total", "counter", "Time LLM calls waited for admission", [({"provider": p}, s["queued_ms"] / 1000) for p, s in stats.items()])
+
+
+def _artifact_families() -> Iterable[Family]:
+    store = get_artifact_store()
+    yield ("artifact_store_events_total", "counter", "Artifact store operations", [({"event": k}, v) for k, v in store.metrics.items()])
+    stats = store.stats()
+    yield ("artifact_store_bytes", "gauge", "Bytes held by the artifact store per tier", [({"tier": t}, stats[f"{t}_bytes"]) for t in ("memory", "disk")])
+
+
+register_collector(_cache_families)
+register_collector(_scheduler_families)
+register_collector(_artifact_families)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and body bytes per route, and profiling requests on demand.
+
+    With PROFILING_ENABLED=true a request carrying ``X-Profile: 1`` is sampled; the response
+    carries ``X-Profile-Id`` and the profile is served at /metrics/profiles/{id}.
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        t0 = time.perf_counter()
+        counts = {"in": 0, "out": 0, "status": 500}
+        sampler = None
+        profile_id = None
+        if is_profiling_enabled() and _header(scope, b"x-profile") in (b"1", b"true"):
+            profile_id = new_profile_id()
+            sampler = StackSampler(interval_s=get_profile_interval()).start()
+
+        async def counting_receive() -> Dict[str, Any]:
+            message = await receive()
+            if message["type"] == "http.request":
+                counts["in"] += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                counts["status"] = message["status"]
+                if profile_id is not None:
+                    message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", profile_id.encode())]}
+            elif message["type"] == "http.response.body":
+                counts["out"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            route = scope.get("route")
+            # The route template keeps label cardinality bounded (no filenames or ids)
+            path = getattr(route, "path", None) or "unmatched"
+            if path not in ("/metrics", "/metrics/profiles/{profile_id}"):
+                HTTP_SECONDS.observe(time.perf_counter() - t0, method=scope["method"], route=path, status=str(counts["status"]))
+                BYTES_IN.inc(counts["in"], route=path)
+                BYTES_OUT.inc(counts["out"], route=path)
+            if sampler is not None:
+                await asyncio.to_thread(sampler.stop)
+                save_profile(profile_id, sampler)
+
+
+def _header(scope: Dict[str, Any], name: bytes) -> bytes:
+    for key, value in scope.get("headers", []):
+        if key.lower() == name:
+            return value.lower()
+    return b""
@@ -0,0 +1,289 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Set, Tuple
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from ..settings import (
+    get_artifact_disk_max_bytes,
+    get_artifact_disk_ttl_seconds,
+    get_artifact_memory_max_bytes,
+    get_artifact_ttl_seconds,
+    get_artifacts_dir,
+)
+
+
+@dataclass
+class Artifact:
+    filename: str
+    digest: str
+    size: int
+    path: Optional[str] = None
+    content: Optional[bytes] = None
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.digest}"'
+
+
+class ArtifactStore:
+    """Generated files addressed by content hash.
+
+    New files are kept in a memory tier bounded by total bytes and idle TTL. A blob leaving
+    memory is spilled to ``<output dir>/.artifacts/<sha256><ext>`` (identical outputs share one
+    blob); the disk tier has its own byte cap and TTL, and deletes its least recently used
+    blobs past them. Download names are aliases onto blobs, recorded in SQLite so they survive
+    a restart, and are removed together with the last copy of their blob. When the disk is not
+    writable (serverless), the memory tier is the whole store.
+    """
+
+    def __init__(
+        self,
+        root: Optional[str],
+        memory_max_bytes: int,
+        ttl_seconds: int,
+        disk_max_bytes: int = 0,
+        disk_ttl_seconds: int = 0,
+    ):
+        self.root = root
+        self.memory_max_bytes = memory_max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.disk_max_bytes = disk_max_bytes
+        self.disk_ttl_seconds = disk_ttl_seconds
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self._memory_bytes = 0
+        # digest -> (ext, size, last access) of blobs on disk, least recently used first
+        self._disk: "OrderedDict[str, Tuple[str, int, float]]" = OrderedDict()
+        self._disk_bytes = 0
+        # digest -> ext of every stored blob, so eviction never scans the aliases
+        self._exts: Dict[str, str] = {}
+        self._aliases: Dict[str, Tuple[str, str, int]] = {}
+        self._names: Dict[str, Set[str]] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+        self.metrics = {
+            "puts": 0,
+            "dedup_hits": 0,
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "spills": 0,
+            "disk_evictions": 0,
+        }
+        if root:
+            try:
+                self._conn = sqlite3.connect(os.path.join(root, "aliases.sqlite3"), check_same_thread=False)
+                self._conn.executescript(
+                    "CREATE TABLE IF NOT EXISTS aliases (filename TEXT PRIMARY KEY, digest TEXT NOT NULL, ext TEXT NOT NULL, size INTEGER NOT NULL);"
+                    "CREATE INDEX IF NOT EXISTS aliases_digest ON aliases(digest);"
+                )
+                self._conn.commit()
+            except Exception:
+                self._conn = None
+            self._load_disk()
+
+    def _load_disk(self) -> None:
+        """Index the blobs left by an earlier process (oldest access first) and apply the disk bounds."""
+        if self._conn is None:
+            return
+        found = []
+        for entry in os.scandir(self.root):
+            name, ext = os.path.splitext(entry.name)
+            if entry.is_file() and len(name) == 64 and not entry.name.endswith(".tmp"):
+                stat = entry.stat()
+                found.append((stat.st_mtime, name, ext, stat.st_size))
+        for accessed, digest, ext, size in sorted(found):
+            self._disk[digest] = (ext, size, accessed)
+            self._disk_bytes += size
+            self._exts[digest] = ext
+        with self._lock:
+            # Aliases whose blob is gone (deleted by hand, or never spilled before a restart)
+            stale = [r[0] for r in self._conn.execute("SELECT DISTINCT digest FROM aliases") if r[0] not in self._disk]
+            self._conn.executemany("DELETE FROM aliases WHERE digest = ?", [(d,) for d in stale])
+            self._conn.commit()
+            self._evict_disk()
+
+    def _blob_path(self, digest: str, ext: str) -> Optional[str]:
+        return os.path.join(self.root, f"{digest}{ext}") if self.root else None
+
+    def _write_blob(self, digest: str, ext: str, content: bytes) -> bool:
+        path = self._blob_path(digest, ext)
+        if path is None:
+            return False
+        if digest in self._disk:
+            return True
+        try:
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(content)
+            os.replace(tmp, path)
+        except OSError:
+            return False
+        self._disk[digest] = (ext, len(content), time.time())
+        self._disk_bytes += len(content)
+        return True
+
+    def put(self, filename: str, content: bytes) -> Artifact:
+        digest = hashlib.sha256(content).hexdigest()
+        ext = os.path.splitext(filename)[1]
+        with self._lock:
+            self.metrics["puts"] += 1
+            if digest in self._memory or digest in self._disk:
+                self.metrics["dedup_hits"] += 1
+            self._exts[digest] = ext
+            self._add_alias(filename, digest, ext, len(content))
+            path = None
+            if digest in self._disk:
+                path = self._touch_disk(digest)
+            elif len(content) <= self.memory_max_bytes:
+                self._remember(digest, content)
+            elif self._write_blob(digest, ext, content):
+                # Too big for the memory tier: straight to disk
+                path = self._blob_path(digest, ext)
+            self._evict()
+            self._evict_disk()
+            if digest not in self._memory and digest not in self._disk:
+                # Nowhere to keep it (no disk, over every budget): the caller still gets the bytes
+                self._drop_blob(digest)
+                return Artifact(filename, digest, len(content), content=content)
+        return Artifact(filename, digest, len(content), path, None if path else content)
+
+    def _add_alias(self, filename: str, digest: str, ext: str, size: int) -> None:
+        previous = self._aliases.get(filename)
+        if previous is not None and previous[0] != digest:
+            self._names.get(previous[0], set()).discard(filename)
+        self._aliases[filename] = (digest, ext, size)
+        self._names.setdefault(digest, set()).add(filename)
+        if self._conn is not None:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO aliases (filename, digest, ext, size) VALUES (?, ?, ?, ?)",
+                (filename, digest, ext, size),
+            )
+            self._conn.commit()
+
+    def _remember(self, digest: str, content: bytes) -> None:
+        if digest in self._memory:
+            self._memory_bytes -= len(self._memory[digest][0])
+        self._memory[digest] = (content, time.time())
+        self._memory.move_to_end(digest)
+        self._memory_bytes += len(content)
+
+    def _touch_disk(self, digest: str) -> Optional[str]:
+        ext, size, _ = self._disk[digest]
+        self._disk[digest] = (ext, size, time.time())
+        self._disk.move_to_end(digest)
+        return self._blob_path(digest, ext)
+
+    def _evict(self) -> None:
+        """Move least recently used blobs past the byte budget or idle longer than the TTL to disk."""
+        now = time.time()
+        while self._memory:
+            digest, (content, stored) = next(iter(self._memory.items()))
+            expired = self.ttl_seconds and now - stored > self.ttl_seconds
+            if not expired and self._memory_bytes <= self.memory_max_bytes:
+                break
+            self._memory.popitem(last=False)
+            self._memory_bytes -= len(content)
+            self.metrics["evictions"] += 1
+            if self._write_blob(digest, self._exts.get(digest, ""), content):
+                self.metrics["spills"] += 1
+            else:
+                self._drop_blob(digest)
+
+    def _evict_disk(self) -> None:
+        """Delete least recently used blobs past the disk byte cap or idle longer than the disk TTL."""
+        now = time.time()
+        while self._disk:
+            digest, (ext, size, accessed) = next(iter(self._disk.items()))
+            expired = self.disk_ttl_seconds and now - accessed > self.disk_ttl_seconds
+            over = self.disk_max_bytes and self._disk_bytes > self.disk_max_bytes
+            if not expired and not over:
+                break
+            self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            self.metrics["disk_evictions"] += 1
+            try:
+                os.remove(self._blob_path(digest, ext))
+            except OSError:
+                pass
+            if digest not in self._memory:
+                self._drop_blob(digest)
+
+    def _drop_blob(self, digest: str) -> None:
+        """Forget a blob that is in neither tier, with every alias onto it."""
+        self._exts.pop(digest, None)
+        for filename in self._names.pop(digest, set()):
+            if self._aliases.get(filename, ("",))[0] == digest:
+                del self._aliases[filename]
+        if self._conn is not None:
+            self._conn.execute("DELETE FROM aliases WHERE digest = ?", (digest,))
+            self._conn.commit()
+
+    def _lookup_alias(self, filename: str) -> Optional[Tuple[str, str, int]]:
+        alias = self._aliases.get(filename)
+        if alias is None and self._conn is not None:
+            row = self._conn.execute("SELECT digest, ext, size FROM aliases WHERE filename = ?", (filename,)).fetchone()
+            if row:
+                alias = (row[0], row[1], row[2])
+                self._aliases[filename] = alias
+                self._names.setdefault(alias[0], set()).add(filename)
+        return alias
+
+    def get(self, filename: str) -> Optional[Artifact]:
+        """Serve from the memory tier, else from the on-disk blob (servable zero-copy)."""
+        with self._lock:
+            self._evict()
+            self._evict_disk()
+            alias = self._lookup_alias(filename)
+            if alias is None:
+                self.metrics["misses"] += 1
+                return None
+            digest, ext, size = alias
+            if digest in self._memory:
+                content = self._memory[digest][0]
+                # Refresh recency so the TTL measures idle time and order stays LRU
+                self._memory[digest] = (content, time.time())
+                self._memory.move_to_end(digest)
+                self.metrics["memory_hits"] += 1
+                return Artifact(filename, digest, size, content=content)
+            if digest in self._disk:
+                self.metrics["disk_hits"] += 1
+                return Artifact(filename, digest, size, path=self._touch_disk(digest))
+            self.metrics["misses"] += 1
+            return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.metrics,
+                "memory_items": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "memory_max_bytes": self.memory_max_bytes,
+                "aliases": len(self._aliases),
+                "disk_items": len(self._disk),
+                "disk_bytes": self._disk_bytes,
+                "disk_max_bytes": self.disk_max_bytes,
+            }
+
+
+_store: Optional[ArtifactStore] = None
+
+
+def get_artifact_store() -> ArtifactStore:
+    global _store
+    if _store is None:
+        try:
+            root: Optional[str] = get_artifacts_dir()
+        except OSError:
+            root = None
+        _store = ArtifactStore(
+            root,
+            get_artifact_memory_max_bytes(),
+            get_artifact_ttl_seconds(),
+            get_artifact_disk_max_bytes(),
+            get_artifact_disk_ttl_seconds(),
+        )
+    return _store
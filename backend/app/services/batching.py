@@ -0,0 +1,208 @@
+"""Several small documents extracted in one LLM call.
+
+Short uploads (capital call notices, one to three pages) cost little more than the fixed
+round trip and instructions of a prompt. Documents of the same template that are extracted
+concurrently are packed into one prompt, each between ``=== DOCUMENT Dn ===`` delimiters,
+until the batch is full (LLM_BATCH_MAX_DOCS, LLM_BATCH_TOKENS), every document in flight
+(see DocumentBatcher.in_flight) is waiting in a batch, or the batching window
+(LLM_BATCH_WINDOW_MS) since its first document has passed. The model answers with a JSON
+array of one object per document; an object is only used when it names a document of the
+batch and its values are not found in another document's text instead of its own. Documents
+without a valid object get None and are prompted on their own by the caller.
+"""
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional
+import asyncio
+import json
+import re
+from .chunking import estimate_tokens
+from .lineage import value_forms
+from .metrics import LLM_BATCHED_DOCS
+from .progress import ProgressTarget, bind_targets, current_target
+from .templates import get_compiled
+from ..settings import get_llm_batch_max_docs, get_llm_batch_tokens, get_llm_batch_window_s
+
+DOC_ID_KEY = "document_id"
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+@dataclass
+class _Pending:
+    doc_id: str
+    text: str
+    future: "asyncio.Future[Optional[Dict[str, Any]]]"
+    progress: Optional[ProgressTarget] = None
+
+
+class _Batch:
+    def __init__(self, template: Dict[str, Any]):
+        self.template = template
+        self.docs: List[_Pending] = []
+        self.tokens = 0
+        self.full = asyncio.Event()
+        self.task: Optional["asyncio.Task[None]"] = None
+
+
+def build_batch_prompt(docs: List[_Pending], template: Dict[str, Any]) -> str:
+    template_id = template.get("templateId", "template")
+    prompt = (
+        "You are a data extraction expert for private equity fund data.\n"
+        f"Extract the following fields from each of the {len(docs)} documents below according to {template_id}:\n"
+        f"{get_compiled(template).prompt_fields}\n\n"
+        'Each document starts with a line "=== DOCUMENT <id> ===" and ends with "=== END DOCUMENT <id> ===". '
+        "Extract every document on its own, from its own text only.\n"
+        f"Output only a valid JSON array (no markdown) with one object per document, in the order given. "
+        f'Each object has "{DOC_ID_KEY}" set to the document id and keys matching the fields. '
+        "If a field is missing, use an empty string.\n"
+        "Documents:\n"
+    )
+    return prompt + "\n".join(f"=== DOCUMENT {d.doc_id} ===\n{d.text}\n=== END DOCUMENT {d.doc_id} ===" for d in docs)
+
+
+def parse_batch_response(text: str) -> List[Any]:
+    """The JSON array of a batched answer (markdown fences tolerated); [] when there is none."""
+    s = text.strip()
+    if "[" in s and "]" in s:
+        s = s[s.find("[") : s.rfind("]") + 1]
+    try:
+        parsed = json.loads(s)
+    except Exception:
+        return []
+    return parsed if isinstance(parsed, list) else []
+
+
+def _misattributed(row: Dict[str, Any], own: str, others: List[str]) -> bool:
+    """True when more of the row's values are found only in other documents than in its own."""
+    own_hits = elsewhere = 0
+    for key, value in row.items():
+        if key == DOC_ID_KEY or value in ("", None) or isinstance(value, (dict, list)):
+            continue
+        forms = value_forms(value)
+        if any(f in own for f in forms):
+            own_hits += 1
+        elif any(f in other for other in others for f in forms):
+            elsewhere += 1
+    return elsewhere > own_hits
+
+
+def validate_batch(rows: List[Any], docs: List[_Pending]) -> Dict[str, Dict[str, Any]]:
+    """Document id -> object for the answers that map to the right document; others are left out."""
+    texts = {d.doc_id: _WHITESPACE.sub(" ", d.text).lower() for d in docs}
+    valid: Dict[str, Dict[str, Any]] = {}
+    seen: List[str] = []
+    for row in rows:
+        if not isinstance(row, dict):
+            continue
+        doc_id = str(row.get(DOC_ID_KEY, "")).strip()
+        if doc_id not in texts:
+            continue
+        if doc_id in seen:
+            # Two answers for one document: neither can be trusted
+            valid.pop(doc_id, None)
+            continue
+        seen.append(doc_id)
+        if not any(v not in ("", None) for k, v in row.items() if k != DOC_ID_KEY):
+            continue
+        if _misattributed(row, texts[doc_id], [t for i, t in texts.items() if i != doc_id]):
+            continue
+        valid[doc_id] = {k: v for k, v in row.items() if k != DOC_ID_KEY}
+    return valid
+
+
+class DocumentBatcher:
+    """Collects small documents per template and prompts them together."""
+
+    def __init__(self, max_docs: int, window_s: float, max_tokens: int):
+        self.max_docs = max_docs
+        self.window_s = window_s
+        self.max_tokens = max_tokens
+        self._open: Dict[str, _Batch] = {}
+        self._inflight = 0
+
+    @contextmanager
+    def in_flight(self) -> Iterator[None]:
+        """Count a document being extracted, which may still join a batch.
+
+        Once every counted document waits in a batch, nothing else can join and the batches
+        are prompted without waiting out the window; a document on its own is never held back.
+        Without any counted document, batches wait for the window.
+        """
+        self._inflight += 1
+        try:
+            yield
+        finally:
+            self._inflight -= 1
+            self._flush_if_complete()
+
+    def _flush_if_complete(self) -> None:
+        waiting = sum(len(b.docs) for b in self._open.values())
+        if self._inflight and waiting >= self._inflight:
+            for key, batch in list(self._open.items()):
+                self._close(key, batch)
+
+    def accepts(self, text: str) -> bool:
+        # At least two documents must fit the budget for a batch to be worth waiting for
+        return self.max_docs > 1 and estimate_tokens(text) <= self.max_tokens // 2
+
+    def _close(self, key: str, batch: _Batch) -> None:
+        if self._open.get(key) is batch:
+            del self._open[key]
+        batch.full.set()
+
+    async def extract(self, text: str, template: Dict[str, Any], call: Callable[[str], Awaitable[str]]) -> Optional[Dict[str, Any]]:
+        """The raw answer object for ``text``, or None when it has to be prompted alone."""
+        key = f"{template.get('templateId', '')}|{get_compiled(template).content_hash}"
+        tokens = estimate_tokens(text)
+        batch = self._open.get(key)
+        if batch is not None and batch.tokens + tokens > self.max_tokens:
+            self._close(key, batch)
+            batch = None
+        if batch is None:
+            batch = _Batch(template)
+            self._open[key] = batch
+            # The batch outlives any one caller being cancelled
+            batch.task = asyncio.create_task(self._run(key, batch, call))
+        future: "asyncio.Future[Optional[Dict[str, Any]]]" = asyncio.get_running_loop().create_future()
+        batch.docs.append(_Pending(f"D{len(batch.docs) + 1}", text, future, current_target()))
+        batch.tokens += tokens
+        if len(batch.docs) >= self.max_docs:
+            self._close(key, batch)
+        else:
+            # Checked once documents started in the same loop iteration have been counted too
+            asyncio.get_running_loop().call_soon(self._flush_if_complete)
+        return await future
+
+    async def _run(self, key: str, batch: _Batch, call: Callable[[str], Awaitable[str]]) -> None:
+        results: Dict[str, Dict[str, Any]] = {}
+        try:
+            try:
+                await asyncio.wait_for(batch.full.wait(), self.window_s)
+            except asyncio.TimeoutError:
+                pass
+            self._close(key, batch)
+            if len(batch.docs) > 1:
+                # The task runs in the first document's context; the prompt is made for all of them
+                bind_targets([d.progress for d in batch.docs if d.progress is not None])
+                try:
+                    answer = await call(build_batch_prompt(batch.docs, batch.template))
+                    results = validate_batch(parse_batch_response(answer), batch.docs)
+                except Exception:
+                    results = {}
+                LLM_BATCHED_DOCS.inc(len(results), outcome="ok")
+                LLM_BATCHED_DOCS.inc(len(batch.docs) - len(results), outcome="retried")
+        finally:
+            for doc in batch.docs:
+                if not doc.future.done():
+                    doc.future.set_result(results.get(doc.doc_id))
+
+
+_batcher: Optional[DocumentBatcher] = None
+
+
+def get_document_batcher() -> DocumentBatcher:
+    global _batcher
+    if _batcher is None:
+        _batcher = DocumentBatcher(get_llm_batch_max_docs(), get_llm_batch_window_s(), get_llm_batch_tokens())
+    return _batcher
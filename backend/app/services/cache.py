@@ -0,0 +1,258 @@
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from .templates import get_compiled
+from ..settings import (
+    is_cache_enabled,
+    get_cache_dir,
+    get_cache_memory_items,
+    get_cache_disk_max_bytes,
+)
+
+
+def sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def template_content_hash(template: Dict[str, Any]) -> str:
+    return get_compiled(template).content_hash
+
+
+def make_key(*parts: Any) -> str:
+    return "|".join(str(p) for p in parts)
+
+
+class LRUCache:
+    """Thread-safe in-process LRU keyed by string."""
+
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self._data: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key: str, value: Any) -> None:
+        if self.max_items <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+# Access times of disk hits are written in batches of this many, or when this many seconds passed
+_TOUCH_BATCH = 256
+_TOUCH_INTERVAL_S = 30.0
+
+
+class DiskCache:
+    """SQLite-backed store shared by all namespaces, evicting least recently used entries by total size.
+
+    Reads do not write: access times are buffered and flushed in batches (always before an
+    eviction picks its victims). The total size is kept in memory after one SUM at startup.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._touched: Dict[str, float] = {}
+        self._flushed = time.monotonic()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed)")
+        self._conn.commit()
+        self._total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._touched[key] = time.time()
+            if len(self._touched) >= _TOUCH_BATCH or time.monotonic() - self._flushed >= _TOUCH_INTERVAL_S:
+                self._flush_touched()
+                self._conn.commit()
+            return row[0]
+
+    def set(self, key: str, value: bytes) -> None:
+        if self.max_bytes <= 0 or len(value) > self.max_bytes:
+            return
+        with self._lock:
+            row = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                (key, value, len(value), time.time()),
+            )
+            self._touched.pop(key, None)
+            self._total += len(value) - (row[0] if row else 0)
+            self._evict()
+            self._conn.commit()
+
+    def _flush_touched(self) -> None:
+        if self._touched:
+            self._conn.executemany("UPDATE entries SET accessed = ? WHERE key = ?", [(t, k) for k, t in self._touched.items()])
+            self._touched.clear()
+        self._flushed = time.monotonic()
+
+    def _evict(self) -> None:
+        if self._total <= self.max_bytes:
+            return
+        self._flush_touched()
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY accessed").fetchall():
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._total -= size
+            if self._total <= self.max_bytes:
+                break
+
+    def size_bytes(self) -> int:
+        return self._total
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+            self._touched.clear()
+            self._total = 0
+
+
+class TieredCache:
+    """Memory LRU in front of the shared disk store, with hit/miss counters per namespace.
+
+    Values are kept JSON-encoded in both tiers, so every get returns a fresh object that the
+    caller may mutate without changing the cached value. Async code uses aget/aset, which run
+    the disk tier in a worker thread.
+    """
+
+    def __init__(self, namespace: str, memory: LRUCache, disk: Optional[DiskCache]):
+        self.namespace = namespace
+        self.memory = memory
+        self.disk = disk
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "sets": 0}
+
+    def _disk_key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def _memory_get(self, key: str) -> Optional[Any]:
+        raw = self.memory.get(key)
+        if raw is None:
+            return None
+        self.stats["memory_hits"] += 1
+        return json.loads(raw)
+
+    def _disk_hit(self, key: str, raw: Optional[bytes]) -> Optional[Any]:
+        if raw is None:
+            self.stats["misses"] += 1
+            return None
+        self.memory.set(key, raw)
+        self.stats["disk_hits"] += 1
+        return json.loads(raw)
+
+    def get(self, key: str) -> Optional[Any]:
+        if not is_cache_enabled():
+            return None
+        value = self._memory_get(key)
+        if value is not None:
+            return value
+        if self.disk is None:
+            self.stats["misses"] += 1
+            return None
+        return self._disk_hit(key, self.disk.get(self._disk_key(key)))
+
+    async def aget(self, key: str) -> Optional[Any]:
+        if not is_cache_enabled():
+            return None
+        value = self._memory_get(key)
+        if value is not None:
+            return value
+        if self.disk is None:
+            self.stats["misses"] += 1
+            return None
+        return self._disk_hit(key, await asyncio.to_thread(self.disk.get, self._disk_key(key)))
+
+    def _encode(self, key: str, value: Any) -> bytes:
+        raw = json.dumps(value).encode("utf-8")
+        self.memory.set(key, raw)
+        self.stats["sets"] += 1
+        return raw
+
+    def set(self, key: str, value: Any) -> None:
+        if not is_cache_enabled():
+            return
+        raw = self._encode(key, value)
+        if self.disk is not None:
+            self.disk.set(self._disk_key(key), raw)
+
+    async def aset(self, key: str, value: Any) -> None:
+        if not is_cache_enabled():
+            return
+        raw = self._encode(key, value)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.set, self._disk_key(key), raw)
+
+    def clear(self) -> None:
+        self.memory.clear()
+        for k in self.stats:
+            self.stats[k] = 0
+
+
+_disk: Optional[DiskCache] = None
+_caches: Dict[str, TieredCache] = {}
+_init_lock = threading.Lock()
+
+
+def _get_disk() -> Optional[DiskCache]:
+    global _disk
+    if _disk is None:
+        try:
+            _disk = DiskCache(os.path.join(get_cache_dir(), "extraction_cache.sqlite3"), get_cache_disk_max_bytes())
+        except Exception:
+            # Read-only filesystems (serverless) still get the memory tier
+            return None
+    return _disk
+
+
+def get_cache(namespace: str) -> TieredCache:
+    with _init_lock:
+        if namespace not in _caches:
+            _caches[namespace] = TieredCache(namespace, LRUCache(get_cache_memory_items()), _get_disk())
+        return _caches[namespace]
+
+
+def get_text_cache() -> TieredCache:
+    return get_cache("pages")
+
+
+def get_rows_cache() -> TieredCache:
+    return get_cache("rows")
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    stats: Dict[str, Any] = {name: dict(c.stats) for name, c in _caches.items()}
+    stats["memory_items"] = {name: len(c.memory) for name, c in _caches.items()}
+    stats["disk_bytes"] = _disk.size_bytes() if _disk is not None else 0
+    return stats
@@ -0,0 +1,135 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+from .templates import get_template_field_order
+
+# Rough chars-per-token ratio for English financial text; avoids a tokenizer dependency
+CHARS_PER_TOKEN = 4
+
+MERGE_RULES = ("first", "last", "longest", "max")
+
+
+@dataclass
+class Chunk:
+    index: int
+    text: str
+    first_page: int
+    last_page: int
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.text)
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _split_oversized(text: str, max_chars: int) -> List[str]:
+    """Split one page on line boundaries; a single overlong line is hard-cut."""
+    parts: List[str] = []
+    current = ""
+    for line in text.splitlines(keepends=True):
+        while len(line) > max_chars:
+            if current:
+                parts.append(current)
+                current = ""
+            parts.append(line[:max_chars])
+            line = line[max_chars:]
+        if len(current) + len(line) > max_chars:
+            parts.append(current)
+            current = ""
+        current += line
+    if current:
+        parts.append(current)
+    return parts
+
+
+def chunk_pages(pages: List[str], max_tokens: int, max_chunks: int) -> List[Chunk]:
+    """Pack consecutive pages into chunks of at most max_tokens.
+
+    Pages are never merged across a chunk boundary unless a page alone exceeds the budget,
+    in which case it is split on lines. Only the first max_chunks chunks are kept.
+    """
+    max_chars = max(1, max_tokens) * CHARS_PER_TOKEN
+    pieces: List[Tuple[int, str]] = []
+    for page_no, page in enumerate(pages):
+        if not page.strip():
+            continue
+        if len(page) > max_chars:
+            pieces.extend((page_no, part) for part in _split_oversized(page, max_chars))
+        else:
+            pieces.append((page_no, page))
+
+    chunks: List[Chunk] = []
+    buf: List[str] = []
+    first = last = 0
+    size = 0
+    for page_no, piece in pieces:
+        added = len(piece) + (1 if buf else 0)
+        if buf and size + added > max_chars:
+            chunks.append(Chunk(len(chunks), "\n".join(buf), first, last))
+            buf, size = [], 0
+            added = len(piece)
+        if not buf:
+            first = page_no
+        buf.append(piece)
+        last = page_no
+        size += added
+    if buf:
+        chunks.append(Chunk(len(chunks), "\n".join(buf), first, last))
+    return chunks[:max(1, max_chunks)]
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def _as_number(value: Any) -> Any:
+    if isinstance(value, (int, float)):
+        return value
+    s = str(value).replace(",", "").replace("$", "").strip()
+    negative = s.startswith("(") and s.endswith(")")
+    try:
+        n = float(s.strip("()"))
+    except ValueError:
+        return None
+    return -n if negative else n
+
+
+def _field_rules(template: Dict[str, Any]) -> Dict[str, str]:
+    fields = list(template.get("fields", []))
+    for sheet in template.get("sheets", []):
+        fields.extend(sheet.get("fields", []))
+    return {f["key"]: f.get("merge", "first") for f in fields if f.get("merge") in MERGE_RULES}
+
+
+def reduce_chunk_results(results: List[Dict[str, Any]], template: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, List[Any]]]:
+    """Merge per-chunk JSON into one row, deterministically in chunk order.
+
+    The default rule is "first non-empty wins". A template field may set "merge" to
+    "last", "longest" or "max" (numeric) instead. Returns the merged row and, per field,
+    the distinct non-empty values seen when chunks disagreed.
+    """
+    rules = _field_rules(template)
+    merged: Dict[str, Any] = {}
+    conflicts: Dict[str, List[Any]] = {}
+    for key in get_template_field_order(template):
+        values = [r.get(key) for r in results if isinstance(r, dict) and not _is_empty(r.get(key))]
+        if not values:
+            merged[key] = ""
+            continue
+        distinct = list(dict.fromkeys(str(v).strip() for v in values))
+        if len(distinct) > 1:
+            conflicts[key] = distinct
+
+        rule = rules.get(key, "first")
+        if rule == "last":
+            merged[key] = values[-1]
+        elif rule == "longest":
+            merged[key] = max(values, key=lambda v: len(str(v)))
+        elif rule == "max":
+            numeric = [(n, v) for v in values for n in [_as_number(v)] if n is not None]
+            merged[key] = max(numeric, key=lambda t: t[0])[1] if numeric else values[0]
+        else:
+            merged[key] = values[0]
+    return merged, conflicts
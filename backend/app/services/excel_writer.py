@@ -1,23 +1,62 @@
-from typing import Any, Dict, List, Tuple
-import os
-import time
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Tuple
 import io
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment
+import time
+import uuid
+from .metrics import span
 from .templates import get_template_field_order, get_template_headers
-from ..settings import get_output_dir
 
+if TYPE_CHECKING:
+    from openpyxl import Workbook
+
+TITLE = "Data Extraction Template - Private Equity Funds"
+
+
+class _StreamBuffer(io.RawIOBase):
+    """Write-only, non-seekable in-memory sink.
+
+    zipfile falls back to streaming mode (data descriptors) for non-seekable outputs, so the
+    workbook is serialized exactly once.
+    """
+
+    def __init__(self):
+        self.buffer = io.BytesIO()
+
+    def writable(self) -> bool:
+        return True
 
+    def write(self, b) -> int:
+        self.buffer.write(b)
+        return len(b)
+
+    def tell(self) -> int:
+        return self.buffer.tell()
+
+    def seekable(self) -> bool:
+        return False
+
+    def seek(self, *args, **kwargs):
+        raise io.UnsupportedOperation("seek")
+
+
+def output_basename(template_id: str) -> str:
+    """``extracted_data_<template>_<timestamp>_<random>``: unique even for outputs written in the same second."""
+    return f"extracted_data_{template_id}_{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+
+
+@span("write_excel")
 def write_excel(data_rows: List[Dict[str, Any]], template: Dict[str, Any]) -> Tuple[str, bytes]:
+    # openpyxl is imported on first use so it stays out of the cold-start import path
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, PatternFill, Alignment
+    from openpyxl.utils import get_column_letter
+
     template_id = template.get("templateId", "template")
-    ts = time.strftime("%Y%m%d_%H%M%S")
-    filename = f"extracted_data_{template_id}_{ts}.xlsx"
-    out_dir = get_output_dir()
-    out_path = os.path.join(out_dir, filename)
-    
-    # Create workbook in memory
-    wb = Workbook()
-    
+    filename = f"{output_basename(template_id)}.xlsx"
+
+    # Write-only workbook: rows are streamed into the sheet XML instead of held as cell objects
+    wb = Workbook(write_only=True)
+
     # Check if template supports multi-sheet structure
     if template.get("multiSheet", False) and "sheets" in template:
         write_multi_sheet_excel_to_workbook(data_rows, template, wb)
@@ -25,81 +64,65 @@ def write_excel(data_rows: List[Dict[str, Any]], template: Dict[str, Any]) -> Tu
         # Legacy single-sheet format with header
         fields = get_template_field_order(template)
         headers = get_template_headers(template)
-        rows = [[row.get(k, "") for k in fields] for row in data_rows]
-        
-        ws = wb.active
-        ws.title = "Sheet1"
-        
-        # Add the header title in row 1
-        ws.cell(row=1, column=1, value="Data Extraction Template - Private Equity Funds")
-        
-        # Style the header cell
-        header_font = Font(bold=True, color="FFFFFF", size=14)
-        header_fill = PatternFill(start_color="000000", end_color="000000", fill_type="solid")
-        header_alignment = Alignment(horizontal="center", vertical="center")
-        
-        header_cell = ws.cell(row=1, column=1)
-        header_cell.font = header_font
-        header_cell.fill = header_fill
-        header_cell.alignment = header_alignment
-        
-        # Merge cells for the header across all columns
-        ws.merge_cells(f'A1:{chr(65 + len(headers) - 1)}1')
-        
-        # Add column headers in row 2
-        for col_idx, header in enumerate(headers, 1):
-            ws.cell(row=2, column=col_idx, value=header)
-        
-        # Add data starting from row 3
-        for row_idx, row_data in enumerate(rows, 3):
-            for col_idx, value in enumerate(row_data, 1):
-                ws.cell(row=row_idx, column=col_idx, value=value)
-    
-    # Save to memory buffer
-    buffer = io.BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-    file_content = buffer.getvalue()
-    
-    # Also save to disk for local development
+        ws = wb.create_sheet(title="Sheet1")
+
+        # Header title in row 1, merged across all columns
+        header_cell = WriteOnlyCell(ws, value=TITLE)
+        header_cell.font = Font(bold=True, color="FFFFFF", size=14)
+        header_cell.fill = PatternFill(start_color="000000", end_color="000000", fill_type="solid")
+        header_cell.alignment = Alignment(horizontal="center", vertical="center")
+        ws.append([header_cell])
+        if len(headers) > 1:
+            ws.merged_cells.add(f"A1:{get_column_letter(len(headers))}1")
+
+        # Column headers in row 2, data from row 3
+        ws.append(headers)
+        for row in _iter_rows(data_rows, fields):
+            ws.append(row)
+
+    # Serialize once into memory; callers hand the bytes to the response or the artifact store
+    sink = _StreamBuffer()
     try:
-        wb.save(out_path)
-    except Exception:
-        pass  # Ignore file system errors in serverless environments
-    
-    return filename, file_content
+        wb.save(sink)
+    finally:
+        sink.close()
+    return filename, sink.buffer.getvalue()
+
+
+def _iter_rows(data_rows: Iterable[Dict[str, Any]], fields: List[str]) -> Iterable[List[Any]]:
+    for row in data_rows:
+        yield [row.get(k, "") for k in fields]
+
 
+def sheet_rows(data_rows: Iterable[Dict[str, Any]], fields: List[str]) -> List[Dict[str, Any]]:
+    """Rows that carry at least one of a sheet's fields (table rows belong to a single sheet)."""
+    return [row for row in data_rows if any(k in row for k in fields)]
 
-def write_multi_sheet_excel_to_workbook(data_rows: List[Dict[str, Any]], template: Dict[str, Any], wb: Workbook) -> None:
+
+def write_multi_sheet_excel_to_workbook(data_rows: List[Dict[str, Any]], template: Dict[str, Any], wb: "Workbook") -> None:
     """Write Excel file with multiple sheets based on template structure."""
-    # Remove default sheet
-    wb.remove(wb.active)
-    
+    # Remove default sheet (write-only workbooks start without one)
+    if not wb.write_only:
+        wb.remove(wb.active)
+
     sheets = template.get("sheets", [])
-    
+
     for sheet_config in sheets:
         sheet_name = sheet_config.get("name", "Sheet")
         fields = [field["key"] for field in sheet_config.get("fields", [])]
         headers = [field["header"] for field in sheet_config.get("fields", [])]
-        
+
         # Create new worksheet
         ws = wb.create_sheet(title=sheet_name)
-        
-        # Add headers
-        for col_idx, header in enumerate(headers, 1):
-            ws.cell(row=1, column=col_idx, value=header)
-        
-        # Add data rows
-        for row_idx, row_data in enumerate(data_rows, 2):
-            for col_idx, field in enumerate(fields, 1):
-                value = row_data.get(field, "")
-                ws.cell(row=row_idx, column=col_idx, value=value)
-        
+
+        # Headers then data rows; append works for both regular and write-only sheets
+        ws.append(headers)
+        for row in _iter_rows(sheet_rows(data_rows, fields), fields):
+            ws.append(row)
+
         # Add description as a comment or note (if possible)
         description = sheet_config.get("description", "")
         if description:
             # For now, we'll add the description as the first row
             # In a more advanced implementation, we could add it as a comment
             pass
-
-
@@ -0,0 +1,226 @@
+from typing import Any, Dict, List, Optional, Set
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from .artifact_store import get_artifact_store
+from .excel_writer import write_excel
+from .llm_scheduler import llm_priority
+from .pipeline import extract_rows_for_files, uses_first_result_only
+from .templates import load_template
+from .uploads import SpooledUpload, spooled_from_path
+from ..settings import get_data_dir, get_jobs_workers, get_jobs_queue_size
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class JobStore:
+    """SQLite-backed job records, so queued and finished jobs survive a restart."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, template_id TEXT NOT NULL, "
+            "inputs TEXT NOT NULL, files_total INTEGER NOT NULL, files_done INTEGER NOT NULL DEFAULT 0, "
+            "stage TEXT, error TEXT, filename TEXT, created REAL NOT NULL, updated REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def create(self, job_id: str, template_id: str, inputs: List[str], files_total: int) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, template_id, inputs, files_total, created, updated) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, template_id, json.dumps(inputs), files_total, now, now),
+            )
+            self._conn.commit()
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        fields["updated"] = time.time()
+        cols = ", ".join(f"{k} = ?" for k in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {cols} WHERE id = ?", (*fields.values(), job_id))
+            self._conn.commit()
+
+    def increment_done(self, job_id: str) -> None:
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET files_done = files_done + 1, updated = ? WHERE id = ?", (time.time(), job_id))
+            self._conn.commit()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def unfinished(self) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) ORDER BY created", (QUEUED, RUNNING)
+            ).fetchall()
+        return [r["id"] for r in rows]
+
+
+def _job_dir(job_id: str) -> str:
+    return os.path.join(get_data_dir(), "jobs", job_id)
+
+
+class JobManager:
+    """Bounded in-process queue drained by a fixed pool of asyncio workers."""
+
+    def __init__(self, store: JobStore, workers: int, queue_size: int):
+        self.store = store
+        self.workers = workers
+        self.queue: "asyncio.Queue[str]" = asyncio.Queue(maxsize=queue_size)
+        self._tasks: List[asyncio.Task] = []
+        self._pending_updates: Set[asyncio.Task] = set()
+
+    async def start(self) -> None:
+        # Re-enqueue anything interrupted by the last shutdown
+        unfinished = await asyncio.to_thread(self.store.unfinished)
+        for job_id in unfinished:
+            await asyncio.to_thread(self.store.update, job_id, status=QUEUED, stage=None)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._feed(unfinished)))
+
+    async def _feed(self, job_ids: List[str]) -> None:
+        """Put restored jobs on the queue as it frees up; jobs beyond its size wait here, not forever."""
+        for job_id in job_ids:
+            await self.queue.put(job_id)
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, template_id: str, uploads: List[SpooledUpload]) -> str:
+        """Move spooled uploads into the job directory and enqueue a job; raises QueueFullError."""
+        if self.queue.full():
+            raise QueueFullError("Job queue is full")
+        job_id = uuid.uuid4().hex
+        await asyncio.to_thread(self._persist, job_id, template_id, uploads)
+        try:
+            self.queue.put_nowait(job_id)
+        except asyncio.QueueFull:
+            # Filled while the files were moved; the job is recorded, so fail it rather than lose it
+            await asyncio.to_thread(self.store.update, job_id, status=FAILED, error="Job queue is full")
+            await asyncio.to_thread(shutil.rmtree, _job_dir(job_id), True)
+            raise QueueFullError("Job queue is full")
+        return job_id
+
+    def _persist(self, job_id: str, template_id: str, uploads: List[SpooledUpload]) -> None:
+        job_dir = _job_dir(job_id)
+        os.makedirs(job_dir, exist_ok=True)
+        paths: List[str] = []
+        for upload in uploads:
+            # A rename when the spool and data dir share a filesystem, a copy otherwise
+            path = shutil.move(upload.path, os.path.join(job_dir, os.path.basename(upload.path)))
+            paths.append(path)
+        self.store.create(job_id, template_id, paths, len(paths))
+
+    def _update_soon(self, job_id: str, **fields: Any) -> None:
+        """Record progress from a synchronous callback without blocking the event loop on SQLite."""
+        task = asyncio.create_task(asyncio.to_thread(self.store.update, job_id, **fields))
+        self._pending_updates.add(task)
+        task.add_done_callback(self._pending_updates.discard)
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self.queue.get()
+            try:
+                # Background jobs yield LLM capacity to interactive requests
+                with llm_priority("batch"):
+                    await self._run(job_id)
+            except asyncio.CancelledError:
+                # Shutdown: the job stays unfinished in the store, inputs kept for the restart
+                raise
+            except Exception as e:
+                await asyncio.to_thread(self.store.update, job_id, status=FAILED, error=str(e) or repr(e))
+                await asyncio.to_thread(shutil.rmtree, _job_dir(job_id), True)
+            finally:
+                self.queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        job = await asyncio.to_thread(self.store.get, job_id)
+        if job is None or job["status"] not in (QUEUED, RUNNING):
+            return
+        template = load_template(job["template_id"])
+        paths = json.loads(job["inputs"])
+        if uses_first_result_only(template):
+            paths = paths[:1]
+        await asyncio.to_thread(self.store.update, job_id, status=RUNNING, stage="extracting", files_total=len(paths), files_done=0)
+
+        done = 0
+
+        def file_done(_: int) -> None:
+            nonlocal done
+            done += 1
+            self._update_soon(job_id, files_done=done)
+
+        rows = await extract_rows_for_files(
+            paths,
+            lambda p: asyncio.to_thread(spooled_from_path, p),
+            template,
+            on_file_done=file_done,
+        )
+
+        await asyncio.to_thread(self.store.update, job_id, stage="writing")
+        filename, file_content = await asyncio.to_thread(write_excel, rows, template)
+        await asyncio.to_thread(get_artifact_store().put, filename, file_content)
+        await asyncio.to_thread(self.store.update, job_id, status=SUCCEEDED, stage=None, filename=filename)
+        await asyncio.to_thread(shutil.rmtree, _job_dir(job_id), True)
+
+
+_manager: Optional[JobManager] = None
+
+
+def get_job_manager() -> JobManager:
+    global _manager
+    if _manager is None:
+        store = JobStore(os.path.join(get_data_dir(), "jobs.sqlite3"))
+        _manager = JobManager(store, get_jobs_workers(), get_jobs_queue_size())
+    return _manager
+
+
+async def start_job_workers() -> None:
+    await get_job_manager().start()
+
+
+async def stop_job_workers() -> None:
+    global _manager
+    if _manager is not None:
+        await _manager.stop()
+    _manager = None
+
+
+def describe_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    info = {
+        "job_id": job["id"],
+        "status": job["status"],
+        "template_id": job["template_id"],
+        "stage": job["stage"],
+        "progress": {"files_done": job["files_done"], "files_total": job["files_total"]},
+        "created": job["created"],
+        "updated": job["updated"],
+    }
+    if job["status"] == SUCCEEDED:
+        info["filename"] = job["filename"]
+        info["download_url"] = f"/api/download/{job['filename']}"
+    if job["status"] == FAILED:
+        info["error"] = job["error"]
+    return info
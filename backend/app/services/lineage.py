@@ -0,0 +1,280 @@
+"""Page fingerprints and document lineage for incremental re-extraction.
+
+Every extracted document is recorded with a fingerprint per page (hash of the page text,
+whitespace-normalized) and, per template, the row it produced plus the pages each field
+value was found on. A revised upload is matched to an earlier version by filename lineage
+(the name without version/revision/date decorations) or, for renamed files, by a high share
+of identical pages. Only pages whose fingerprint is new are re-prompted; the fresh values
+are merged over the previous row (see merge_rows).
+"""
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from ..settings import get_cache_dir
+
+# A renamed file must share at least this share of its pages with an earlier document
+RENAMED_MIN_OVERLAP = 0.8
+
+# Oldest documents are forgotten beyond this many
+MAX_DOCUMENTS = 10000
+
+# SQLite's bound-parameter limit is 999 on older builds
+_QUERY_BATCH = 900
+
+_WHITESPACE = re.compile(r"\s+")
+_VERSION_TOKENS = re.compile(
+    r"(?:^|[\s_.-])(?:v\d+|rev(?:ision)?\d*|revised|updated|amended|final|draft|copy|\(\d+\)|\d{8}|\d{4}-\d{2}-\d{2})(?=$|[\s_.-])"
+)
+
+
+def page_fingerprint(text: str) -> str:
+    """Hash of a page's text with whitespace collapsed; "" for blank pages (never matched)."""
+    normalized = _WHITESPACE.sub(" ", text).strip()
+    if not normalized:
+        return ""
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:32]
+
+
+def page_fingerprints(pages: List[str]) -> List[str]:
+    return [page_fingerprint(p) for p in pages]
+
+
+def lineage_key(filename: str) -> str:
+    """Filename without directory, extension and version decorations: "Fund_Q3_v2 (1).pdf" -> "fund_q3"."""
+    stem = os.path.splitext(os.path.basename(filename or ""))[0].lower()
+    previous = None
+    while previous != stem:
+        previous = stem
+        stem = _VERSION_TOKENS.sub("", stem)
+    return re.sub(r"[^a-z0-9]+", "_", stem).strip("_")
+
+
+def value_forms(value: Any) -> List[str]:
+    """How a field value may be printed on a page, normalized for matching."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        forms = [str(value), f"{value:,}"]
+        if isinstance(value, float) and value.is_integer():
+            forms += [str(int(value)), f"{int(value):,}"]
+        return [f.lower() for f in forms]
+    text = _WHITESPACE.sub(" ", str(value)).strip().lower()
+    return [text] if text else []
+
+
+def locate_fields(row: Dict[str, Any], pages: List[str], fingerprints: List[str]) -> Dict[str, List[str]]:
+    """Fingerprints of the pages each non-empty field value appears on; [] when it is not found verbatim."""
+    normalized = [_WHITESPACE.sub(" ", p).lower() for p in pages]
+    located: Dict[str, List[str]] = {}
+    for key, value in row.items():
+        forms = value_forms(value) if value not in ("", None) else []
+        if not forms:
+            continue
+        located[key] = sorted({fp for text, fp in zip(normalized, fingerprints) if fp and any(f in text for f in forms)})
+    return located
+
+
+@dataclass
+class Lineage:
+    """An earlier extraction of (a version of) the same document."""
+
+    doc_hash: str
+    filename: str
+    match: str  # "filename" or "pages"
+    overlap: float
+    fingerprints: Set[str]
+    row: Dict[str, Any]
+    field_pages: Dict[str, List[str]]
+
+
+@dataclass
+class MergeReport:
+    previous: str
+    match: str
+    pages_total: int
+    pages_changed: List[int] = field(default_factory=list)
+    refreshed: List[str] = field(default_factory=list)
+    reused: List[str] = field(default_factory=list)
+
+
+def merge_rows(
+    lineage: Lineage,
+    fresh: Dict[str, Any],
+    pages: List[str],
+    fingerprints: List[str],
+    field_order: List[str],
+) -> Tuple[Dict[str, Any], List[str], List[str]]:
+    """Merge the row extracted from the changed pages over the previous row.
+
+    A field is refreshed when the changed pages produced a value for it, or when the page its
+    previous value was read from changed and that value no longer appears anywhere in the
+    document (it is cleared). Otherwise the previous value is reused, including values whose
+    source page could not be located (model-normalized values).
+    Returns (row, refreshed keys, reused keys).
+    """
+    current = set(fingerprints)
+    normalized: Optional[List[str]] = None
+    row: Dict[str, Any] = {}
+    refreshed: List[str] = []
+    reused: List[str] = []
+    for key in field_order:
+        new = fresh.get(key, "")
+        old = lineage.row.get(key, "")
+        if new not in ("", None):
+            row[key] = new
+            refreshed.append(key)
+            continue
+        sources = lineage.field_pages.get(key, [])
+        if old in ("", None) or not sources or all(fp in current for fp in sources):
+            row[key] = old
+            reused.append(key)
+            continue
+        if normalized is None:
+            normalized = [_WHITESPACE.sub(" ", p).lower() for p in pages]
+        if any(f in text for text in normalized for f in value_forms(old)):
+            row[key] = old
+            reused.append(key)
+        else:
+            row[key] = ""
+            refreshed.append(key)
+    return row, refreshed, reused
+
+
+class LineageStore:
+    """Documents, their page fingerprints and extracted rows in SQLite next to the extraction cache.
+
+    Falls back to an in-memory database when the cache directory is not writable (serverless).
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        try:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.Error:
+            self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "doc_hash TEXT PRIMARY KEY, lineage TEXT NOT NULL, filename TEXT NOT NULL, pages INTEGER NOT NULL, created REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS documents_lineage ON documents(lineage);"
+            "CREATE TABLE IF NOT EXISTS pages (fingerprint TEXT NOT NULL, doc_hash TEXT NOT NULL, PRIMARY KEY (fingerprint, doc_hash));"
+            "CREATE INDEX IF NOT EXISTS pages_doc ON pages(doc_hash);"
+            "CREATE TABLE IF NOT EXISTS extractions ("
+            "doc_hash TEXT NOT NULL, template_key TEXT NOT NULL, row TEXT NOT NULL, field_pages TEXT NOT NULL, "
+            "PRIMARY KEY (doc_hash, template_key));"
+        )
+        self._conn.commit()
+
+    def record(
+        self,
+        doc_hash: str,
+        filename: str,
+        fingerprints: List[str],
+        template_key: str,
+        row: Dict[str, Any],
+        field_pages: Dict[str, List[str]],
+    ) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents (doc_hash, lineage, filename, pages, created) VALUES (?, ?, ?, ?, ?)",
+                (doc_hash, lineage_key(filename), filename, len(fingerprints), time.time()),
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO pages (fingerprint, doc_hash) VALUES (?, ?)",
+                [(fp, doc_hash) for fp in set(fingerprints) if fp],
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO extractions (doc_hash, template_key, row, field_pages) VALUES (?, ?, ?, ?)",
+                (doc_hash, template_key, json.dumps(row), json.dumps(field_pages)),
+            )
+            self._prune()
+            self._conn.commit()
+
+    def _prune(self) -> None:
+        stale = [
+            r[0]
+            for r in self._conn.execute(
+                "SELECT doc_hash FROM documents ORDER BY created DESC LIMIT -1 OFFSET ?", (MAX_DOCUMENTS,)
+            ).fetchall()
+        ]
+        for table in ("documents", "pages", "extractions"):
+            self._conn.executemany(f"DELETE FROM {table} WHERE doc_hash = ?", [(h,) for h in stale])
+
+    def _shared_pages(self, fingerprints: Iterable[str]) -> Dict[str, int]:
+        unique = sorted({fp for fp in fingerprints if fp})
+        shared: Dict[str, int] = {}
+        for i in range(0, len(unique), _QUERY_BATCH):
+            batch = unique[i : i + _QUERY_BATCH]
+            query = f"SELECT doc_hash, COUNT(*) FROM pages WHERE fingerprint IN ({','.join('?' * len(batch))}) GROUP BY doc_hash"
+            for doc_hash, count in self._conn.execute(query, batch):
+                shared[doc_hash] = shared.get(doc_hash, 0) + count
+        return shared
+
+    def find(self, doc_hash: str, filename: str, fingerprints: List[str], template_key: str, min_overlap: float) -> Optional[Lineage]:
+        """The earlier document this one most likely revises, with its extraction for ``template_key``.
+
+        Same filename lineage needs ``min_overlap`` of this document's pages to be unchanged; any
+        other document needs RENAMED_MIN_OVERLAP. Ties go to the most recent document.
+        """
+        distinct = {fp for fp in fingerprints if fp}
+        if not distinct:
+            return None
+        key = lineage_key(filename)
+        with self._lock:
+            shared = self._shared_pages(distinct)
+            shared.pop(doc_hash, None)
+            if not shared:
+                return None
+            marks = ",".join("?" * len(shared))
+            docs = self._conn.execute(
+                f"SELECT d.doc_hash, d.lineage, d.filename, d.created, e.row, e.field_pages FROM documents d "
+                f"JOIN extractions e ON e.doc_hash = d.doc_hash AND e.template_key = ? WHERE d.doc_hash IN ({marks})",
+                [template_key, *shared],
+            ).fetchall()
+            best: Optional[Tuple[Tuple[bool, float, float], Any]] = None
+            for candidate, lineage, name, created, row, field_pages in docs:
+                overlap = shared[candidate] / len(distinct)
+                same_name = bool(key) and lineage == key
+                if overlap < (min_overlap if same_name else max(min_overlap, RENAMED_MIN_OVERLAP)):
+                    continue
+                rank = (same_name, overlap, created)
+                if best is None or rank > best[0]:
+                    best = (rank, (candidate, name, same_name, overlap, row, field_pages))
+            if best is None:
+                return None
+            candidate, name, same_name, overlap, row, field_pages = best[1]
+            old_pages = {r[0] for r in self._conn.execute("SELECT fingerprint FROM pages WHERE doc_hash = ?", (candidate,))}
+        return Lineage(
+            doc_hash=candidate,
+            filename=name,
+            match="filename" if same_name else "pages",
+            overlap=round(overlap, 3),
+            fingerprints=old_pages,
+            row=json.loads(row),
+            field_pages=json.loads(field_pages),
+        )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.executescript("DELETE FROM documents; DELETE FROM pages; DELETE FROM extractions;")
+            self._conn.commit()
+
+
+_store: Optional[LineageStore] = None
+_store_lock = threading.Lock()
+
+
+def get_lineage_store() -> LineageStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            try:
+                path = os.path.join(get_cache_dir(), "lineage.sqlite3")
+            except OSError:
+                path = ":memory:"
+            _store = LineageStore(path)
+        return _store
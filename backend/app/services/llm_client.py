@@ -0,0 +1,172 @@
+from typing import TYPE_CHECKING, Any, Optional
+import asyncio
+import time
+from .llm_scheduler import reset_schedulers
+from .metrics import LLM_TOKENS
+from .progress import emit
+from ..settings import (
+    get_openai_api_key,
+    get_openai_model,
+    get_openai_base_url,
+    get_gemini_api_key,
+    get_gemini_model,
+    get_llm_concurrency,
+    get_llm_max_connections,
+    get_llm_max_keepalive,
+    get_llm_timeout,
+    get_llm_connect_timeout,
+)
+
+if TYPE_CHECKING:
+    import httpx
+
+def _http2_available() -> bool:
+    try:
+        import h2  # type: ignore  # noqa: F401
+        return True
+    except Exception:
+        return False
+
+
+def _count_tokens(provider: str, prompt_tokens: Optional[int], completion_tokens: Optional[int]) -> None:
+    if prompt_tokens:
+        LLM_TOKENS.inc(prompt_tokens, provider=provider, kind="prompt")
+    if completion_tokens:
+        LLM_TOKENS.inc(completion_tokens, provider=provider, kind="completion")
+
+
+class OpenAIClient:
+    """Long-lived pooled HTTP client for Chat Completions, with a cap on in-flight requests."""
+
+    def __init__(self):
+        self._client: Optional["httpx.AsyncClient"] = None
+        self._semaphore = asyncio.Semaphore(get_llm_concurrency())
+
+    def _get_client(self) -> "httpx.AsyncClient":
+        if self._client is None or self._client.is_closed:
+            # httpx is imported on first use so it stays out of the cold-start import path
+            import httpx
+
+            self._client = httpx.AsyncClient(
+                http2=_http2_available(),
+                limits=httpx.Limits(
+                    max_connections=get_llm_max_connections(),
+                    max_keepalive_connections=get_llm_max_keepalive(),
+                ),
+                timeout=httpx.Timeout(get_llm_timeout(), connect=get_llm_connect_timeout()),
+            )
+        return self._client
+
+    async def chat(self, prompt: str) -> str:
+        api_key = get_openai_api_key()
+        if not api_key:
+            raise RuntimeError("OPENAI_API_KEY not set")
+
+        headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        }
+        body = {
+            "model": get_openai_model(),
+            "messages": [
+                {"role": "system", "content": "You output strict JSON only."},
+                {"role": "user", "content": prompt},
+            ],
+            "temperature": 0.0,
+        }
+        async with self._semaphore:
+            emit("llm_started", provider="openai", prompt_chars=len(prompt))
+            t0 = time.perf_counter()
+            resp = await self._get_client().post(f"{get_openai_base_url()}/chat/completions", headers=headers, json=body)
+        resp.raise_for_status()
+        data = resp.json()
+        usage = data.get("usage") or {}
+        _count_tokens("openai", usage.get("prompt_tokens"), usage.get("completion_tokens"))
+        emit(
+            "llm_finished",
+            provider="openai",
+            ms=round((time.perf_counter() - t0) * 1000, 1),
+            prompt_tokens=usage.get("prompt_tokens"),
+            completion_tokens=usage.get("completion_tokens"),
+        )
+        return data["choices"][0]["message"]["content"]
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class GeminiClient:
+    """Configures google.generativeai once and reuses the model object across calls."""
+
+    def __init__(self):
+        self._model: Any = None
+        self._semaphore = asyncio.Semaphore(get_llm_concurrency())
+
+    @property
+    def enabled(self) -> bool:
+        return bool(get_gemini_api_key())
+
+    def _get_model(self) -> Any:
+        if self._model is None:
+            import google.generativeai as genai  # type: ignore
+            genai.configure(api_key=get_gemini_api_key())
+            self._model = genai.GenerativeModel(get_gemini_model())
+        return self._model
+
+    async def generate(self, prompt: str) -> str:
+        if not self.enabled:
+            raise RuntimeError("GEMINI_API_KEY not set")
+        model = self._get_model()
+        async with self._semaphore:
+            emit("llm_started", provider="gemini", prompt_chars=len(prompt))
+            t0 = time.perf_counter()
+            resp = await model.generate_content_async(prompt)
+        usage = getattr(resp, "usage_metadata", None)
+        _count_tokens("gemini", getattr(usage, "prompt_token_count", None), getattr(usage, "candidates_token_count", None))
+        emit(
+            "llm_finished",
+            provider="gemini",
+            ms=round((time.perf_counter() - t0) * 1000, 1),
+            prompt_tokens=getattr(usage, "prompt_token_count", None),
+            completion_tokens=getattr(usage, "candidates_token_count", None),
+        )
+        return resp.text or "{}"
+
+
+_openai_client: Optional[OpenAIClient] = None
+_gemini_client: Optional[GeminiClient] = None
+
+
+def get_openai_client() -> OpenAIClient:
+    global _openai_client
+    if _openai_client is None:
+        _openai_client = OpenAIClient()
+    return _openai_client
+
+
+def get_gemini_client() -> GeminiClient:
+    global _gemini_client
+    if _gemini_client is None:
+        _gemini_client = GeminiClient()
+    return _gemini_client
+
+
+async def startup_llm_clients() -> None:
+    get_openai_client()._get_client()
+    gemini = get_gemini_client()
+    if gemini.enabled:
+        try:
+            gemini._get_model()
+        except Exception:
+            pass
+
+
+async def shutdown_llm_clients() -> None:
+    global _openai_client, _gemini_client
+    if _openai_client is not None:
+        await _openai_client.aclose()
+    _openai_client = None
+    _gemini_client = None
+    reset_schedulers()
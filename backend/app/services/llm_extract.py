@@ -1,14 +1,47 @@
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
 import json
-import re
-from tenacity import retry, stop_after_attempt, wait_fixed
-from .templates import get_template_field_order, get_all_template_fields
-from ..settings import is_mock_llm_enabled, get_openai_api_key
-import os
+from .templates import get_compiled, get_template_field_order
+from .llm_client import get_openai_client, get_gemini_client
+from .llm_scheduler import get_scheduler
+from .metrics import EXTRACTIONS, LLM_REQUESTS, span
+from .batching import get_document_batcher
+from .chunking import Chunk, chunk_pages, reduce_chunk_results
+from .retrieval import select_passages
+from .rules import extract_with_rules
+from .pdf_extractor import PdfTable
+from .progress import emit
+from .tables import map_tables, merge_table_rows, remaining_template
+from ..settings import (
+    is_mock_llm_enabled,
+    is_page_filter_enabled,
+    get_table_min_coverage,
+    get_extraction_mode,
+    get_openai_model,
+    get_llm_chunking_mode,
+    get_llm_chunk_tokens,
+    get_llm_max_chunks,
+    get_llm_retrieval_mode,
+    get_llm_retrieval_top_k,
+    get_llm_retrieval_group_size,
+    get_llm_batch_max_docs,
+)
 
+# Bump whenever prompt wording or response handling changes so cached rows are not reused
+PROMPT_VERSION = "2"
 
-def _build_prompt(pdf_text: str, template: Dict[str, Any]) -> str:
+# Characters of document text sent in a single (non-chunked) prompt
+PROMPT_TEXT_LIMIT = 15000
+
+
+@span("build_prompt")
+def _build_prompt(pdf_text: str, template: Dict[str, Any], note: Optional[str] = None) -> str:
     template_id = template.get("templateId", "template")
+    if note is None:
+        doc_text = pdf_text[:PROMPT_TEXT_LIMIT]
+    else:
+        # Chunks and retrieved passages are already budgeted; tell the model it only sees an excerpt
+        doc_text = note + "\n" + pdf_text
     
     if template.get("multiSheet", False) and "sheets" in template:
         # Multi-sheet template
@@ -18,32 +51,24 @@ def _build_prompt(pdf_text: str, template: Dict[str, Any]) -> str:
             "The template has multiple sheets with the following structure:\n\n"
         )
         
-        for i, sheet in enumerate(template.get("sheets", []), 1):
-            sheet_name = sheet.get("name", f"Sheet {i}")
-            description = sheet.get("description", "")
-            fields = [field["key"] for field in sheet.get("fields", [])]
-            
-            prompt += f"{i}. {sheet_name}\n"
-            prompt += f"   Description: {description}\n"
-            prompt += f"   Fields: {', '.join(fields)}\n\n"
+        prompt += get_compiled(template).prompt_fields
         
         prompt += (
             "Extract all relevant data and organize it by sheet. "
             "For each field, provide the extracted value or empty string if not found.\n"
             "Output only valid JSON with all field keys from all sheets.\n"
-            "PDF Text:\n" + pdf_text[:15000]
+            "PDF Text:\n" + doc_text
         )
     else:
         # Single-sheet template (legacy)
-        fields = get_template_field_order(template)
-        field_list = "\n".join([f"- {k}" for k in fields])
+        field_list = get_compiled(template).prompt_fields
         prompt = (
             "You are a data extraction expert.\n"
             f"Extract the following fields from this PDF text according to {template_id}:\n"
             f"{field_list}\n\n"
             "Output only valid JSON (no markdown), with keys matching the fields.\n"
             "If a field is missing, use an empty string.\n"
-            "PDF Text:\n" + pdf_text[:15000]
+            "PDF Text:\n" + doc_text
         )
     
     return prompt
@@ -56,34 +81,27 @@ def _mock_extract(pdf_text: str, template: Dict[str, Any]) -> Dict[str, Any]:
     return result
 
 
-@retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
-def _call_openai(prompt: str) -> str:
-    # Minimal httpx call to OpenAI Chat Completions (gpt-4o-mini as example)
-    import httpx
-
-    api_key = get_openai_api_key()
-    if not api_key:
-        raise RuntimeError("OPENAI_API_KEY not set")
-
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json",
-    }
-    model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-    body = {
-        "model": model,
-        "messages": [
-            {"role": "system", "content": "You output strict JSON only."},
-            {"role": "user", "content": prompt},
-        ],
-        "temperature": 0.0,
-    }
-    with httpx.Client(timeout=60) as client:
-        resp = client.post("https://api.openai.com/v1/chat/completions", headers=headers, json=body)
-        resp.raise_for_status()
-        data = resp.json()
-        content = data["choices"][0]["message"]["content"]
-        return content
+async def _call_openai(prompt: str) -> str:
+    # Chat Completions over the shared pooled client; rate limits, retries and coalescing in the scheduler
+    with span("call_openai"):
+        try:
+            content = await get_scheduler("openai").submit(prompt, get_openai_client().chat)
+        except Exception:
+            LLM_REQUESTS.inc(provider="openai", outcome="error")
+            raise
+    LLM_REQUESTS.inc(provider="openai", outcome="ok")
+    return content
+
+
+async def _call_gemini(prompt: str) -> str:
+    with span("gemini"):
+        try:
+            content = await get_scheduler("gemini").submit(prompt, get_gemini_client().generate)
+        except Exception:
+            LLM_REQUESTS.inc(provider="gemini", outcome="error")
+            raise
+    LLM_REQUESTS.inc(provider="gemini", outcome="ok")
+    return content
 
 
 def _clean_json_response(text: str) -> Dict[str, Any]:
@@ -115,6 +133,7 @@ def _coerce_to_template(data: Dict[str, Any], template: Dict[str, Any]) -> Dict[
     return coerced
 
 
+@span("rule_based")
 def _rule_based_extract(pdf_text: str, template: Dict[str, Any]) -> Dict[str, Any]:
     # For template1, we need to create the specific template structure rows
     template_id = template.get("templateId", "")
@@ -182,60 +201,163 @@ def _rule_based_extract(pdf_text: str, template: Dict[str, Any]) -> Dict[str, An
         # Return the first row (we'll handle multiple rows in the main extraction function)
         return template_rows[0]
     
-    # For other templates, use the original logic
-    text = pdf_text or ""
-    lower = text.lower()
-    result: Dict[str, Any] = {}
+    # For other templates, apply the template's compiled field rules in one pass
+    matches = extract_with_rules(pdf_text or "", template)
+    # Where each value came from and how much the rule that found it is trusted
+    emit(
+        "rules_matched",
+        fields={
+            key: {"confidence": m.confidence, "line": m.line, "start": m.start, "end": m.end, "rule": m.rule}
+            for key, m in matches.items()
+        },
+    )
+    return {key: (matches[key].value if key in matches else "") for key in get_template_field_order(template)}
+
+
+def _use_retrieval(pdf_text: str) -> bool:
+    mode = get_llm_retrieval_mode()
+    return mode == "always" or (mode == "auto" and len(pdf_text) > PROMPT_TEXT_LIMIT)
 
-    # Common regexes
-    email_match = re.search(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}", text)
-    currency_match = re.search(r"\b(USD|EUR|GBP|INR|AED|JPY|CHF|CNY|AUD|CAD)\b", text, re.IGNORECASE)
-    symbol_match = re.search(r"[€£$]", text)
-    # Amount candidates (pick the largest-looking number)
-    amount_candidates = [m.group(0) for m in re.finditer(r"\b\$?\s?(\d{1,3}(,\d{3})+|\d+)(\.\d+)?\b", text)]
-    amount_value = next(iter(amount_candidates), "")
-
-    # Date candidates
-    date_patterns = [
-        r"\b\d{4}-\d{2}-\d{2}\b",  # 2025-10-13
-        r"\b\d{2}/\d{2}/\d{4}\b",  # 13/10/2025
-        r"\b\d{2}-\d{2}-\d{4}\b",
-        r"\b(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s+\d{1,2},\s+\d{4}\b",
+
+def _plan_chunks(pdf_text: str, pages: Optional[List[str]]) -> List[Chunk]:
+    if get_llm_chunking_mode() == "off" or len(pdf_text) <= PROMPT_TEXT_LIMIT:
+        return []
+    return chunk_pages(pages or [pdf_text], get_llm_chunk_tokens(), get_llm_max_chunks())
+
+
+async def _complete_json(prompt: str) -> Tuple[Dict[str, Any], str]:
+    try:
+        parsed = _clean_json_response(await _call_openai(prompt))
+        if isinstance(parsed, dict) and parsed:
+            return parsed, "openai"
+    except Exception:
+        pass
+    try:
+        gemini = get_gemini_client()
+        if gemini.enabled:
+            parsed = _clean_json_response(await _call_gemini(prompt))
+            if isinstance(parsed, dict) and parsed:
+                return parsed, "gemini"
+    except Exception:
+        pass
+    return {}, ""
+
+
+async def _extract_chunked(chunks: List[Chunk], template: Dict[str, Any]) -> Optional[Tuple[Dict[str, Any], str]]:
+    """Map each chunk through the LLM concurrently, then reduce to a single row."""
+    total = len(chunks)
+    prompts = [
+        _build_prompt(
+            c.text,
+            template,
+            note=f"This is part {c.index + 1} of {total} of the document. Use an empty string for fields not present in this part.",
+        )
+        for c in chunks
     ]
-    date_value = ""
-    for p in date_patterns:
-        m = re.search(p, text, re.IGNORECASE)
-        if m:
-            date_value = m.group(0)
-            break
-
-    # Heuristics for names
-    fund_line = next((ln for ln in text.splitlines() if re.search(r"\bFund\b", ln)), "")
-    manager_line = next((ln for ln in text.splitlines() if re.search(r"\bManager\b|General Partner|Investment Manager", ln, re.IGNORECASE)), "")
-    investor_line = next((ln for ln in text.splitlines() if re.search(r"\bInvestor\b|Limited Partner|LP\b", ln, re.IGNORECASE)), "")
-
-    # Template-driven population
-    for key in get_template_field_order(template):
-        v = ""
-        if key in ("contact_email", "email", "manager_email") and email_match:
-            v = email_match.group(0)
-        elif key in ("currency",):
-            v = (currency_match.group(0).upper() if currency_match else ("USD" if symbol_match and symbol_match.group(0) == "$" else ""))
-        elif key in ("total_commitment", "commitment_amount", "call_amount", "amount"):
-            v = amount_value
-        elif key in ("report_date", "date", "statement_date"):
-            v = date_value
-        elif key in ("fund_name",):
-            v = fund_line.strip()[:120]
-        elif key in ("manager",):
-            v = re.sub(r".*?:\s*", "", manager_line).strip()[:120] if manager_line else ""
-        elif key in ("investor_name",):
-            v = re.sub(r".*?:\s*", "", investor_line).strip()[:120] if investor_line else ""
-        result[key] = v
-    return result
+    return await _map_reduce(prompts, template)
 
 
-def extract_structured_data(pdf_text: str, template: Dict[str, Any]) -> List[Dict[str, Any]]:
+async def _extract_retrieval(pages: List[str], template: Dict[str, Any]) -> Optional[Tuple[Dict[str, Any], str]]:
+    """Prompt each field group with only its top-ranked passages, then merge the groups."""
+    selections = select_passages(pages, template, get_llm_retrieval_top_k(), get_llm_retrieval_group_size())
+    prompts = [
+        _build_prompt(
+            sel.text[:PROMPT_TEXT_LIMIT],
+            sel.sub_template(template),
+            note="These are the passages most relevant to the fields below. Use an empty string for fields not present.",
+        )
+        for sel in selections
+        if sel.passages
+    ]
+    if not prompts:
+        return None
+    return await _map_reduce(prompts, template)
+
+
+async def _map_reduce(prompts: List[str], template: Dict[str, Any]) -> Optional[Tuple[Dict[str, Any], str]]:
+    mapped = await asyncio.gather(*(_complete_json(p) for p in prompts))
+    results = [data for data, _ in mapped]
+    sources = [src for _, src in mapped if src]
+    if not sources:
+        return None
+    merged, _ = reduce_chunk_results(results, template)
+    coerced = _coerce_to_template(merged, template)
+    if all(v == "" for v in coerced.values()):
+        return None
+    return coerced, ("openai" if "openai" in sources else "gemini")
+
+
+async def _extract_batched(pdf_text: str, template: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """A small document's row from a prompt shared with other documents in flight (see batching.py).
+
+    None when the document is not small enough or its answer did not validate; it is then
+    prompted on its own.
+    """
+    if len(pdf_text) > PROMPT_TEXT_LIMIT:
+        return None
+    batcher = get_document_batcher()
+    if not batcher.accepts(pdf_text):
+        return None
+    data = await batcher.extract(pdf_text, template, _call_openai)
+    if not data:
+        return None
+    return _coerce_to_template(data, template)
+
+
+def get_prompt_version() -> str:
+    """PROMPT_VERSION plus the prompt strategy, since both change what the model is shown."""
+    page_filter = "pages" if is_page_filter_enabled() else "all"
+    batching = "batch" if get_llm_batch_max_docs() > 1 else "single"
+    return f"{PROMPT_VERSION}:{get_llm_retrieval_mode()}:{get_llm_chunking_mode()}:{page_filter}:{batching}"
+
+
+def get_model_name() -> str:
+    """Identifies the extractor in cache keys."""
+    if get_extraction_mode() == "rules":
+        return "rules"
+    return "mock" if is_mock_llm_enabled() else get_openai_model()
+
+
+async def extract_structured_data(pdf_text: str, template: Dict[str, Any], pages: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    rows, _ = await extract_structured_data_with_source(pdf_text, template, pages)
+    return rows
+
+
+async def extract_structured_data_with_source(
+    pdf_text: str,
+    template: Dict[str, Any],
+    pages: Optional[List[str]] = None,
+    tables: Optional[List[PdfTable]] = None,
+) -> Tuple[List[Dict[str, Any]], str]:
+    """Same as extract_structured_data, also reporting which path produced the rows.
+
+    Source is one of "static", "mock", "openai", "gemini", "rules" or "tables". When ``pages`` is
+    given and the text exceeds the prompt window, chunks follow page boundaries. Sections filled
+    from ``tables`` (see tables.py) are left out of the prompt; when tables cover every section
+    no LLM call is made. Table rows of a flat template keep the extracted values of the fields
+    their table does not have.
+    """
+    table_rows: List[Dict[str, Any]] = []
+    flat_tables = False
+    if tables:
+        mapping = map_tables(tables, template, get_table_min_coverage())
+        table_rows = mapping.rows
+        flat_tables = None in mapping.sections
+        template = remaining_template(template, mapping)
+        if template is None:
+            EXTRACTIONS.inc(source="tables")
+            return table_rows, "tables"
+    rows, source = await _extract_with_source(pdf_text, template, pages)
+    # Counted per source so fallback rates (e.g. rules vs openai) can be derived
+    EXTRACTIONS.inc(source=source)
+    if flat_tables:
+        return merge_table_rows(table_rows, rows[0] if rows else {}), source
+    return rows + table_rows, source
+
+
+async def _extract_with_source(
+    pdf_text: str, template: Dict[str, Any], pages: Optional[List[str]]
+) -> Tuple[List[Dict[str, Any]], str]:
     template_id = template.get("templateId", "")
     
     # Special handling for template1 - return multiple rows for the template structure
@@ -297,7 +419,7 @@ def extract_structured_data(pdf_text: str, template: Dict[str, Any]) -> List[Dic
                 "description": "List of accepted values for dropdown fields (e.g., countries, currencies)."
             }
         ]
-        return template_rows
+        return template_rows, "static"
     
     # Special handling for template2 - return multiple rows for the template structure
     if template_id == "template2":
@@ -348,17 +470,39 @@ def extract_structured_data(pdf_text: str, template: Dict[str, Any]) -> List[Dic
                 "description": ""
             }
         ]
-        return template_rows
+        return template_rows, "static"
     
     # For other templates, return single row as before
+    if get_extraction_mode() == "rules":
+        # High-throughput mode: precompiled rules only, no LLM round-trip
+        data = _rule_based_extract(pdf_text, template)
+        return [_coerce_to_template(data, template)], "rules"
+
     if is_mock_llm_enabled():
         # Use deterministic rule-based extraction in mock mode for more useful outputs
         data = _rule_based_extract(pdf_text, template)
-        return [_coerce_to_template(data, template)]
+        return [_coerce_to_template(data, template)], "mock"
+
+    if _use_retrieval(pdf_text):
+        narrowed = await _extract_retrieval(pages or [pdf_text], template)
+        if narrowed is not None:
+            return [narrowed[0]], narrowed[1]
+
+    chunks = _plan_chunks(pdf_text, pages)
+    if len(chunks) > 1:
+        chunked = await _extract_chunked(chunks, template)
+        if chunked is not None:
+            return [chunked[0]], chunked[1]
+        rb = _rule_based_extract(pdf_text, template)
+        return [_coerce_to_template(rb, template)], "rules"
+
+    batched = await _extract_batched(pdf_text, template)
+    if batched is not None:
+        return [batched], "openai"
 
     prompt = _build_prompt(pdf_text, template)
     try:
-        raw = _call_openai(prompt)
+        raw = await _call_openai(prompt)
         parsed = _clean_json_response(raw)
         # If model returns nothing or missing keys, fall back
         if not isinstance(parsed, dict) or not parsed:
@@ -366,26 +510,21 @@ def extract_structured_data(pdf_text: str, template: Dict[str, Any]) -> List[Dic
         coerced = _coerce_to_template(parsed, template)
         if all(v == "" for v in coerced.values()):
             raise ValueError("LLM returned empty fields")
-        return [coerced]
+        return [coerced], "openai"
     except Exception:
         # Try Gemini if key provided
         try:
-            import google.generativeai as genai  # type: ignore
-            gemini_key = os.getenv("GEMINI_API_KEY")
-            if gemini_key:
-                genai.configure(api_key=gemini_key)
-                model_name = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
-                model = genai.GenerativeModel(model_name)
-                resp = model.generate_content(prompt)
-                content = resp.text or "{}"
+            gemini = get_gemini_client()
+            if gemini.enabled:
+                content = await _call_gemini(prompt)
                 parsed = _clean_json_response(content)
                 coerced = _coerce_to_template(parsed, template)
                 if any(v for v in coerced.values()):
-                    return [coerced]
+                    return [coerced], "gemini"
         except Exception:
             pass
 
         rb = _rule_based_extract(pdf_text, template)
-        return [_coerce_to_template(rb, template)]
+        return [_coerce_to_template(rb, template)], "rules"
 
 
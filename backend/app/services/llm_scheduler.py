@@ -0,0 +1,261 @@
+"""Shared admission control for LLM calls.
+
+Every provider call goes through one LLMScheduler per provider, which
+
+- admits requests through token buckets on requests/min and (estimated) tokens/min,
+- serves waiting requests by priority: interactive uploads before background jobs,
+- retries 429s, 5xx and transport errors with full-jitter exponential backoff, waiting at
+  least as long as Retry-After and pausing the whole provider while it is rate limited,
+- halves its admitted rate on a 429 and recovers gradually on success (AIMD),
+- coalesces identical in-flight prompts into a single call.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+import asyncio
+import hashlib
+import heapq
+import itertools
+import random
+import sys
+import time
+from .chunking import CHARS_PER_TOKEN
+from ..settings import (
+    get_llm_rpm,
+    get_llm_tpm,
+    get_llm_max_attempts,
+    get_llm_backoff_base,
+    get_llm_backoff_max,
+)
+
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+# Completion size assumed when reserving tokens/min for a request
+COMPLETION_TOKEN_ESTIMATE = 512
+
+# Floor for the adaptive rate, as a fraction of the configured limit
+MIN_RATE_FRACTION = 0.1
+RECOVERY_STEP = 0.05
+
+RETRYABLE_STATUS = (408, 409, 429, 500, 502, 503, 504)
+
+_priority: ContextVar[str] = ContextVar("llm_priority", default="interactive")
+
+
+@contextmanager
+def llm_priority(priority: str) -> Iterator[None]:
+    """Run LLM calls made inside the block (and tasks started from it) at ``priority``."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def set_llm_priority(priority: str) -> None:
+    _priority.set(priority)
+
+
+def estimate_prompt_tokens(prompt: str) -> int:
+    return len(prompt) // CHARS_PER_TOKEN + COMPLETION_TOKEN_ESTIMATE
+
+
+class TokenBucket:
+    """Refills ``limit`` units per minute up to a burst of ``limit``; a limit of 0 never blocks."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.rate_fraction = 1.0
+        self.level = float(limit)
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        per_second = self.limit * self.rate_fraction / 60.0
+        self.level = min(float(self.limit), self.level + (now - self._updated) * per_second)
+        self._updated = now
+
+    def delay(self, amount: float) -> float:
+        """Seconds until ``amount`` can be taken (requests larger than the burst wait for a full bucket)."""
+        if self.limit <= 0:
+            return 0.0
+        self._refill()
+        amount = min(amount, float(self.limit))
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / (self.limit * self.rate_fraction / 60.0)
+
+    def take(self, amount: float) -> None:
+        if self.limit > 0:
+            self._refill()
+            self.level -= min(amount, float(self.limit))
+
+
+def _httpx() -> Any:
+    # Only set once a client has been created, so checking it never imports httpx
+    return sys.modules.get("httpx")
+
+
+def _status_of(exc: BaseException) -> Optional[int]:
+    httpx = _httpx()
+    if httpx is not None and isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code
+    # google.api_core exceptions carry the HTTP status as .code
+    code = getattr(exc, "code", None)
+    return code if isinstance(code, int) else None
+
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    value = headers.get("retry-after") if headers is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    httpx = _httpx()
+    if httpx is not None and isinstance(exc, httpx.TransportError):
+        return True
+    return _status_of(exc) in RETRYABLE_STATUS
+
+
+class LLMScheduler:
+    def __init__(self, provider: str, rpm: int, tpm: int, max_attempts: int, backoff_base: float, backoff_max: float):
+        self.provider = provider
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._cooldown_until = 0.0
+        self._waiting: List[Tuple[int, int]] = []
+        self._seq = itertools.count()
+        self._cond = asyncio.Condition()
+        self._inflight: Dict[str, Tuple[asyncio.Task, List[int]]] = {}
+        self.stats = {"calls": 0, "coalesced": 0, "retries": 0, "rate_limited": 0, "failures": 0, "queued_ms": 0.0}
+
+    async def _admit(self, priority: int, tokens: int) -> None:
+        entry = (priority, next(self._seq))
+        t0 = time.perf_counter()
+        async with self._cond:
+            heapq.heappush(self._waiting, entry)
+            try:
+                while True:
+                    timeout: Optional[float] = None
+                    if self._waiting[0] == entry:
+                        timeout = max(
+                            self.requests.delay(1),
+                            self.tokens.delay(tokens),
+                            self._cooldown_until - time.monotonic(),
+                        )
+                        if timeout <= 0:
+                            self.requests.take(1)
+                            self.tokens.take(tokens)
+                            return
+                    try:
+                        await asyncio.wait_for(self._cond.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+                self.stats["queued_ms"] += (time.perf_counter() - t0) * 1000
+
+    def _backoff(self, attempt: int, exc: BaseException) -> float:
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        retry_after = _retry_after(exc)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def _on_rate_limited(self, wait: float) -> None:
+        self.stats["rate_limited"] += 1
+        self._cooldown_until = max(self._cooldown_until, time.monotonic() + wait)
+        for bucket in (self.requests, self.tokens):
+            bucket.rate_fraction = max(MIN_RATE_FRACTION, bucket.rate_fraction / 2)
+
+    def _on_success(self) -> None:
+        for bucket in (self.requests, self.tokens):
+            bucket.rate_fraction = min(1.0, bucket.rate_fraction + RECOVERY_STEP)
+
+    async def _execute(self, prompt: str, call: Callable[[str], Awaitable[str]], priority: int) -> str:
+        tokens = estimate_prompt_tokens(prompt)
+        for attempt in range(self.max_attempts):
+            await self._admit(priority, tokens)
+            self.stats["calls"] += 1
+            try:
+                result = await call(prompt)
+            except Exception as exc:
+                if attempt + 1 >= self.max_attempts or not _is_retryable(exc):
+                    self.stats["failures"] += 1
+                    raise
+                wait = self._backoff(attempt, exc)
+                if _status_of(exc) == 429:
+                    self._on_rate_limited(wait)
+                self.stats["retries"] += 1
+                await asyncio.sleep(wait)
+                continue
+            self._on_success()
+            return result
+        raise RuntimeError("unreachable")
+
+    async def submit(self, prompt: str, call: Callable[[str], Awaitable[str]], priority: Optional[str] = None) -> str:
+        """Run ``call(prompt)`` under the provider's limits; identical concurrent prompts share one call."""
+        key = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        entry = self._inflight.get(key)
+        if entry is None:
+            level = PRIORITIES.get(priority or _priority.get(), 0)
+            task = asyncio.ensure_future(self._execute(prompt, call, level))
+            entry = (task, [0])
+            self._inflight[key] = entry
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.stats["coalesced"] += 1
+        task, waiters = entry
+        waiters[0] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            # The call keeps running while anyone is still waiting for it
+            if waiters[0] == 1 and not task.done():
+                task.cancel()
+            raise
+        finally:
+            waiters[0] -= 1
+
+
+_schedulers: Dict[str, LLMScheduler] = {}
+
+
+def get_scheduler(provider: str) -> LLMScheduler:
+    scheduler = _schedulers.get(provider)
+    if scheduler is None:
+        scheduler = LLMScheduler(
+            provider,
+            rpm=get_llm_rpm(provider),
+            tpm=get_llm_tpm(provider),
+            max_attempts=get_llm_max_attempts(),
+            backoff_base=get_llm_backoff_base(),
+            backoff_max=get_llm_backoff_max(),
+        )
+        _schedulers[provider] = scheduler
+    return scheduler
+
+
+def get_scheduler_stats() -> Dict[str, Any]:
+    return {name: dict(s.stats) for name, s in _schedulers.items()}
+
+
+def reset_schedulers() -> None:
+    _schedulers.clear()
@@ -0,0 +1,142 @@
+"""In-process counters, histograms and timing spans, rendered in the Prometheus text format.
+
+Instruments are plain dicts behind one lock, so recording costs a dict update; gauges that
+already live elsewhere (cache and scheduler stats) are read by collectors at scrape time.
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Sequence, Tuple
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# (metric name, type, help, [(labels, value)])
+Family = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+_lock = threading.Lock()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with _lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def total(self) -> float:
+        with _lock:
+            return sum(self._values.values())
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with _lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(dict(zip(self.labelnames, key)))} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # label values -> (per-bucket counts incl. +Inf, sum)
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with _lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = ([0] * (len(self.buckets) + 1), [0.0])
+                self._values[key] = entry
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with _lock:
+            items = [(key, list(counts), total[0]) for key, (counts, total) in self._values.items()]
+        for key, counts, total in items:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+STAGE_SECONDS = Histogram("extraction_stage_seconds", "Time spent per pipeline stage", ["stage"])
+EXTRACTIONS = Counter("extraction_results_total", "Structured extractions by the source that produced the rows", ["source"])
+LLM_REQUESTS = Counter("llm_requests_total", "LLM calls by provider and outcome (after retries)", ["provider", "outcome"])
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens reported by the provider", ["provider", "kind"])
+HTTP_SECONDS = Histogram("http_request_duration_seconds", "HTTP request latency", ["method", "route", "status"])
+BYTES_IN = Counter("http_request_bytes_total", "Request body bytes received", ["route"])
+BYTES_OUT = Counter("http_response_bytes_total", "Response body bytes sent", ["route"])
+PAGES = Counter("extraction_pages_total", "Pages by classifier label and what was done with them", ["label", "action"])
+PAGE_BYTES_DROPPED = Counter("extraction_page_bytes_dropped_total", "Page text bytes left out of prompts by the page filter")
+LLM_BATCHED_DOCS = Counter(
+    "llm_batched_documents_total", "Small documents sent in shared prompts: answered, or retried on their own", ["outcome"]
+)
+INCREMENTAL_FIELDS = Counter(
+    "extraction_incremental_fields_total", "Fields of revised documents refreshed from changed pages or reused", ["outcome"]
+)
+
+_instruments: List = [STAGE_SECONDS, EXTRACTIONS, LLM_REQUESTS, LLM_TOKENS, HTTP_SECONDS, BYTES_IN, BYTES_OUT, PAGES, PAGE_BYTES_DROPPED, INCREMENTAL_FIELDS, LLM_BATCHED_DOCS]
+_collectors: List[Callable[[], Iterable[Family]]] = []
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time the block into extraction_stage_seconds{stage=...}, including when it raises."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - t0, stage=stage)
+
+
+def register_collector(collector: Callable[[], Iterable[Family]]) -> None:
+    """Add a callable that returns metric families computed at scrape time."""
+    if collector not in _collectors:
+        _collectors.append(collector)
+
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    for instrument in _instruments:
+        lines.extend(instrument.render())
+    for collector in _collectors:
+        for name, kind, help, samples in collector():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,84 @@
+from typing import Any, Dict, List, Tuple
+import io
+import os
+import re
+import zipfile
+from .excel_writer import output_basename, sheet_rows, write_excel
+from .metrics import span
+from .templates import get_template_field_order
+
+OUTPUT_FORMATS = ("xlsx", "csv", "parquet", "ndjson")
+
+MEDIA_TYPES = {
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ".csv": "text/csv",
+    ".parquet": "application/vnd.apache.parquet",
+    ".ndjson": "application/x-ndjson",
+    ".zip": "application/zip",
+}
+
+
+def media_type_for(filename: str) -> str:
+    return MEDIA_TYPES.get(os.path.splitext(filename)[1].lower(), "application/octet-stream")
+
+
+def rows_to_frame(data_rows: List[Dict[str, Any]], fields: List[str]):
+    """Build the table in one vectorized step, columns in template field order."""
+    import pandas as pd
+
+    # object dtype keeps ints as ints when some rows lack a field (no float upcast through NaN)
+    frame = pd.DataFrame(data_rows, columns=fields, dtype=object)
+    return frame.where(frame.notna(), "")
+
+
+@span("write_output")
+def _frame_bytes(frame, fmt: str) -> bytes:
+    if fmt == "csv":
+        return frame.to_csv(index=False).encode("utf-8")
+    if fmt == "ndjson":
+        return frame.to_json(orient="records", lines=True, force_ascii=False).encode("utf-8")
+    if fmt == "parquet":
+        try:
+            import pyarrow  # type: ignore  # noqa: F401
+        except Exception:
+            raise RuntimeError("Parquet output requires pyarrow to be installed")
+        buf = io.BytesIO()
+        # Extraction values are mixed str/number; store them as strings so the schema is stable
+        frame.astype(str).to_parquet(buf, index=False, engine="pyarrow")
+        return buf.getvalue()
+    raise ValueError(f"Unsupported output format: {fmt}")
+
+
+def _safe_name(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", name).strip("_") or "sheet"
+
+
+def write_output(data_rows: List[Dict[str, Any]], template: Dict[str, Any], fmt: str = "xlsx") -> Tuple[str, bytes]:
+    """Write rows in the requested format; returns (filename, content) like write_excel.
+
+    Multi-sheet templates become a zip with one file per sheet; for Parquet the entries use a
+    hive-style ``sheet=<name>/part-0.parquet`` layout so the zip extracts to a partitioned dataset.
+    """
+    fmt = (fmt or "xlsx").lower()
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"Unsupported output format: {fmt}")
+    if fmt == "xlsx":
+        return write_excel(data_rows, template)
+
+    template_id = template.get("templateId", "template")
+    base = output_basename(template_id)
+
+    if template.get("multiSheet", False) and "sheets" in template:
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+            for sheet in template.get("sheets", []):
+                fields = [f["key"] for f in sheet.get("fields", [])]
+                name = _safe_name(sheet.get("name", "Sheet"))
+                entry = f"sheet={name}/part-0.parquet" if fmt == "parquet" else f"{name}.{fmt}"
+                zf.writestr(entry, _frame_bytes(rows_to_frame(sheet_rows(data_rows, fields), fields), fmt))
+        filename, content = f"{base}_{fmt}.zip", buf.getvalue()
+    else:
+        frame = rows_to_frame(data_rows, get_template_field_order(template))
+        filename, content = f"{base}.{fmt}", _frame_bytes(frame, fmt)
+
+    return filename, content
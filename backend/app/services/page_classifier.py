@@ -0,0 +1,151 @@
+"""Local page classifier used to keep boilerplate pages out of prompts.
+
+Each page gets a small vector of keyword and regex features. A fixed weight matrix scores
+the vectors in one numpy product, so there is no model to download or load. Labels:
+
+- financial_statement: balance sheets, statements of operations and cash flows, capital accounts
+- portfolio_company: company profiles, deal teams, company financial highlights
+- legal: disclaimers, confidentiality and forward-looking statement notices
+- toc: tables of contents
+- blank: separator pages with (almost) no text
+- other: anything that scores too low for the labels above
+
+Templates choose which labels are dropped or moved to the back of the prompt (where the
+prompt window cuts first) with an optional ``"pageFilter": {"drop": [...], "demote": [...]}``.
+"""
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+import math
+import re
+
+LABELS = ("financial_statement", "portfolio_company", "legal", "toc")
+BLANK = "blank"
+OTHER = "other"
+
+# Pages with fewer non-whitespace characters than this are blank separators
+BLANK_MAX_CHARS = 40
+
+# The best label score must reach this, otherwise the page is "other"
+MIN_SCORE = 1.0
+
+DEFAULT_DROP = ("blank", "toc")
+DEFAULT_DEMOTE = ("legal",)
+
+_TERMS = {
+    "financial": (
+        r"balance sheets?|statements? of (?:operations|assets|changes|cash ?flows?|financial condition|partners)"
+        r"|net asset value|total assets|total liabilities|partners'? capital|capital accounts?|distributions?"
+        r"|contributions?|(?:un)?realized (?:gains?|losses?)|fair value|net increase|management fees?"
+        r"|carried interest|irr|moic|tvpi|dpi|rvpi|cash and cash equivalents"
+    ),
+    "company": (
+        r"company (?:overview|description|name|profile)|investment (?:thesis|highlights|date)|deal team"
+        r"|headquarter(?:s|ed)|founded|sector|industry|employees|revenue|ebitda|ceo|business description"
+        r"|recent updates|ytd highlights|key (?:metrics|developments)"
+    ),
+    "legal": (
+        r"confidential(?:ity)?|disclaimers?|forward[- ]looking|not an offer|solicitation|securities act"
+        r"|past performance|no representation|warrant(?:y|ies)|liabilit(?:y|ies) for|jurisdictions?|herein"
+        r"|thereof|hereby|indemnif\w*|prospectus|risk factors|not be reproduced|without the prior written"
+    ),
+    "toc": r"table of contents|(?m:^[ \t]*contents[ \t]*$)",
+}
+# One pass over the lowercased page; the named group that matched says which feature to count
+_TERMS_RE = re.compile("|".join(rf"\b(?P<{name}>{pattern})\b" for name, pattern in _TERMS.items()))
+# "Title ...... 12" on one line, or a bare page reference on its own line (cell-per-line layouts)
+_TOC_LINE = re.compile(r"(?m)(?:\.{3,}|\s{3,}|\t)\d{1,3}[ \t]*$|^[ \t]*\d{1,3}[ \t]*$")
+_NUMBER = re.compile(r"\(?[$€£¥]?\d[\d,]*(?:\.\d+)?\)?%?")
+_CURRENCY = re.compile(r"[$€£¥]|\b(?:USD|EUR|GBP)\b")
+_WORD = re.compile(r"[A-Za-z]{2,}")
+
+FEATURES = ("financial", "company", "legal", "toc", "toc_lines", "numeric", "currency", "prose")
+
+# Feature (row) x label (column) weights, columns in LABELS order
+WEIGHTS = (
+    (1.0, 0.2, 0.0, 0.0),   # financial terms
+    (0.1, 1.0, 0.0, 0.0),   # company terms
+    (0.0, 0.0, 1.2, 0.0),   # legal terms
+    (0.0, 0.0, 0.0, 2.0),   # "table of contents"
+    (0.0, 0.0, 0.0, 0.6),   # page reference lines
+    (2.0, 0.5, -1.0, 0.5),  # numbers per word
+    (0.5, 0.3, 0.0, 0.0),   # currency marks
+    (-0.5, 0.0, 1.0, -1.0),  # long prose lines
+)
+
+
+def page_features(text: str) -> List[float]:
+    terms = dict.fromkeys(_TERMS, 0)
+    for match in _TERMS_RE.finditer(text.lower()):
+        terms[match.lastgroup] += 1
+    words = len(_WORD.findall(text))
+    lines = sum(1 for line in text.splitlines() if line.strip())
+    words_per_line = words / lines if lines else 0.0
+    return [
+        math.log1p(terms["financial"]),
+        math.log1p(terms["company"]),
+        math.log1p(terms["legal"]),
+        math.log1p(terms["toc"]),
+        math.log1p(len(_TOC_LINE.findall(text))),
+        min(1.0, len(_NUMBER.findall(text)) / (words + 1)),
+        math.log1p(len(_CURRENCY.findall(text))),
+        min(1.0, words_per_line / 20.0),
+    ]
+
+
+def classify_pages(pages: List[str]) -> List[str]:
+    """One label per page."""
+    if not pages:
+        return []
+    import numpy as np
+
+    scores = np.asarray([page_features(p) for p in pages], dtype=float) @ np.asarray(WEIGHTS, dtype=float)
+    best = scores.argmax(axis=1)
+    labels: List[str] = []
+    for i, page in enumerate(pages):
+        if len("".join(page.split())) < BLANK_MAX_CHARS:
+            labels.append(BLANK)
+        elif scores[i, best[i]] < MIN_SCORE:
+            labels.append(OTHER)
+        else:
+            labels.append(LABELS[best[i]])
+    return labels
+
+
+@dataclass
+class PageSelection:
+    pages: List[str]
+    labels: List[str]
+    # Original page indices in prompt order, and the ones left out
+    order: List[int] = field(default_factory=list)
+    dropped: List[int] = field(default_factory=list)
+    demoted: List[int] = field(default_factory=list)
+    bytes_dropped: int = 0
+
+
+def page_policy(template: Dict[str, Any]) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """(labels dropped, labels demoted) for a template."""
+    spec = template.get("pageFilter") or {}
+    return tuple(spec.get("drop", DEFAULT_DROP)), tuple(spec.get("demote", DEFAULT_DEMOTE))
+
+
+def select_pages(pages: List[str], template: Dict[str, Any]) -> PageSelection:
+    """Classify pages, drop the template's irrelevant labels and move demoted ones to the end.
+
+    Never drops every page: a document made only of "irrelevant" pages is passed through as is.
+    """
+    labels = classify_pages(pages)
+    drop, demote = page_policy(template)
+    kept = [i for i, label in enumerate(labels) if label not in drop]
+    if not kept:
+        return PageSelection(list(pages), labels, order=list(range(len(pages))))
+    front = [i for i in kept if labels[i] not in demote]
+    back = [i for i in kept if labels[i] in demote]
+    dropped = [i for i, label in enumerate(labels) if label in drop]
+    return PageSelection(
+        pages=[pages[i] for i in front + back],
+        labels=labels,
+        order=front + back,
+        dropped=dropped,
+        demoted=back,
+        bytes_dropped=sum(len(pages[i].encode("utf-8")) for i in dropped),
+    )
@@ -1,30 +1,334 @@
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
 from io import BytesIO
-from typing import Optional
+from typing import List, Optional, Tuple, Union
+import asyncio
+import time
+from .metrics import span
+from ..settings import (
+    get_pdf_backend,
+    get_pdf_workers,
+    get_pdf_shard_pages,
+    get_pdf_parallel_min_pages,
+)
 
+BACKENDS = ("pymupdf", "pdfplumber")
 
-def _extract_with_pdfplumber(data: bytes) -> Optional[str]:
+# PDF bytes, or a path the backends open directly (spooled uploads): no in-memory copy, and
+# only the path is pickled when work is sent to the process pool
+PdfSource = Union[bytes, str]
+
+
+@dataclass
+class PageResult:
+    index: int
+    text: str = ""
+    backend: str = ""
+    ms: float = 0.0
+    error: Optional[str] = None
+
+
+@dataclass
+class ExtractionResult:
+    pages: List[PageResult] = field(default_factory=list)
+    backend: str = ""
+    total_ms: float = 0.0
+
+    @property
+    def page_count(self) -> int:
+        return len(self.pages)
+
+    @property
+    def page_texts(self) -> List[str]:
+        return [p.text for p in self.pages]
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.page_texts)
+
+    @property
+    def failed_pages(self) -> List[int]:
+        return [p.index for p in self.pages if p.error]
+
+    def timings(self) -> List[Tuple[int, float]]:
+        """Per-page (index, milliseconds) pairs in page order."""
+        return [(p.index, p.ms) for p in self.pages]
+
+
+@dataclass
+class PdfTable:
+    """A table detected on a page; ``cells`` are the raw cell texts, header row first.
+
+    ``bbox`` is (x0, top, x1, bottom) in PDF points. Plain lists so tables pickle cheaply out
+    of the process pool and round-trip through the JSON cache.
+    """
+
+    page: int
+    bbox: Tuple[float, float, float, float]
+    cells: List[List[str]]
+    backend: str = ""
+
+    def to_frame(self):
+        """The table as a DataFrame: first row as column names, blank or repeated names made unique."""
+        import pandas as pd
+
+        header = self.cells[0] if self.cells else []
+        columns: List[str] = []
+        for i, name in enumerate(header):
+            name = name or f"column_{i + 1}"
+            while name in columns:
+                name = f"{name}_{i + 1}"
+            columns.append(name)
+        return pd.DataFrame(self.cells[1:], columns=columns, dtype=object)
+
+
+def _backend_available(name: str) -> bool:
+    try:
+        if name == "pymupdf":
+            import fitz  # type: ignore  # noqa: F401
+        else:
+            import pdfplumber  # type: ignore  # noqa: F401
+        return True
+    except Exception:
+        return False
+
+
+def _resolve_backend(preferred: Optional[str] = None) -> Optional[str]:
+    choice = (preferred or get_pdf_backend()).lower()
+    order = list(BACKENDS) if choice not in BACKENDS else [choice] + [b for b in BACKENDS if b != choice]
+    for name in order:
+        if _backend_available(name):
+            return name
+    return None
+
+
+def _other_backend(name: str) -> Optional[str]:
+    for b in BACKENDS:
+        if b != name and _backend_available(b):
+            return b
+    return None
+
+
+def _open_pymupdf(source: PdfSource):
+    import fitz  # type: ignore
+    if isinstance(source, str):
+        return fitz.open(source, filetype="pdf")
+    return fitz.open(stream=source, filetype="pdf")
+
+
+def _open_pdfplumber(source: PdfSource):
+    import pdfplumber  # type: ignore
+    return pdfplumber.open(source if isinstance(source, str) else BytesIO(source))
+
+
+def _count_pages(source: PdfSource, backend: str) -> int:
+    if backend == "pymupdf":
+        with _open_pymupdf(source) as doc:
+            return doc.page_count
+    with _open_pdfplumber(source) as pdf:
+        return len(pdf.pages)
+
+
+def _read_pages(source: PdfSource, backend: str, indices: List[int]) -> List[PageResult]:
+    """Extract the given pages with one backend, recording failures per page."""
+    results: List[PageResult] = []
+    if backend == "pymupdf":
+        with _open_pymupdf(source) as doc:
+            for i in indices:
+                t0 = time.perf_counter()
+                try:
+                    text = doc[i].get_text() or ""
+                    results.append(PageResult(i, text, backend, (time.perf_counter() - t0) * 1000))
+                except Exception as e:
+                    results.append(PageResult(i, "", backend, (time.perf_counter() - t0) * 1000, repr(e)))
+    else:
+        with _open_pdfplumber(source) as pdf:
+            for i in indices:
+                t0 = time.perf_counter()
+                try:
+                    text = pdf.pages[i].extract_text() or ""
+                    results.append(PageResult(i, text, backend, (time.perf_counter() - t0) * 1000))
+                except Exception as e:
+                    results.append(PageResult(i, "", backend, (time.perf_counter() - t0) * 1000, repr(e)))
+    return results
+
+
+def _extract_shard(source: PdfSource, backend: str, start: int, stop: int) -> List[PageResult]:
+    """Extract pages [start, stop). Runs in a worker process, so it must stay module-level."""
+    indices = list(range(start, stop))
     try:
-        import pdfplumber  # type: ignore
+        results = _read_pages(source, backend, indices)
+    except Exception as e:
+        # The backend could not open the document at all
+        results = [PageResult(i, "", backend, 0.0, repr(e)) for i in indices]
+
+    failed = [r.index for r in results if r.error]
+    fallback = _other_backend(backend) if failed else None
+    if fallback:
+        try:
+            retried = {r.index: r for r in _read_pages(source, fallback, failed)}
+        except Exception:
+            retried = {}
+        results = [retried[r.index] if r.error and r.index in retried and not retried[r.index].error else r for r in results]
+    return results
+
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=get_pdf_workers())
+    return _process_pool
+
+
+def shutdown_process_pool() -> None:
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+def _shard_ranges(page_count: int, shard_pages: int) -> List[Tuple[int, int]]:
+    return [(s, min(s + shard_pages, page_count)) for s in range(0, page_count, shard_pages)]
+
+
+def extract_pages(
+    source: PdfSource, backend: Optional[str] = None, parallel: Optional[bool] = None, page_count: Optional[int] = None
+) -> ExtractionResult:
+    """Extract text page by page, sharding page ranges across the process pool for large documents.
+
+    ``source`` is the PDF bytes or a path to the file.
+    ``backend`` overrides PDF_BACKEND ("pymupdf" for speed, "pdfplumber" for layout fidelity).
+    ``parallel`` forces sharding on or off; by default it is used above PDF_PARALLEL_MIN_PAGES.
+    ``page_count`` is the document's page count when the caller already read it with ``backend``.
+    """
+    t0 = time.perf_counter()
+    name = _resolve_backend(backend)
+    if not name:
+        return ExtractionResult()
+
+    try:
+        if page_count is None:
+            page_count = _count_pages(source, name)
     except Exception:
-        return None
+        fallback = _other_backend(name)
+        if not fallback:
+            return ExtractionResult(backend=name)
+        try:
+            name, page_count = fallback, _count_pages(source, fallback)
+        except Exception:
+            return ExtractionResult(backend=name)
+
+    ranges = _shard_ranges(page_count, get_pdf_shard_pages())
+    if parallel is None:
+        parallel = page_count >= get_pdf_parallel_min_pages() and get_pdf_workers() > 1
+    pages: List[PageResult] = []
+    if parallel and len(ranges) > 1:
+        try:
+            pool = get_process_pool()
+            futures = [pool.submit(_extract_shard, source, name, start, stop) for start, stop in ranges]
+            for fut in futures:
+                pages.extend(fut.result())
+        except Exception:
+            # Pools are unavailable in some serverless sandboxes; parse in-process instead
+            pages = []
+    if not pages:
+        for start, stop in ranges:
+            pages.extend(_extract_shard(source, name, start, stop))
+
+    pages.sort(key=lambda p: p.index)
+    return ExtractionResult(pages=pages, backend=name, total_ms=(time.perf_counter() - t0) * 1000)
+
 
+def _extract_document(source: PdfSource, backend: Optional[str] = None, page_count: Optional[int] = None) -> ExtractionResult:
+    """Whole-document extraction inside one worker process (no nested sharding)."""
+    return extract_pages(source, backend, parallel=False, page_count=page_count)
+
+
+def _extract_routed(source: PdfSource, backend: Optional[str] = None) -> ExtractionResult:
+    """extract_pages for large documents (sharded), one pool process for the rest. Runs in a worker thread."""
+    name = _resolve_backend(backend)
+    page_count: Optional[int] = None
+    if name:
+        try:
+            page_count = _count_pages(source, name)
+        except Exception:
+            pass  # extract_pages falls back to the other backend
+    # The count is handed on, so the document is not opened again just to count its pages
+    if (page_count or 0) >= get_pdf_parallel_min_pages() or get_pdf_workers() <= 1:
+        return extract_pages(source, name or backend, page_count=page_count)
     try:
-        text_chunks: list[str] = []
-        with pdfplumber.open(BytesIO(data)) as pdf:
-            for page in pdf.pages:
-                page_text = page.extract_text() or ""
-                text_chunks.append(page_text)
-        return "\n".join(text_chunks)
+        return get_process_pool().submit(_extract_document, source, name or backend, page_count).result()
     except Exception:
-        return None
+        return extract_pages(source, name or backend, False, page_count)
 
 
-def extract_text_from_pdf(data: bytes) -> str:
-    text = _extract_with_pdfplumber(data)
-    if text:
-        return text
-    # Fallback: return empty string to avoid crashing
-    return ""
+async def extract_pages_async(source: PdfSource, backend: Optional[str] = None) -> ExtractionResult:
+    """Awaitable extract_pages that keeps parsing off the event loop.
+
+    Large documents are sharded across the process pool; smaller ones are parsed whole in a
+    single pool process so several uploads run on separate cores. The page count that decides
+    between the two is read in the worker thread too, never on the event loop.
+    """
+    with span("extract_text"):
+        return await asyncio.to_thread(_extract_routed, source, backend)
+
+
+def _clean_cell(value: Optional[str]) -> str:
+    return " ".join((value or "").split())
 
 
+def _read_tables(source: PdfSource, backend: str, indices: List[int]) -> List[PdfTable]:
+    tables: List[PdfTable] = []
+    if backend == "pymupdf":
+        with _open_pymupdf(source) as doc:
+            for i in indices:
+                for table in doc[i].find_tables().tables:
+                    tables.append(PdfTable(i, tuple(table.bbox), [[_clean_cell(c) for c in row] for row in table.extract()], backend))
+    else:
+        with _open_pdfplumber(source) as pdf:
+            for i in indices:
+                for table in pdf.pages[i].find_tables():
+                    tables.append(PdfTable(i, tuple(table.bbox), [[_clean_cell(c) for c in row] for row in table.extract()], backend))
+    # A header row plus at least one data row, and at least two columns
+    return [t for t in tables if len(t.cells) >= 2 and max(len(r) for r in t.cells) >= 2]
 
+
+def extract_tables(source: PdfSource, pages: Optional[List[int]] = None, backend: Optional[str] = None) -> List[PdfTable]:
+    """Detect ruled or aligned tables on ``pages`` (all pages by default), falling back to the other backend."""
+    name = _resolve_backend(backend)
+    if not name:
+        return []
+    for candidate in (name, _other_backend(name)):
+        if not candidate:
+            continue
+        try:
+            indices = pages if pages is not None else list(range(_count_pages(source, candidate)))
+            return _read_tables(source, candidate, indices)
+        except Exception:
+            continue
+    return []
+
+
+async def extract_tables_async(source: PdfSource, pages: Optional[List[int]] = None, backend: Optional[str] = None) -> List[PdfTable]:
+    """Awaitable extract_tables; table detection is CPU-heavy, so it runs in the process pool."""
+    with span("extract_tables"):
+        if get_pdf_workers() <= 1:
+            return await asyncio.to_thread(extract_tables, source, pages, backend)
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(get_process_pool(), extract_tables, source, pages, backend)
+        except Exception:
+            return await asyncio.to_thread(extract_tables, source, pages, backend)
+
+
+def extract_text_from_pdf(source: PdfSource) -> str:
+    with span("extract_text"):
+        result = extract_pages(source)
+    text = result.text
+    if text.strip():
+        return text
+    # Fallback: return empty string to avoid crashing
+    return ""
@@ -0,0 +1,279 @@
+from dataclasses import asdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar, Union
+import asyncio
+import time
+from .batching import get_document_batcher
+from .cache import get_cache, get_rows_cache, get_text_cache, make_key, sha256_bytes, template_content_hash
+from .llm_extract import extract_structured_data_with_source, get_model_name, get_prompt_version
+from .lineage import Lineage, MergeReport, get_lineage_store, locate_fields, merge_rows, page_fingerprints
+from .metrics import INCREMENTAL_FIELDS, PAGE_BYTES_DROPPED, PAGES, span
+from .page_classifier import select_pages
+from .pdf_extractor import PdfSource, PdfTable, extract_pages_async, extract_tables_async
+from .progress import emit, set_current_file
+from .tables import candidate_pages
+from .templates import get_template_field_order
+from .uploads import SpooledUpload
+from ..settings import (
+    get_pdf_backend,
+    get_extract_request_concurrency,
+    get_extract_global_concurrency,
+    is_table_extraction_enabled,
+    get_table_min_coverage,
+    is_page_filter_enabled,
+    is_cache_enabled,
+    is_incremental_extraction_enabled,
+    get_incremental_min_overlap,
+)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# What ``load`` may return: the PDF bytes, or an upload spooled to disk (opened by path, hash known)
+PdfInput = Union[bytes, SpooledUpload]
+
+# Rows produced by the rule-based fallback are not cached, so the LLM is retried next time
+CACHEABLE_SOURCES = ("static", "mock", "openai", "gemini", "tables")
+
+# Templates whose output is built from the first file only
+FIRST_RESULT_ONLY_TEMPLATES = ("template1", "template2")
+
+
+def uses_first_result_only(template: Dict[str, Any]) -> bool:
+    return template.get("templateId", "") in FIRST_RESULT_ONLY_TEMPLATES
+
+
+def rows_cache_key(pdf_hash: str, template: Dict[str, Any]) -> str:
+    return make_key(
+        pdf_hash,
+        template.get("templateId", ""),
+        template_content_hash(template),
+        get_model_name(),
+        get_prompt_version(),
+        "tables" if is_table_extraction_enabled() else "text",
+    )
+
+
+def extraction_key(template: Dict[str, Any]) -> str:
+    """What produced a row apart from the document: template version, model and prompt strategy."""
+    return make_key(template.get("templateId", ""), template_content_hash(template), get_model_name(), get_prompt_version())
+
+
+def uses_incremental(template: Dict[str, Any]) -> bool:
+    """Whether revised documents are re-prompted on their changed pages only (INCREMENTAL_EXTRACTION)."""
+    return (
+        is_incremental_extraction_enabled()
+        and is_cache_enabled()
+        and not uses_first_result_only(template)
+        # Rules and the mock read the whole document for free; nothing to save
+        and get_model_name() not in ("mock", "rules")
+    )
+
+
+def _source_and_hash(pdf: PdfInput, pdf_hash: Optional[str] = None) -> Tuple[PdfSource, str]:
+    if isinstance(pdf, SpooledUpload):
+        # Hashed while it streamed to disk
+        return pdf.path, pdf.sha256
+    return pdf, pdf_hash or sha256_bytes(pdf)
+
+
+async def get_page_texts(pdf: PdfInput, pdf_hash: Optional[str] = None) -> List[str]:
+    """Page texts for a PDF, served from the page cache when the same bytes were seen before."""
+    source, pdf_hash = _source_and_hash(pdf, pdf_hash)
+    cache = get_text_cache()
+    key = make_key(pdf_hash, get_pdf_backend())
+    pages = await cache.aget(key)
+    if pages is not None:
+        emit("text_extracted", pages=len(pages), ms=0.0, cached=True)
+        return pages
+    result = await extract_pages_async(source)
+    pages = result.page_texts
+    emit("text_extracted", pages=len(pages), ms=round(result.total_ms, 1), backend=result.backend, cached=False)
+    if any(p.strip() for p in pages):
+        await cache.aset(key, pages)
+    return pages
+
+
+async def extract_rows_for_pdf(pdf: PdfInput, template: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Text extraction plus structured extraction for one PDF; a rows cache hit skips both."""
+    rows, _ = await extract_rows_for_pdf_with_report(pdf, template)
+    return rows
+
+
+async def extract_rows_for_pdf_with_report(pdf: PdfInput, template: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], Optional[MergeReport]]:
+    """Same as extract_rows_for_pdf, also returning the merge report of an incremental re-extraction."""
+    _, pdf_hash = _source_and_hash(pdf)
+    rows_cache = get_rows_cache()
+    key = rows_cache_key(pdf_hash, template)
+    rows = await rows_cache.aget(key)
+    if rows is not None:
+        emit("rows_cached", rows=len(rows))
+        return rows, None
+
+    pages = await get_page_texts(pdf, pdf_hash)
+    tables = await get_page_tables(pdf, pages, template, pdf_hash)
+    filename = pdf.filename if isinstance(pdf, SpooledUpload) else ""
+    return await rows_from_pages_with_report(pages, pdf_hash, template, tables, filename)
+
+
+async def get_page_tables(pdf: PdfInput, pages: List[str], template: Dict[str, Any], pdf_hash: Optional[str] = None) -> List[PdfTable]:
+    """Tables on pages that could match a template section, cached like page texts; none for static templates."""
+    if not is_table_extraction_enabled() or template.get("templateId", "") in FIRST_RESULT_ONLY_TEMPLATES:
+        return []
+    candidates = candidate_pages(pages, template, get_table_min_coverage())
+    if not candidates:
+        return []
+    source, pdf_hash = _source_and_hash(pdf, pdf_hash)
+    cache = get_cache("tables")
+    key = make_key(pdf_hash, get_pdf_backend(), ",".join(map(str, candidates)))
+    cached = await cache.aget(key)
+    if cached is not None:
+        return [PdfTable(t["page"], tuple(t["bbox"]), t["cells"], t["backend"]) for t in cached]
+    t0 = time.perf_counter()
+    tables = await extract_tables_async(source, candidates)
+    emit("tables_extracted", tables=len(tables), pages=len(candidates), ms=round((time.perf_counter() - t0) * 1000, 1))
+    await cache.aset(key, [asdict(t) for t in tables])
+    return tables
+
+
+def prompt_pages(pages: List[str], template: Dict[str, Any]) -> List[str]:
+    """Pages in the order they should reach the prompt, boilerplate dropped or moved last (PAGE_FILTER)."""
+    if not is_page_filter_enabled() or template.get("templateId", "") in FIRST_RESULT_ONLY_TEMPLATES:
+        return pages
+    if get_model_name() in ("mock", "rules"):
+        # No prompt is built, and the rules should see every page
+        return pages
+    with span("classify_pages"):
+        selection = select_pages(pages, template)
+    demoted = set(selection.demoted)
+    for i, label in enumerate(selection.labels):
+        action = "dropped" if i not in selection.order else "demoted" if i in demoted else "kept"
+        PAGES.inc(label=label, action=action)
+    PAGE_BYTES_DROPPED.inc(selection.bytes_dropped)
+    emit(
+        "pages_classified",
+        labels=selection.labels,
+        dropped=selection.dropped,
+        demoted=selection.demoted,
+        bytes_dropped=selection.bytes_dropped,
+    )
+    return selection.pages
+
+
+async def rows_from_pages(
+    pages: List[str], pdf_hash: str, template: Dict[str, Any], tables: Optional[List[PdfTable]] = None, filename: str = ""
+) -> List[Dict[str, Any]]:
+    """Structured extraction over already extracted page texts (and tables), filling the rows cache."""
+    rows, _ = await rows_from_pages_with_report(pages, pdf_hash, template, tables, filename)
+    return rows
+
+
+async def rows_from_pages_with_report(
+    pages: List[str], pdf_hash: str, template: Dict[str, Any], tables: Optional[List[PdfTable]] = None, filename: str = ""
+) -> Tuple[List[Dict[str, Any]], Optional[MergeReport]]:
+    """Same as rows_from_pages; a revision of an earlier document only has its changed pages prompted.
+
+    The earlier version is found by filename lineage or shared pages (see lineage.py). The report
+    is None for a full extraction. Documents with tables mapped onto the template always run in full.
+    """
+    incremental = uses_incremental(template)
+    fingerprints = page_fingerprints(pages) if incremental else []
+    if incremental and not tables:
+        with span("lineage_lookup"):
+            lineage = await asyncio.to_thread(
+                get_lineage_store().find, pdf_hash, filename, fingerprints, extraction_key(template), get_incremental_min_overlap()
+            )
+        if lineage is not None:
+            return await _rows_from_changed_pages(lineage, pages, fingerprints, pdf_hash, template, filename)
+
+    prompt = prompt_pages(pages, template)
+    rows, source = await extract_structured_data_with_source("\n".join(prompt), template, prompt, tables)
+    if source in CACHEABLE_SOURCES:
+        await get_rows_cache().aset(rows_cache_key(pdf_hash, template), rows)
+        if incremental and len(rows) == 1:
+            await asyncio.to_thread(_record_lineage, pdf_hash, filename, pages, fingerprints, template, rows[0])
+    return rows, None
+
+
+def _record_lineage(pdf_hash: str, filename: str, pages: List[str], fingerprints: List[str], template: Dict[str, Any], row: Dict[str, Any]) -> None:
+    field_pages = locate_fields(row, pages, fingerprints)
+    get_lineage_store().record(pdf_hash, filename, fingerprints, extraction_key(template), row, field_pages)
+
+
+async def _rows_from_changed_pages(
+    lineage: Lineage, pages: List[str], fingerprints: List[str], pdf_hash: str, template: Dict[str, Any], filename: str
+) -> Tuple[List[Dict[str, Any]], MergeReport]:
+    changed = [i for i, fp in enumerate(fingerprints) if fp and fp not in lineage.fingerprints]
+    fresh: Dict[str, Any] = {}
+    # Same text as the earlier version (only the file bytes differ): nothing to prompt
+    source = "lineage"
+    if changed:
+        prompt = prompt_pages([pages[i] for i in changed], template)
+        fresh_rows, source = await extract_structured_data_with_source("\n".join(prompt), template, prompt)
+        fresh = fresh_rows[0] if fresh_rows else {}
+    row, refreshed, reused = merge_rows(lineage, fresh, pages, fingerprints, get_template_field_order(template))
+    report = MergeReport(lineage.doc_hash, lineage.match, len(pages), changed, refreshed, reused)
+    INCREMENTAL_FIELDS.inc(len(refreshed), outcome="refreshed")
+    INCREMENTAL_FIELDS.inc(len(reused), outcome="reused")
+    emit("fields_merged", previous_filename=lineage.filename, overlap=lineage.overlap, **asdict(report))
+    rows = [row]
+    if source in CACHEABLE_SOURCES + ("lineage",):
+        await get_rows_cache().aset(rows_cache_key(pdf_hash, template), rows)
+        await asyncio.to_thread(_record_lineage, pdf_hash, filename, pages, fingerprints, template, row)
+    return rows, report
+
+
+_global_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def _get_global_semaphore() -> asyncio.Semaphore:
+    global _global_semaphore
+    if _global_semaphore is None:
+        _global_semaphore = asyncio.Semaphore(get_extract_global_concurrency())
+    return _global_semaphore
+
+
+async def gather_bounded(items: Sequence[T], worker: Callable[[T], Awaitable[R]], limit: Optional[int] = None) -> List[R]:
+    """Run worker over items concurrently, bounded per call and across the process; results keep input order."""
+    per_call = asyncio.Semaphore(limit or get_extract_request_concurrency())
+    global_sem = _get_global_semaphore()
+
+    async def run(item: T) -> R:
+        async with per_call:
+            async with global_sem:
+                return await worker(item)
+
+    return list(await asyncio.gather(*(run(item) for item in items)))
+
+
+async def extract_rows_for_files(
+    items: Sequence[T],
+    load: Callable[[T], Awaitable[PdfInput]],
+    template: Dict[str, Any],
+    on_file_done: Optional[Callable[[int], None]] = None,
+    reports: Optional[Dict[int, MergeReport]] = None,
+) -> List[Dict[str, Any]]:
+    """Extract every file concurrently and flatten the rows in input order.
+
+    ``load`` fetches a file's bytes or its SpooledUpload. Templates that only use
+    the first result never load the remaining files. Files re-extracted incrementally
+    have their merge report put in ``reports`` under their index.
+    """
+    if uses_first_result_only(template):
+        items = list(items)[:1]
+
+    async def process(indexed: Tuple[int, T]) -> List[Dict[str, Any]]:
+        index, item = indexed
+        set_current_file(index)
+        t0 = time.perf_counter()
+        emit("file_started")
+        with get_document_batcher().in_flight():
+            rows, report = await extract_rows_for_pdf_with_report(await load(item), template)
+        if report is not None and reports is not None:
+            reports[index] = report
+        emit("file_finished", rows=len(rows), ms=round((time.perf_counter() - t0) * 1000, 1))
+        if on_file_done is not None:
+            on_file_done(len(rows))
+        return rows
+
+    results = await gather_bounded(list(enumerate(items)), process)
+    return [row for structured_rows in results for row in structured_rows]
@@ -0,0 +1,78 @@
+"""Opt-in sampling profiler for single requests.
+
+A background thread samples one thread's Python stack every few milliseconds and counts
+collapsed stacks (``outer;inner;leaf count`` lines, the input format of flamegraph.pl and
+speedscope). For a request this is the event loop thread, so time spent awaiting other
+requests shows up too; work offloaded to worker threads or processes does not.
+"""
+from collections import Counter, OrderedDict
+from typing import Optional
+import os
+import sys
+import threading
+import time
+import uuid
+
+MAX_STACK_DEPTH = 64
+MAX_PROFILES = 20
+
+
+class StackSampler:
+    def __init__(self, thread_id: Optional[int] = None, interval_s: float = 0.005):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval_s = interval_s
+        self.samples: "Counter[str]" = Counter()
+        self.started = 0.0
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self) -> None:
+        frame = sys._current_frames().get(self.thread_id)
+        parts = []
+        while frame is not None and len(parts) < MAX_STACK_DEPTH:
+            code = frame.f_code
+            parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        if parts:
+            self.samples[";".join(reversed(parts))] += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            self._sample()
+
+    def start(self) -> "StackSampler":
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.elapsed = time.perf_counter() - self.started
+
+    def collapsed(self) -> str:
+        header = f"# {sum(self.samples.values())} samples every {self.interval_s * 1000:g} ms over {self.elapsed * 1000:.1f} ms\n"
+        return header + "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+_profiles: "OrderedDict[str, str]" = OrderedDict()
+_profiles_lock = threading.Lock()
+
+
+def new_profile_id() -> str:
+    return uuid.uuid4().hex
+
+
+def save_profile(profile_id: str, sampler: StackSampler) -> None:
+    with _profiles_lock:
+        _profiles[profile_id] = sampler.collapsed()
+        while len(_profiles) > MAX_PROFILES:
+            _profiles.popitem(last=False)
+
+
+def get_profile(profile_id: str) -> Optional[str]:
+    with _profiles_lock:
+        return _profiles.get(profile_id)
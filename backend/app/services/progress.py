@@ -0,0 +1,100 @@
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import json
+import time
+import uuid
+
+# Set per run; tasks and threads started from the run inherit it, so deep code can emit
+_current_run: ContextVar[Optional["ProgressRun"]] = ContextVar("progress_run", default=None)
+_current_file: ContextVar[Optional[int]] = ContextVar("progress_file", default=None)
+# Work done on behalf of several files at once (a batched prompt) reports to each of them
+_current_targets: ContextVar[Optional[List["ProgressTarget"]]] = ContextVar("progress_targets", default=None)
+
+TERMINAL_EVENTS = ("done", "error", "cancelled")
+
+
+class ProgressRun:
+    """Ordered event feed for one extraction run, consumed by a single streaming response."""
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.started = time.perf_counter()
+        self.queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+        self.loop = asyncio.get_running_loop()
+        self.task: Optional[asyncio.Task] = None
+
+    def emit(self, event: str, **data: Any) -> None:
+        payload = {"event": event, "run_id": self.id, "t_ms": round((time.perf_counter() - self.started) * 1000, 1), **data}
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            self.queue.put_nowait(payload)
+        else:
+            # Emitted from a worker thread
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, payload)
+
+    def cancel(self) -> bool:
+        if self.task is None or self.task.done():
+            return False
+        self.task.cancel()
+        return True
+
+
+ProgressTarget = Tuple[ProgressRun, Optional[int]]
+
+_runs: Dict[str, ProgressRun] = {}
+
+
+def start_run() -> ProgressRun:
+    run = ProgressRun()
+    _runs[run.id] = run
+    return run
+
+
+def get_run(run_id: str) -> Optional[ProgressRun]:
+    return _runs.get(run_id)
+
+
+def finish_run(run: ProgressRun) -> None:
+    _runs.pop(run.id, None)
+
+
+def bind_run(run: Optional[ProgressRun]) -> None:
+    _current_run.set(run)
+
+
+def set_current_file(index: Optional[int]) -> None:
+    _current_file.set(index)
+
+
+def current_target() -> Optional[ProgressTarget]:
+    """The run and file events are reported to here, to hand to work done on this file's behalf."""
+    run = _current_run.get()
+    return (run, _current_file.get()) if run is not None else None
+
+
+def bind_targets(targets: Optional[List[ProgressTarget]]) -> None:
+    """Report events of the current context to every one of ``targets`` instead of the current run."""
+    _current_targets.set(targets)
+
+
+def emit(event: str, **data: Any) -> None:
+    """Report a pipeline event to the current run, if any; a no-op outside streamed runs."""
+    targets = _current_targets.get()
+    if targets is None:
+        run = _current_run.get()
+        if run is None:
+            return
+        targets = [(run, _current_file.get())]
+    for run, file_index in targets:
+        if file_index is not None and "file" not in data:
+            run.emit(event, file=file_index, **data)
+        else:
+            run.emit(event, **data)
+
+
+def format_sse(payload: Dict[str, Any]) -> str:
+    return f"event: {payload['event']}\ndata: {json.dumps(payload)}\n\n"
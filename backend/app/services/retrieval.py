@@ -0,0 +1,189 @@
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple
+import math
+import re
+
+if TYPE_CHECKING:
+    import numpy as np
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from in is it of on or the this to was were with".split()
+)
+
+# Passages are built from paragraphs up to roughly this many characters
+PASSAGE_CHARS = 800
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if len(t) > 1 and t not in _STOPWORDS]
+
+
+@dataclass
+class Passage:
+    index: int
+    page: int
+    text: str
+
+
+def split_passages(pages: List[str], max_chars: int = PASSAGE_CHARS) -> List[Passage]:
+    """Split each page on blank lines, packing short paragraphs together up to max_chars."""
+    passages: List[Passage] = []
+    for page_no, page in enumerate(pages):
+        buf = ""
+        for para in re.split(r"\n\s*\n", page):
+            para = para.strip()
+            if not para:
+                continue
+            if buf and len(buf) + len(para) + 1 > max_chars:
+                passages.append(Passage(len(passages), page_no, buf))
+                buf = ""
+            buf = f"{buf}\n{para}" if buf else para
+            # Pages without blank lines come through as one paragraph; cut those on lines
+            while len(buf) > max_chars:
+                cut = buf.rfind("\n", 0, max_chars)
+                cut = cut if cut > 0 else max_chars
+                passages.append(Passage(len(passages), page_no, buf[:cut]))
+                buf = buf[cut:].lstrip("\n")
+        if buf:
+            passages.append(Passage(len(passages), page_no, buf))
+    return passages
+
+
+class PassageIndex:
+    """BM25 over passages, stored as per-term postings so scoring only touches query terms."""
+
+    def __init__(self, passages: List[Passage]):
+        # numpy is imported on first use so it stays out of the cold-start import path
+        import numpy as np
+
+        self.passages = passages
+        self._postings: Dict[str, Tuple["np.ndarray", "np.ndarray"]] = {}
+        lengths = np.zeros(len(passages), dtype=np.float32)
+        raw: Dict[str, Tuple[List[int], List[int]]] = defaultdict(lambda: ([], []))
+        for p in passages:
+            tokens = tokenize(p.text)
+            lengths[p.index] = len(tokens)
+            counts: Dict[str, int] = defaultdict(int)
+            for t in tokens:
+                counts[t] += 1
+            for t, c in counts.items():
+                docs, tfs = raw[t]
+                docs.append(p.index)
+                tfs.append(c)
+        for t, (docs, tfs) in raw.items():
+            self._postings[t] = (np.asarray(docs, dtype=np.int32), np.asarray(tfs, dtype=np.float32))
+        self._lengths = lengths
+        self._avg_len = float(lengths.mean()) if len(passages) else 0.0
+
+    @classmethod
+    def from_pages(cls, pages: List[str]) -> "PassageIndex":
+        return cls(split_passages(pages))
+
+    def scores(self, query_terms: List[str]) -> "np.ndarray":
+        import numpy as np
+
+        n = len(self.passages)
+        scores = np.zeros(n, dtype=np.float32)
+        if not n:
+            return scores
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths / (self._avg_len or 1.0))
+        for term in set(query_terms):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            docs, tfs = posting
+            idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            scores[docs] += idf * tfs * (BM25_K1 + 1) / (tfs + norm[docs])
+        return scores
+
+    def top_k(self, query_terms: List[str], k: int) -> List[Tuple[Passage, float]]:
+        import numpy as np
+
+        scores = self.scores(query_terms)
+        if not len(scores):
+            return []
+        k = min(k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        ranked = sorted(best.tolist(), key=lambda i: (-scores[i], i))
+        return [(self.passages[i], float(scores[i])) for i in ranked if scores[i] > 0]
+
+
+@dataclass
+class FieldGroup:
+    name: str
+    fields: List[Dict[str, Any]]
+    context: str = ""
+
+    def query_terms(self) -> List[str]:
+        parts = [self.context]
+        for f in self.fields:
+            parts.append(f.get("key", "").replace("_", " "))
+            parts.append(f.get("header", ""))
+            parts.extend(f.get("keywords", []))
+        return tokenize(" ".join(parts))
+
+
+def field_groups(template: Dict[str, Any], group_size: int) -> List[FieldGroup]:
+    """One group per sheet for multi-sheet templates; fixed-size slices of fields otherwise."""
+    if template.get("multiSheet", False) and "sheets" in template:
+        return [
+            FieldGroup(
+                s.get("name", f"Sheet {i}"),
+                list(s.get("fields", [])),
+                f"{s.get('name', '')} {s.get('description', '')}",
+            )
+            for i, s in enumerate(template.get("sheets", []), 1)
+            if s.get("fields")
+        ]
+    fields = list(template.get("fields", []))
+    size = max(1, group_size)
+    return [FieldGroup(f"fields {i + 1}-{min(i + size, len(fields))}", fields[i : i + size]) for i in range(0, len(fields), size)]
+
+
+@dataclass
+class Selection:
+    group: FieldGroup
+    passages: List[Tuple[Passage, float]] = field(default_factory=list)
+
+    @property
+    def text(self) -> str:
+        # Present passages in document order so the model sees them as they were written
+        ordered = sorted(self.passages, key=lambda ps: ps[0].index)
+        return "\n\n".join(f"[page {p.page + 1}]\n{p.text}" for p, _ in ordered)
+
+    def sub_template(self, template: Dict[str, Any]) -> Dict[str, Any]:
+        return {"templateId": template.get("templateId", "template"), "fields": self.group.fields}
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "group": self.group.name,
+            "fields": [f.get("key", "") for f in self.group.fields],
+            "query_terms": sorted(set(self.group.query_terms())),
+            "passages": [
+                {"passage": p.index, "page": p.page + 1, "score": round(score, 4), "chars": len(p.text), "preview": p.text[:160]}
+                for p, score in self.passages
+            ],
+            "chars": len(self.text),
+        }
+
+
+def select_passages(pages: List[str], template: Dict[str, Any], top_k: int, group_size: int) -> List[Selection]:
+    index = PassageIndex.from_pages(pages)
+    return [Selection(group, index.top_k(group.query_terms(), top_k)) for group in field_groups(template, group_size)]
+
+
+def explain_selection(pages: List[str], template: Dict[str, Any], top_k: int, group_size: int) -> Dict[str, Any]:
+    """JSON-friendly summary of what each field group would send to the LLM."""
+    selections = select_passages(pages, template, top_k, group_size)
+    total = sum(len(p) for p in pages)
+    selected = sum(len(s.text) for s in selections)
+    return {
+        "document_chars": total,
+        "selected_chars": selected,
+        "groups": [s.describe() for s in selections],
+    }
@@ -0,0 +1,243 @@
+"""Rule-based field extraction.
+
+A template field may declare ``"rules"``: a rule or list of rules, most preferred first.
+Supported rule shapes:
+
+- ``{"regex": "Fund Size:\\s*(?P<value>.+)"}``: the ``value`` group (or the whole match) is the value
+- ``{"label": ["Fund Name", "Name of Fund"], "type": "text"}``: value of ``type`` following a label
+- ``{"type": "amount"}``: the first value of that type anywhere in the document
+- ``{"line": "\\bFund\\b", "strip_label": true}``: the first matching line, optionally after ``label:``
+
+Types are text, amount, date, email, currency and percent. Any rule may set ``"confidence"``,
+``"constant"`` (the value whenever the rule matches) or ``"map"`` (matched text -> value).
+Fields without rules fall back to built-in defaults for well-known keys.
+
+Rules are compiled once per template into a combined prefilter regex, and the document is
+scanned line by line in a single pass. Rules with backreferences stay out of the prefilter
+(their group numbers would shift) and are tried on every line. A field is settled once its most preferred rule
+matches; a less preferred match is kept only until a better rule matches later on.
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+import re
+import threading
+from .templates import get_compiled
+
+AMOUNT = r"\(?[$€£]?\s?(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?\)?"
+DATE_PATTERNS = [
+    r"\b\d{4}-\d{2}-\d{2}\b",  # 2025-10-13
+    r"\b\d{2}/\d{2}/\d{4}\b",  # 13/10/2025
+    r"\b\d{2}-\d{2}-\d{4}\b",
+    r"\b(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s+\d{1,2},\s+\d{4}\b",
+]
+VALUE_PATTERNS = {
+    "text": r"[^\n]+",
+    "amount": AMOUNT,
+    "date": "|".join(f"(?:{p})" for p in DATE_PATTERNS),
+    "email": r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}",
+    "currency": r"\b(?:USD|EUR|GBP|INR|AED|JPY|CHF|CNY|AUD|CAD)\b",
+    "percent": r"-?\d+(?:\.\d+)?\s?%",
+}
+DEFAULT_CONFIDENCE = {"regex": 0.9, "label": 0.85, "line": 0.6, "type": 0.5}
+MAX_VALUE_CHARS = 120
+_LABEL_PREFIX = re.compile(r".*?:\s*")
+# \1..\99 (not an escaped backslash) or (?P=name)
+_BACKREF = re.compile(r"(?<!\\)(?:\\\\)*\\[1-9]|\(\?P=")
+
+# Built-in rules mirroring the original heuristics, keyed by field key
+_EMAIL = [{"type": "email"}]
+_AMOUNT = [{"regex": r"\b\$?\s?(\d{1,3}(,\d{3})+|\d+)(\.\d+)?\b"}]
+_DATE = [{"regex": p, "flags": "i"} for p in DATE_PATTERNS]
+DEFAULT_RULES: Dict[str, List[Dict[str, Any]]] = {
+    "contact_email": _EMAIL,
+    "email": _EMAIL,
+    "manager_email": _EMAIL,
+    "currency": [
+        {"regex": VALUE_PATTERNS["currency"], "flags": "i", "upper": True},
+        # No code anywhere: the first currency symbol in the document decides
+        {"regex": r"[$€£]", "map": {"$": "USD", "€": "EUR", "£": "GBP"}, "confidence": 0.4},
+    ],
+    "total_commitment": _AMOUNT,
+    "commitment_amount": _AMOUNT,
+    "call_amount": _AMOUNT,
+    "amount": _AMOUNT,
+    "report_date": _DATE,
+    "date": _DATE,
+    "statement_date": _DATE,
+    "fund_name": [{"line": r"\bFund\b"}],
+    "manager": [{"line": r"\bManager\b|General Partner|Investment Manager", "flags": "i", "strip_label": True}],
+    "investor_name": [{"line": r"\bInvestor\b|Limited Partner|LP\b", "flags": "i", "strip_label": True}],
+}
+
+
+@dataclass
+class RuleMatch:
+    field: str
+    value: str
+    line: int
+    start: int
+    end: int
+    confidence: float
+    rule: int
+
+
+@dataclass
+class _Rule:
+    field: str
+    priority: int
+    kind: str
+    regex: "re.Pattern[str]"
+    confidence: float
+    constant: Optional[str] = None
+    values: Optional[Dict[str, str]] = None
+    upper: bool = False
+    strip_label: bool = False
+    backref: bool = False
+
+    def match(self, line: str, line_no: int) -> Optional[RuleMatch]:
+        m = self.regex.search(line)
+        if not m:
+            return None
+        if self.kind == "line":
+            value, start, end = line.strip(), 0, len(line)
+            if self.strip_label:
+                value = _LABEL_PREFIX.sub("", line).strip()
+        else:
+            group = "value" if "value" in self.regex.groupindex else 0
+            value, start, end = m.group(group), m.start(group), m.end(group)
+        if self.constant is not None:
+            value = self.constant
+        elif self.values is not None:
+            value = self.values.get(value, value)
+        value = value.strip()
+        if self.upper:
+            value = value.upper()
+        return RuleMatch(self.field, value[:MAX_VALUE_CHARS], line_no, start, end, self.confidence, self.priority)
+
+
+def _flags(spec: Dict[str, Any]) -> int:
+    return re.IGNORECASE if "i" in spec.get("flags", "") else 0
+
+
+def _compile_rule(key: str, priority: int, spec: Dict[str, Any]) -> _Rule:
+    if "regex" in spec:
+        kind, pattern = "regex", spec["regex"]
+    elif "line" in spec:
+        kind, pattern = "line", spec["line"]
+    elif "label" in spec:
+        kind = "label"
+        labels = spec["label"] if isinstance(spec["label"], list) else [spec["label"]]
+        label_alt = "|".join(re.escape(lbl) for lbl in labels)
+        value = VALUE_PATTERNS[spec.get("type", "text")]
+        pattern = rf"(?i:\b(?:{label_alt}))\b\s*[:\-]?\s*(?P<value>{value})"
+    elif "type" in spec:
+        kind, pattern = "type", VALUE_PATTERNS[spec["type"]]
+    else:
+        raise ValueError(f"Rule for field {key!r} needs one of regex, line, label or type")
+    return _Rule(
+        field=key,
+        priority=priority,
+        kind=kind,
+        regex=re.compile(pattern, _flags(spec)),
+        confidence=float(spec.get("confidence", DEFAULT_CONFIDENCE[kind])),
+        constant=spec.get("constant"),
+        values=spec.get("map"),
+        upper=bool(spec.get("upper", False)),
+        strip_label=bool(spec.get("strip_label", False)),
+        backref=bool(_BACKREF.search(pattern)),
+    )
+
+
+class RuleSet:
+    """All rules of one template, plus combined regexes used to skip lines no pending rule can match."""
+
+    def __init__(self, field_keys: Tuple[str, ...], specs: Dict[str, List[Dict[str, Any]]]):
+        self.field_keys = field_keys
+        self.rules: List[_Rule] = []
+        for key in field_keys:
+            for priority, spec in enumerate(specs.get(key, [])):
+                self.rules.append(_compile_rule(key, priority, spec))
+        # Pending rule indices -> combined prefilter over just those rules
+        self._prefilters: Dict[Tuple[int, ...], Optional["re.Pattern[str]"]] = {}
+
+    def _prefilter(self, pending: List[int]) -> Optional["re.Pattern[str]"]:
+        """Combined regex over the pending rules without backreferences; None when every line has to go to the rules."""
+        key = tuple(pending)
+        if key not in self._prefilters:
+            rules = [self.rules[i] for i in pending if not self.rules[i].backref]
+            if not rules:
+                self._prefilters[key] = None
+                return None
+            alternatives = [f"(?i:{r.regex.pattern})" if r.regex.flags & re.IGNORECASE else f"(?:{r.regex.pattern})" for r in rules]
+            # Named groups cannot repeat across alternatives, so the prefilter drops their names
+            combined = re.sub(r"\(\?P<\w+>", "(?:", "|".join(alternatives))
+            try:
+                self._prefilters[key] = re.compile(combined)
+            except re.error:
+                self._prefilters[key] = None
+        return self._prefilters[key]
+
+    def scan(self, text: str) -> Dict[str, RuleMatch]:
+        best: Dict[str, RuleMatch] = {}
+        pending = list(range(len(self.rules)))
+        prefilter = self._prefilter(pending) if pending else None
+        direct = [i for i in pending if self.rules[i].backref]
+        for line_no, line in enumerate((text or "").splitlines()):
+            if not pending:
+                break
+            candidates = pending
+            if prefilter is not None and not prefilter.search(line):
+                # Only backreference rules can still match a line the prefilter rejected
+                candidates = direct
+                if not candidates:
+                    continue
+            matched = False
+            for i in candidates:
+                rule = self.rules[i]
+                current = best.get(rule.field)
+                if current is not None and current.rule <= rule.priority:
+                    continue  # already settled by an equal or more preferred rule
+                match = rule.match(line, line_no)
+                if match is not None:
+                    best[rule.field] = match
+                    matched = True
+            if matched:
+                # Settled rules leave the prefilter, so unmatched lines are skipped in one regex search
+                pending = [i for i in pending if best.get(self.rules[i].field) is None or best[self.rules[i].field].rule > self.rules[i].priority]
+                prefilter = self._prefilter(pending) if pending else None
+                direct = [i for i in pending if self.rules[i].backref]
+        return best
+
+
+def _field_specs(template: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+    fields = list(template.get("fields", []))
+    for sheet in template.get("sheets", []):
+        fields.extend(sheet.get("fields", []))
+    specs: Dict[str, List[Dict[str, Any]]] = {}
+    for f in fields:
+        rules = f.get("rules")
+        if rules is None:
+            rules = DEFAULT_RULES.get(f["key"], [])
+        specs[f["key"]] = rules if isinstance(rules, list) else [rules]
+    return specs
+
+
+# Template content hash -> compiled rule set
+_rule_sets: Dict[str, RuleSet] = {}
+_lock = threading.Lock()
+
+
+def get_rule_set(template: Dict[str, Any]) -> RuleSet:
+    compiled = get_compiled(template)
+    key = compiled.content_hash
+    with _lock:
+        rule_set = _rule_sets.get(key)
+        if rule_set is None:
+            rule_set = RuleSet(compiled.field_keys, _field_specs(template))
+            _rule_sets[key] = rule_set
+        return rule_set
+
+
+def extract_with_rules(text: str, template: Dict[str, Any]) -> Dict[str, RuleMatch]:
+    """Field key -> best match, in one pass over the document's lines."""
+    return get_rule_set(template).scan(text)
@@ -0,0 +1,223 @@
+"""Table-aware extraction: PDF tables mapped straight onto template sections.
+
+Schedules of investments, cashflow statements and PCAP tables lose their structure in plain
+page text. Tables detected by pdf_extractor.extract_tables are matched against the template:
+when a table's header row names enough of a section's fields (a sheet of a multi-sheet
+template, or the whole template otherwise), its rows become rows of that section, numbers
+parsed column-wise, and the section is left out of the LLM prompt. A flat template is only
+skipped when its tables name every field; otherwise it is still extracted and the document
+row fills the fields the table rows lack (see merge_table_rows).
+
+A header matches a field through the field key, its header text or the ``label`` of its
+``rules`` (see rules.py), compared after slugifying.
+"""
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import math
+import re
+from .pdf_extractor import PdfTable
+from .templates import slugify_to_key
+
+# Header rows are looked for among the first rows of a table (titles often sit above them)
+HEADER_SEARCH_ROWS = 3
+
+# Share of a column's non-blank cells that must parse for the column to become numeric
+NUMERIC_COLUMN_SHARE = 0.8
+
+# A page is worth running table detection on when it carries this many numbers (text
+# extraction often puts each table cell on its own line, so this is counted per page)
+TABULAR_MIN_NUMBERS = 8
+
+_NUMBER_TOKEN = re.compile(r"\(?-?[$€£¥]?\d[\d,]*(?:\.\d+)?\)?%?")
+_CURRENCY = r"[$€£¥₹]|\b(?:USD|EUR|GBP|JPY|CHF|CAD|AUD|INR)\b"
+_DASHES = ("-", "–", "—")
+
+
+def looks_tabular(page_text: str, min_numbers: int = TABULAR_MIN_NUMBERS) -> bool:
+    """Cheap gate for table detection, which costs far more than text extraction per page."""
+    for count, _ in enumerate(_NUMBER_TOKEN.finditer(page_text), 1):
+        if count >= min_numbers:
+            return True
+    return False
+
+
+@lru_cache(maxsize=1024)
+def _header_pattern(aliases: Tuple[str, ...]) -> "re.Pattern[str]":
+    # A field name used as a column header; "Manager: ..." is a key-value label, not a header
+    words = "|".join(r"[\W_]+".join(re.escape(w) for w in alias.split("_")) for alias in aliases)
+    return re.compile(rf"(?i)\b(?:{words})\b(?!\s*:)")
+
+
+def candidate_pages(pages: List[str], template: Dict[str, Any], min_coverage: float) -> List[int]:
+    """Pages that could hold a table mapping onto the template: numeric, and naming enough of a section's fields."""
+    sections = [[tuple(field_aliases(spec)) for spec in fields] for _, fields in template_sections(template) if fields]
+    found: List[int] = []
+    for index, text in enumerate(pages):
+        if not looks_tabular(text):
+            continue
+        for aliases in sections:
+            named = sum(1 for options in aliases if _header_pattern(options).search(text))
+            if named >= max(min(2, len(aliases)), math.ceil(min_coverage * len(aliases))):
+                found.append(index)
+                break
+    return found
+
+
+def parse_numbers(values: Iterable[Any]):
+    """Parse financial number strings column-wise; a float Series with NaN where a cell is not a number.
+
+    Handles thousands separators, currency symbols and codes, parentheses and leading minus or
+    dash signs for negatives, trailing % (kept as the number shown, 12.5% -> 12.5) and a lone
+    dash for zero.
+    """
+    import pandas as pd
+
+    text = pd.Series(list(values), dtype="string").str.strip()
+    text = text.str.replace(_CURRENCY, "", regex=True).str.replace(r"[,\s]", "", regex=True)
+    negative = text.str.match(r"^\(.*\)$|^[-−–]").fillna(False)
+    text = text.str.replace(r"^\((.*)\)$", r"\1", regex=True).str.replace(r"^[-−–]", "", regex=True)
+    text = text.str.replace(r"%$", "", regex=True)
+    numbers = pd.to_numeric(text, errors="coerce").astype(float)
+    numbers = numbers.where(~negative, -numbers)
+    # "-" alone is how statements print zero; it was stripped to "" above as a sign
+    zero = pd.Series(list(values), dtype="string").str.strip().isin(_DASHES).fillna(False)
+    return numbers.mask(zero, 0.0)
+
+
+def coerce_numeric_columns(frame, min_share: float = NUMERIC_COLUMN_SHARE):
+    """Columns whose non-blank cells are (mostly) numbers become floats; others are left as text."""
+    out = frame.copy()
+    for column in frame.columns:
+        text = frame[column].fillna("").astype(str)
+        filled = text.str.strip() != ""
+        if not filled.any():
+            continue
+        parsed = parse_numbers(text)
+        parsed.index = frame.index
+        if parsed[filled].notna().mean() >= min_share:
+            out[column] = parsed.astype(object).where(parsed.notna(), text)
+    return out
+
+
+def template_sections(template: Dict[str, Any]) -> List[Tuple[Optional[str], List[Dict[str, Any]]]]:
+    """(sheet name, fields) per sheet of a multi-sheet template; (None, fields) for a flat one."""
+    if template.get("multiSheet", False) and "sheets" in template:
+        return [(s.get("name", f"Sheet {i}"), s.get("fields", [])) for i, s in enumerate(template.get("sheets", []), 1)]
+    return [(None, template.get("fields", []))]
+
+
+def field_aliases(spec: Dict[str, Any]) -> List[str]:
+    aliases = [slugify_to_key(spec["key"]), slugify_to_key(spec.get("header", ""))]
+    rules = spec.get("rules") or []
+    for rule in rules if isinstance(rules, list) else [rules]:
+        labels = rule.get("label", []) if isinstance(rule, dict) else []
+        aliases.extend(slugify_to_key(label) for label in (labels if isinstance(labels, list) else [labels]))
+    return [a for a in dict.fromkeys(aliases) if a != "field"]
+
+
+def match_columns(header: Sequence[str], fields: List[Dict[str, Any]]) -> Dict[int, str]:
+    """Column index -> field key for header cells naming a field; each field is used once."""
+    lookup: Dict[str, str] = {}
+    for spec in fields:
+        for alias in field_aliases(spec):
+            lookup.setdefault(alias, spec["key"])
+    matched: Dict[int, str] = {}
+    used = set()
+    for i, cell in enumerate(header):
+        key = lookup.get(slugify_to_key(cell)) if cell else None
+        if key is not None and key not in used:
+            matched[i] = key
+            used.add(key)
+    return matched
+
+
+@dataclass
+class TableMatch:
+    page: int
+    bbox: Tuple[float, float, float, float]
+    section: Optional[str]
+    columns: Dict[str, str]
+    coverage: float
+    rows: int = 0
+
+
+@dataclass
+class TableMapping:
+    rows: List[Dict[str, Any]] = field(default_factory=list)
+    sections: List[Optional[str]] = field(default_factory=list)
+    matches: List[TableMatch] = field(default_factory=list)
+
+
+def _best_match(table: PdfTable, sections: List[Tuple[Optional[str], List[Dict[str, Any]]]], min_coverage: float) -> Optional[Tuple[int, TableMatch, Dict[int, str]]]:
+    best: Optional[Tuple[int, TableMatch, Dict[int, str]]] = None
+    for header_row in range(min(HEADER_SEARCH_ROWS, len(table.cells) - 1)):
+        header = table.cells[header_row]
+        for name, fields in sections:
+            if not fields:
+                continue
+            matched = match_columns(header, fields)
+            coverage = len(matched) / len(fields)
+            if len(matched) < min(2, len(fields)) or coverage < min_coverage:
+                continue
+            if best is None or coverage > best[1].coverage:
+                columns = {header[i]: key for i, key in matched.items()}
+                best = (header_row, TableMatch(table.page, table.bbox, name, columns, coverage), matched)
+    return best
+
+
+def _json_value(value: Any) -> Any:
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else value
+    return value
+
+
+def table_rows(table: PdfTable, header_row: int, matched: Dict[int, str]) -> List[Dict[str, Any]]:
+    """Rows of ``table`` below ``header_row`` keyed by field, numeric columns parsed."""
+    body = PdfTable(table.page, table.bbox, table.cells[header_row:], table.backend)
+    frame = body.to_frame()
+    frame = frame.iloc[:, sorted(matched)]
+    frame.columns = [matched[i] for i in sorted(matched)]
+    frame = coerce_numeric_columns(frame.fillna(""))
+    rows = []
+    for record in frame.to_dict("records"):
+        row = {key: _json_value(value) for key, value in record.items()}
+        if any(v != "" for v in row.values()):
+            rows.append(row)
+    return rows
+
+
+def map_tables(tables: List[PdfTable], template: Dict[str, Any], min_coverage: float) -> TableMapping:
+    """Rows for every table that matches a template section, in page order."""
+    sections = template_sections(template)
+    mapping = TableMapping()
+    for table in sorted(tables, key=lambda t: (t.page, t.bbox[1])):
+        best = _best_match(table, sections, min_coverage)
+        if best is None:
+            continue
+        header_row, match, matched = best
+        rows = table_rows(table, header_row, matched)
+        if not rows:
+            continue
+        match.rows = len(rows)
+        mapping.rows.extend(rows)
+        mapping.matches.append(match)
+        if match.section not in mapping.sections:
+            mapping.sections.append(match.section)
+    return mapping
+
+
+def remaining_template(template: Dict[str, Any], mapping: TableMapping) -> Optional[Dict[str, Any]]:
+    """The template without the sections tables already filled; None when nothing is left for the LLM."""
+    if not mapping.sections:
+        return template
+    if template.get("multiSheet", False) and "sheets" in template:
+        sheets = [s for i, s in enumerate(template.get("sheets", []), 1) if s.get("name", f"Sheet {i}") not in mapping.sections]
+        return {**template, "sheets": sheets} if sheets else None
+    covered = {key for match in mapping.matches for key in match.columns.values()}
+    return None if all(spec["key"] in covered for spec in template.get("fields", [])) else template
+
+
+def merge_table_rows(rows: List[Dict[str, Any]], document_row: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Table rows of a flat template, completed with the document row's values for the fields they do not have."""
+    return [{**document_row, **row} for row in rows]
@@ -1,8 +1,13 @@
+import copy
+import hashlib
 import json
 import os
 import re
-from typing import Any, Dict, List, Optional
-from openpyxl import load_workbook
+import threading
+from dataclasses import dataclass
+from functools import cached_property
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple
 from ..settings import get_templates_dir
 
 
@@ -35,11 +40,31 @@ def get_all_template_dirs() -> List[str]:
     return uniq
 
 
+# dir -> (dir mtime_ns, file names); a directory's mtime changes when entries are added or removed
+_dir_listings: Dict[str, Tuple[int, Tuple[str, ...]]] = {}
+
+
+def _list_dir(d: str) -> Tuple[str, ...]:
+    try:
+        mtime = os.stat(d).st_mtime_ns
+    except OSError:
+        _dir_listings.pop(d, None)
+        return ()
+    cached = _dir_listings.get(d)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    try:
+        names = tuple(sorted(os.listdir(d)))
+    except OSError:
+        names = ()
+    _dir_listings[d] = (mtime, names)
+    return names
+
+
 def _find_file_in_dirs(filename: str) -> Optional[str]:
     for d in get_all_template_dirs():
-        path = os.path.join(d, filename)
-        if os.path.exists(path):
-            return path
+        if filename in _list_dir(d):
+            return os.path.join(d, filename)
     return None
 
 
@@ -66,16 +91,13 @@ def _find_xlsx_for_template(template_id: str) -> Optional[str]:
 
     # Fallback: scan for any .xlsx with a matching digit in name
     for d in get_all_template_dirs():
-        try:
-            for fn in os.listdir(d):
-                if not fn.lower().endswith(".xlsx"):
-                    continue
-                if template_id == "template1" and "1" in fn:
-                    return os.path.join(d, fn)
-                if template_id == "template2" and "2" in fn:
-                    return os.path.join(d, fn)
-        except Exception:
-            continue
+        for fn in _list_dir(d):
+            if not fn.lower().endswith(".xlsx"):
+                continue
+            if template_id == "template1" and "1" in fn:
+                return os.path.join(d, fn)
+            if template_id == "template2" and "2" in fn:
+                return os.path.join(d, fn)
     return None
 
 
@@ -86,6 +108,8 @@ def _load_template_json(path: str) -> Dict[str, Any]:
 
 def _load_template_xlsx(path: str, template_id: str) -> Dict[str, Any]:
     # Read first sheet headers as the template columns
+    from openpyxl import load_workbook
+
     wb = load_workbook(path, read_only=True)
     ws = wb.active
     headers: List[str] = [str(cell.value) for cell in ws[1] if cell.value is not None]
@@ -98,54 +122,171 @@ def _load_template_xlsx(path: str, template_id: str) -> Dict[str, Any]:
     }
 
 
-def load_template(template_id: str) -> Dict[str, Any]:
-    # Try JSON in known dirs
+def _read_only(self, *args: Any, **kwargs: Any) -> None:
+    raise TypeError("Loaded templates are shared and read-only; copy.deepcopy() one to change it")
+
+
+class FrozenDict(dict):
+    """A dict that refuses mutation; deepcopy gives a plain, mutable dict."""
+
+    __setitem__ = __delitem__ = __ior__ = _read_only  # type: ignore[assignment]
+    clear = pop = popitem = setdefault = update = _read_only  # type: ignore[assignment]
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> Dict[str, Any]:
+        return {k: copy.deepcopy(v, memo) for k, v in self.items()}
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        return (FrozenDict, (dict(self),))
+
+
+class FrozenList(list):
+    """A list that refuses mutation; deepcopy gives a plain, mutable list."""
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only  # type: ignore[assignment]
+    append = extend = insert = pop = remove = clear = sort = reverse = _read_only  # type: ignore[assignment]
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> List[Any]:
+        return [copy.deepcopy(v, memo) for v in self]
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        return (FrozenList, (list(self),))
+
+
+def freeze(value: Any) -> Any:
+    """``value`` with every nested dict and list made read-only."""
+    if isinstance(value, dict):
+        return FrozenDict((k, freeze(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return FrozenList(freeze(v) for v in value)
+    return value
+
+
+@dataclass(frozen=True)
+class CompiledTemplate:
+    """Everything derived from a template dict, computed once per template version."""
+
+    template_id: str
+    raw: Dict[str, Any]
+    field_keys: Tuple[str, ...]
+    headers: Tuple[str, ...]
+    key_index: Mapping[str, int]
+    field_map: Mapping[str, str]
+    # (sheet name, start column, stop column) into field_keys/headers
+    sheet_slices: Tuple[Tuple[str, int, int], ...]
+    prompt_fields: str
+
+    @cached_property
+    def content_hash(self) -> str:
+        canonical = json.dumps(self.raw, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def compile_template(template: Dict[str, Any]) -> CompiledTemplate:
+    if template.get("multiSheet", False) and "sheets" in template:
+        keys: List[str] = []
+        headers: List[str] = []
+        slices: List[Tuple[str, int, int]] = []
+        blocks: List[str] = []
+        for i, sheet in enumerate(template.get("sheets", []), 1):
+            sheet_fields = sheet.get("fields", [])
+            start = len(keys)
+            keys.extend(f["key"] for f in sheet_fields)
+            headers.extend(f["header"] for f in sheet_fields)
+            sheet_name = sheet.get("name", f"Sheet {i}")
+            slices.append((sheet_name, start, len(keys)))
+            blocks.append(
+                f"{i}. {sheet_name}\n"
+                f"   Description: {sheet.get('description', '')}\n"
+                f"   Fields: {', '.join(f['key'] for f in sheet_fields)}\n\n"
+            )
+        prompt_fields = "".join(blocks)
+    else:
+        fields = template.get("fields", [])
+        keys = [f["key"] for f in fields]
+        headers = [f["header"] for f in fields]
+        slices = [("Sheet1", 0, len(keys))]
+        prompt_fields = "\n".join([f"- {k}" for k in keys])
+
+    return CompiledTemplate(
+        template_id=template.get("templateId", "template"),
+        raw=template,
+        field_keys=tuple(keys),
+        headers=tuple(headers),
+        key_index=MappingProxyType({k: i for i, k in enumerate(keys)}),
+        field_map=MappingProxyType(dict(zip(keys, headers))),
+        sheet_slices=tuple(slices),
+        prompt_fields=prompt_fields,
+    )
+
+
+# template_id -> (source path, mtime_ns, size, compiled)
+_registry: Dict[str, Tuple[str, int, int, CompiledTemplate]] = {}
+# id(raw dict) -> compiled, for templates handed out by load_template
+_by_raw_id: Dict[int, CompiledTemplate] = {}
+_registry_lock = threading.Lock()
+
+
+def _resolve_template_path(template_id: str) -> Tuple[Optional[str], bool]:
     json_path = _find_file_in_dirs(f"{template_id}.json")
     if json_path:
-        return _load_template_json(json_path)
+        return json_path, True
+    return _find_xlsx_for_template(template_id), False
+
 
-    # Try XSLX filenames
-    xlsx_path = _find_xlsx_for_template(template_id)
-    if xlsx_path:
-        return _load_template_xlsx(xlsx_path, template_id)
+def load_compiled_template(template_id: str) -> CompiledTemplate:
+    """Load and compile a template, reusing the previous result while the source file is unchanged."""
+    # Try JSON in known dirs, then XLSX filenames
+    path, is_json = _resolve_template_path(template_id)
+    if not path:
+        raise FileNotFoundError(f"Template not found for id: {template_id}")
+    st = os.stat(path)
 
-    raise FileNotFoundError(f"Template not found for id: {template_id}")
+    with _registry_lock:
+        cached = _registry.get(template_id)
+        if cached is not None and cached[:3] == (path, st.st_mtime_ns, st.st_size):
+            return cached[3]
+
+    # Frozen: the dict is shared by every caller and keyed by identity in _by_raw_id
+    raw = freeze(_load_template_json(path) if is_json else _load_template_xlsx(path, template_id))
+    compiled = compile_template(raw)
+    with _registry_lock:
+        previous = _registry.get(template_id)
+        if previous is not None:
+            _by_raw_id.pop(id(previous[3].raw), None)
+        _registry[template_id] = (path, st.st_mtime_ns, st.st_size, compiled)
+        _by_raw_id[id(raw)] = compiled
+    return compiled
+
+
+def load_template(template_id: str) -> Dict[str, Any]:
+    """The template dict, shared between callers and read-only (see FrozenDict); deepcopy it to change it."""
+    return load_compiled_template(template_id).raw
+
+
+def get_compiled(template: Dict[str, Any]) -> CompiledTemplate:
+    """Compiled form of a template dict: registry hit for loaded templates, compiled on the fly otherwise."""
+    compiled = _by_raw_id.get(id(template))
+    if compiled is not None and compiled.raw is template:
+        return compiled
+    return compile_template(template)
 
 
 def get_template_field_order(template: Dict[str, Any]) -> list[str]:
-    """Get field order for single-sheet templates (legacy support)."""
-    if template.get("multiSheet", False) and "sheets" in template:
-        # For multi-sheet templates, return all fields from all sheets
-        all_fields = []
-        for sheet in template.get("sheets", []):
-            all_fields.extend([f["key"] for f in sheet.get("fields", [])])
-        return all_fields
-    return [f["key"] for f in template.get("fields", [])]
+    """Get field order for single-sheet templates (legacy support).
+
+    For multi-sheet templates, returns all fields from all sheets.
+    """
+    return list(get_compiled(template).field_keys)
 
 
 def get_template_headers(template: Dict[str, Any]) -> list[str]:
-    """Get headers for single-sheet templates (legacy support)."""
-    if template.get("multiSheet", False) and "sheets" in template:
-        # For multi-sheet templates, return all headers from all sheets
-        all_headers = []
-        for sheet in template.get("sheets", []):
-            all_headers.extend([f["header"] for f in sheet.get("fields", [])])
-        return all_headers
-    return [f["header"] for f in template.get("fields", [])]
+    """Get headers for single-sheet templates (legacy support).
+
+    For multi-sheet templates, returns all headers from all sheets.
+    """
+    return list(get_compiled(template).headers)
 
 
 def get_all_template_fields(template: Dict[str, Any]) -> Dict[str, str]:
     """Get all fields from a template as key->header mapping."""
-    field_map = {}
-    
-    if template.get("multiSheet", False) and "sheets" in template:
-        for sheet in template.get("sheets", []):
-            for field in sheet.get("fields", []):
-                field_map[field["key"]] = field["header"]
-    else:
-        for field in template.get("fields", []):
-            field_map[field["key"]] = field["header"]
-    
-    return field_map
-
-
+    return dict(get_compiled(template).field_map)
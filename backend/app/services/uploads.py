@@ -0,0 +1,240 @@
+"""Streaming multipart uploads spooled to disk.
+
+The request body is parsed as it arrives: file parts are written to a per-request spool
+directory chunk by chunk and hashed on the way, so an upload is never held in memory whole
+and the PDF extractor can open it by path. Size caps are checked as bytes arrive, so an
+oversized upload is rejected after at most one chunk over the limit.
+"""
+from dataclasses import dataclass, field
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+from ..settings import get_upload_max_file_bytes, get_upload_max_request_bytes, get_upload_spool_dir
+
+# Plain form fields (template_id, ...) are small; anything bigger is not a valid request
+MAX_FIELD_BYTES = 64 * 1024
+HASH_CHUNK_BYTES = 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class UploadError(Exception):
+    pass
+
+
+@dataclass
+class SpooledUpload:
+    filename: str
+    path: str
+    size: int
+    sha256: str
+    content_type: str = ""
+
+    def read_bytes(self) -> bytes:
+        with open(self.path, "rb") as f:
+            return f.read()
+
+
+@dataclass
+class SpooledForm:
+    directory: str
+    fields: Dict[str, str] = field(default_factory=dict)
+    files: List[SpooledUpload] = field(default_factory=list)
+
+    def cleanup(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def spooled_from_path(path: str, filename: Optional[str] = None) -> SpooledUpload:
+    """Describe a file already on disk (e.g. a job input), hashing it in chunks."""
+    hasher = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            hasher.update(chunk)
+            size += len(chunk)
+    return SpooledUpload(filename or os.path.basename(path), path, size, hasher.hexdigest())
+
+
+async def load_spooled(upload: SpooledUpload) -> SpooledUpload:
+    """``load`` for the pipeline: a spooled upload is passed through and opened by path."""
+    return upload
+
+
+def _safe_filename(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", os.path.basename(name or "")).strip("_") or "upload.pdf"
+
+
+def _write_chunks(f: BinaryIO, hasher: Any, chunks: List[bytes]) -> None:
+    for chunk in chunks:
+        hasher.update(chunk)
+        f.write(chunk)
+
+
+class _Part:
+    def __init__(self):
+        self.headers: Dict[bytes, bytes] = {}
+        self.name = ""
+        self.filename: Optional[str] = None
+        self.content_type = ""
+        self.data = bytearray()
+        self.file: Optional[BinaryIO] = None
+        self.path = ""
+        self.hasher: Any = None
+        self.size = 0
+
+
+class _SpoolingParser:
+    """python-multipart callbacks; file bytes are queued here and written off the event loop."""
+
+    def __init__(self, form: SpooledForm, max_file_bytes: int):
+        self.form = form
+        self.max_file_bytes = max_file_bytes
+        self.part = _Part()
+        self._header_field = b""
+        self._header_value = b""
+        self.pending: List[Tuple[_Part, bytes]] = []
+        self.finished: List[_Part] = []
+        self.open_files: List[BinaryIO] = []
+
+    def on_part_begin(self) -> None:
+        self.part = _Part()
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def on_header_end(self) -> None:
+        self.part.headers[self._header_field.lower()] = self._header_value
+        self._header_field = self._header_value = b""
+
+    def on_headers_finished(self) -> None:
+        from multipart.multipart import parse_options_header
+
+        _, options = parse_options_header(self.part.headers.get(b"content-disposition", b""))
+        if b"name" not in options:
+            raise UploadError('The Content-Disposition header field "name" must be provided.')
+        part = self.part
+        part.name = options[b"name"].decode("utf-8", "replace")
+        if b"filename" in options:
+            part.filename = options[b"filename"].decode("utf-8", "replace")
+            part.content_type = part.headers.get(b"content-type", b"").decode("latin-1")
+            part.path = os.path.join(self.form.directory, f"{len(self.form.files) + len(self.finished):04d}_{_safe_filename(part.filename)}")
+            part.file = open(part.path, "wb")
+            part.hasher = hashlib.sha256()
+            self.open_files.append(part.file)
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        part = self.part
+        chunk = data[start:end]
+        if part.file is None:
+            part.data += chunk
+            if len(part.data) > MAX_FIELD_BYTES:
+                raise UploadError(f"Form field {part.name!r} is too large")
+            return
+        part.size += len(chunk)
+        if self.max_file_bytes and part.size > self.max_file_bytes:
+            raise UploadTooLarge(f"{part.filename} exceeds the {self.max_file_bytes // (1024 * 1024)} MB per-file limit")
+        self.pending.append((part, chunk))
+
+    def on_part_end(self) -> None:
+        part = self.part
+        if part.file is None:
+            self.form.fields[part.name] = part.data.decode("utf-8", "replace")
+        else:
+            self.finished.append(part)
+
+    async def flush(self) -> None:
+        by_part: Dict[int, Tuple[_Part, List[bytes]]] = {}
+        for part, chunk in self.pending:
+            by_part.setdefault(id(part), (part, []))[1].append(chunk)
+        self.pending = []
+        for part, chunks in by_part.values():
+            await asyncio.to_thread(_write_chunks, part.file, part.hasher, chunks)
+        for part in self.finished:
+            part.file.close()
+            self.open_files.remove(part.file)
+            self.form.files.append(SpooledUpload(part.filename or "", part.path, part.size, part.hasher.hexdigest(), part.content_type))
+        self.finished = []
+
+    def close_all(self) -> None:
+        for f in self.open_files:
+            f.close()
+        self.open_files = []
+
+
+async def spool_multipart(
+    request: Any,
+    max_file_bytes: Optional[int] = None,
+    max_request_bytes: Optional[int] = None,
+    spool_dir: Optional[str] = None,
+) -> SpooledForm:
+    """Parse a multipart/form-data request, spooling file parts to disk as they stream in.
+
+    Raises UploadTooLarge (per-file or per-request cap) or UploadError (malformed body); the
+    spool directory is removed on failure. Callers own ``cleanup()`` on success.
+    """
+    from multipart.multipart import MultipartParser, parse_options_header
+
+    max_file_bytes = get_upload_max_file_bytes() if max_file_bytes is None else max_file_bytes
+    max_request_bytes = get_upload_max_request_bytes() if max_request_bytes is None else max_request_bytes
+
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise UploadError("Expected a multipart/form-data request")
+    declared = request.headers.get("content-length")
+    if max_request_bytes and declared and declared.isdigit() and int(declared) > max_request_bytes:
+        # Rejected before reading any of the body
+        raise UploadTooLarge(f"Request exceeds the {max_request_bytes // (1024 * 1024)} MB upload limit")
+
+    form = SpooledForm(directory=tempfile.mkdtemp(prefix="upload_", dir=spool_dir or get_upload_spool_dir()))
+    spooler = _SpoolingParser(form, max_file_bytes)
+    parser = MultipartParser(
+        params[b"boundary"],
+        {
+            "on_part_begin": spooler.on_part_begin,
+            "on_part_data": spooler.on_part_data,
+            "on_part_end": spooler.on_part_end,
+            "on_header_field": spooler.on_header_field,
+            "on_header_value": spooler.on_header_value,
+            "on_header_end": spooler.on_header_end,
+            "on_headers_finished": spooler.on_headers_finished,
+        },
+    )
+    received = 0
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if max_request_bytes and received > max_request_bytes:
+                raise UploadTooLarge(f"Request exceeds the {max_request_bytes // (1024 * 1024)} MB upload limit")
+            parser.write(chunk)
+            await spooler.flush()
+        parser.finalize()
+        await spooler.flush()
+    except BaseException as e:
+        # Includes cancellation (client gone): nothing of this request may stay on disk
+        spooler.close_all()
+        form.cleanup()
+        if isinstance(e, (UploadTooLarge, UploadError)) or not isinstance(e, Exception):
+            raise
+        raise UploadError(f"Malformed multipart body: {e}") from e
+    return form
+
+
+def upload_openapi(**fields: Dict[str, Any]) -> Dict[str, Any]:
+    """OpenAPI requestBody for routes that stream ``files`` plus the given form fields themselves."""
+    properties = {"files": {"type": "array", "items": {"type": "string", "format": "binary"}}, **fields}
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {"multipart/form-data": {"schema": {"type": "object", "required": ["files"], "properties": properties}}},
+        }
+    }
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from typing import Optional
 
 
@@ -31,3 +32,259 @@ def get_openai_api_key() -> Optional[str]:
     return os.getenv("OPENAI_API_KEY")
 
 
+def _get_int_env(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def get_pdf_backend() -> str:
+    # "auto" prefers PyMuPDF and falls back to pdfplumber; "pdfplumber" keeps layout fidelity
+    return os.getenv("PDF_BACKEND", "auto").lower()
+
+
+def get_pdf_workers() -> int:
+    return max(1, _get_int_env("PDF_WORKERS", min(4, os.cpu_count() or 1)))
+
+
+def get_pdf_shard_pages() -> int:
+    return max(1, _get_int_env("PDF_SHARD_PAGES", 25))
+
+
+def get_pdf_parallel_min_pages() -> int:
+    # Small documents are cheaper to parse in-process than to ship to a worker
+    return _get_int_env("PDF_PARALLEL_MIN_PAGES", 40)
+
+
+def get_openai_model() -> str:
+    return os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+
+
+def get_openai_base_url() -> str:
+    # Any OpenAI-compatible endpoint, e.g. the local stub in bench/stub_llm.py
+    return (os.getenv("OPENAI_BASE_URL") or "https://api.openai.com/v1").rstrip("/")
+
+
+def is_cache_enabled() -> bool:
+    return (os.getenv("CACHE_ENABLED", "true").lower() == "true")
+
+
+def get_cache_dir() -> str:
+    cache_dir = os.getenv("CACHE_DIR") or os.path.join(get_project_root(), ".cache")
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+def get_cache_memory_items() -> int:
+    return max(0, _get_int_env("CACHE_MEMORY_ITEMS", 256))
+
+
+def get_cache_disk_max_bytes() -> int:
+    return max(0, _get_int_env("CACHE_DISK_MAX_MB", 512)) * 1024 * 1024
+
+
+def get_gemini_api_key() -> Optional[str]:
+    return os.getenv("GEMINI_API_KEY")
+
+
+def get_gemini_model() -> str:
+    return os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+
+
+def _get_float_env(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def get_llm_concurrency() -> int:
+    return max(1, _get_int_env("LLM_CONCURRENCY", 8))
+
+
+def get_llm_max_connections() -> int:
+    return max(1, _get_int_env("LLM_MAX_CONNECTIONS", 20))
+
+
+def get_llm_max_keepalive() -> int:
+    return max(0, _get_int_env("LLM_MAX_KEEPALIVE", 10))
+
+
+def get_llm_timeout() -> float:
+    return _get_float_env("LLM_TIMEOUT_S", 60.0)
+
+
+def get_llm_connect_timeout() -> float:
+    return _get_float_env("LLM_CONNECT_TIMEOUT_S", 10.0)
+
+
+# Provider rate limits (requests and tokens per minute); override with e.g. OPENAI_RPM, GEMINI_TPM
+_LLM_RATE_DEFAULTS = {"openai": (500, 200_000), "gemini": (1000, 4_000_000)}
+
+
+def get_llm_rpm(provider: str) -> int:
+    # 0 disables the limit
+    return max(0, _get_int_env(f"{provider.upper()}_RPM", _LLM_RATE_DEFAULTS.get(provider, (0, 0))[0]))
+
+
+def get_llm_tpm(provider: str) -> int:
+    return max(0, _get_int_env(f"{provider.upper()}_TPM", _LLM_RATE_DEFAULTS.get(provider, (0, 0))[1]))
+
+
+def get_llm_max_attempts() -> int:
+    return max(1, _get_int_env("LLM_MAX_ATTEMPTS", 3))
+
+
+def get_llm_backoff_base() -> float:
+    return max(0.0, _get_float_env("LLM_BACKOFF_BASE_S", 0.5))
+
+
+def get_llm_backoff_max() -> float:
+    return max(0.0, _get_float_env("LLM_BACKOFF_MAX_S", 30.0))
+
+
+def get_extract_request_concurrency() -> int:
+    # Files processed at once within a single /api/extract request
+    return max(1, _get_int_env("EXTRACT_MAX_CONCURRENCY_PER_REQUEST", 4))
+
+
+def get_extract_global_concurrency() -> int:
+    # Files processed at once across all requests in this worker
+    return max(1, _get_int_env("EXTRACT_MAX_CONCURRENCY", 16))
+
+
+def get_llm_chunking_mode() -> str:
+    # "auto" switches to map-reduce when the text exceeds the single-prompt window; "off" truncates
+    return os.getenv("LLM_CHUNKING", "auto").lower()
+
+
+def get_llm_chunk_tokens() -> int:
+    return max(256, _get_int_env("LLM_CHUNK_TOKENS", 3500))
+
+
+def get_llm_max_chunks() -> int:
+    return max(1, _get_int_env("LLM_MAX_CHUNKS", 8))
+
+
+def get_llm_retrieval_mode() -> str:
+    # "auto" (only when the text exceeds the prompt window), "always" or "off"
+    return os.getenv("LLM_RETRIEVAL", "auto").lower()
+
+
+def get_llm_retrieval_top_k() -> int:
+    return max(1, _get_int_env("LLM_RETRIEVAL_TOP_K", 6))
+
+
+def get_llm_retrieval_group_size() -> int:
+    return max(1, _get_int_env("LLM_RETRIEVAL_GROUP_SIZE", 12))
+
+
+def get_llm_batch_max_docs() -> int:
+    # Small documents in flight together share one prompt, up to this many; 1 disables batching
+    return max(1, _get_int_env("LLM_BATCH_MAX_DOCS", 8))
+
+
+def get_llm_batch_window_s() -> float:
+    # How long the first small document waits for others to join its batch
+    return max(0.0, _get_float_env("LLM_BATCH_WINDOW_MS", 50.0) / 1000)
+
+
+def get_llm_batch_tokens() -> int:
+    # Estimated document tokens packed into one batched prompt
+    return max(1, _get_int_env("LLM_BATCH_TOKENS", 8000))
+
+
+def is_page_filter_enabled() -> bool:
+    # Classify pages after text extraction and drop or demote boilerplate before prompting
+    return os.getenv("PAGE_FILTER", "true").lower() == "true"
+
+
+def is_table_extraction_enabled() -> bool:
+    # Detect tables on numeric-looking pages and map them onto template sections without the LLM
+    return os.getenv("TABLE_EXTRACTION", "true").lower() == "true"
+
+
+def get_table_min_coverage() -> float:
+    # Share of a section's fields a table's headers must match before it replaces the LLM there
+    return min(1.0, max(0.0, _get_float_env("TABLE_MATCH_MIN_COVERAGE", 0.5)))
+
+
+def is_incremental_extraction_enabled() -> bool:
+    # Re-prompt only the changed pages of a revised document and reuse the rest of its earlier row
+    return os.getenv("INCREMENTAL_EXTRACTION", "true").lower() == "true"
+
+
+def get_incremental_min_overlap() -> float:
+    # Share of a document's pages that must be unchanged from an earlier version of the same file
+    return min(1.0, max(0.0, _get_float_env("INCREMENTAL_MIN_OVERLAP", 0.5)))
+
+
+def get_upload_max_file_bytes() -> int:
+    # Enforced while the upload streams in; 0 disables the cap
+    return max(0, _get_int_env("MAX_UPLOAD_FILE_MB", 50)) * 1024 * 1024
+
+
+def get_upload_max_request_bytes() -> int:
+    return max(0, _get_int_env("MAX_UPLOAD_REQUEST_MB", 200)) * 1024 * 1024
+
+
+def get_upload_spool_dir() -> str:
+    # Uploads are written here in chunks instead of being held in memory
+    spool_dir = os.getenv("UPLOAD_SPOOL_DIR") or os.path.join(tempfile.gettempdir(), "pdf_extraction_uploads")
+    os.makedirs(spool_dir, exist_ok=True)
+    return spool_dir
+
+
+def get_data_dir() -> str:
+    # Local state that must survive restarts (job store, spooled job inputs)
+    data_dir = os.getenv("DATA_DIR") or os.path.join(get_project_root(), ".data")
+    os.makedirs(data_dir, exist_ok=True)
+    return data_dir
+
+
+def get_jobs_workers() -> int:
+    return max(1, _get_int_env("JOBS_WORKERS", 2))
+
+
+def get_jobs_queue_size() -> int:
+    return max(1, _get_int_env("JOBS_QUEUE_SIZE", 100))
+
+
+def get_artifact_memory_max_bytes() -> int:
+    return max(0, _get_int_env("ARTIFACT_MEMORY_MAX_MB", 64)) * 1024 * 1024
+
+
+def get_artifact_ttl_seconds() -> int:
+    # 0 disables time-based eviction from the memory tier
+    return max(0, _get_int_env("ARTIFACT_TTL_S", 3600))
+
+
+def get_artifact_disk_max_bytes() -> int:
+    # Blobs spilled from memory; least recently used ones are deleted past this (0 = unlimited)
+    return max(0, _get_int_env("ARTIFACT_DISK_MAX_MB", 1024)) * 1024 * 1024
+
+
+def get_artifact_disk_ttl_seconds() -> int:
+    # Spilled blobs (and their download names) not requested for this long are deleted; 0 keeps them
+    return max(0, _get_int_env("ARTIFACT_DISK_TTL_S", 86400))
+
+
+def get_artifacts_dir() -> str:
+    artifacts_dir = os.path.join(get_output_dir(), ".artifacts")
+    os.makedirs(artifacts_dir, exist_ok=True)
+    return artifacts_dir
+
+
+def get_extraction_mode() -> str:
+    # "llm" (default) or "rules" to serve every request from the compiled rule engine
+    return os.getenv("EXTRACTION_MODE", "llm").lower()
+
+
+def is_profiling_enabled() -> bool:
+    # Allows per-request sampling profiles via the X-Profile header; keep off in production
+    return (os.getenv("PROFILING_ENABLED", "false").lower() == "true")
+
+
+def get_profile_interval() -> float:
+    return max(0.001, _get_float_env("PROFILE_INTERVAL_MS", 5.0) / 1000)
@@ -0,0 +1 @@
+"""Benchmark harness for the extraction pipeline; see bench/run.py."""
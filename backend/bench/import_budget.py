@@ -0,0 +1,84 @@
+"""Cold-start import budget for the serverless entry point.
+
+Imports ``api.index`` in fresh interpreters and fails (exit 1) when the best import time
+exceeds the budget or when a heavy library that should load lazily was imported.
+
+    python -m bench.import_budget                 # from backend/
+    python -m bench.import_budget --budget-s 1.5 --runs 7
+"""
+from typing import Any, Dict, List, Optional, Tuple
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Must only be imported on first use, never at cold start
+LAZY_MODULES = ("fitz", "pdfplumber", "openpyxl", "httpx", "numpy", "pandas", "pyarrow", "google.generativeai")
+
+_CHILD = """
+import json, sys, time
+t0 = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - t0
+print(json.dumps({{"seconds": seconds, "loaded": [m for m in {lazy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module: str) -> Dict[str, Any]:
+    code = _CHILD.format(module=module, lazy=LAZY_MODULES)
+    out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(module: str, limit: int = 10) -> List[str]:
+    """Top cumulative entries from ``python -X importtime``, for the failure report."""
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=BACKEND_DIR, capture_output=True, text=True
+    )
+    rows = []
+    for line in out.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            rows.append((int(parts[1]), parts[2].rstrip()))
+    rows.sort(reverse=True)
+    return [f"{us / 1000:8.1f} ms  {name}" for us, name in rows[:limit]]
+
+
+def check(module: str, runs: int, budget_s: float) -> Tuple[float, List[str]]:
+    """Best import time of ``module`` over ``runs`` fresh interpreters, and the budget violations."""
+    results = [measure(module) for _ in range(max(1, runs))]
+    # The fastest run is the least disturbed by the machine; the budget applies to it
+    best = min(r["seconds"] for r in results)
+    loaded = sorted({m for r in results for m in r["loaded"]})
+    failures = []
+    if loaded:
+        failures.append(f"imported at cold start but should load lazily: {', '.join(loaded)}")
+    if best > budget_s:
+        failures.append(f"import time {best * 1000:.0f} ms over the {budget_s * 1000:.0f} ms budget")
+    return best, failures
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Check the serverless cold-start import budget")
+    parser.add_argument("--module", default="api.index")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-s", type=float, default=float(os.getenv("IMPORT_BUDGET_S", "2.0")))
+    args = parser.parse_args(argv)
+
+    best, failures = check(args.module, args.runs, args.budget_s)
+    print(f"import {args.module}: best {best * 1000:.0f} ms over {max(1, args.runs)} runs (budget {args.budget_s * 1000:.0f} ms)")
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        print("Slowest imports (cumulative):")
+        for line in slowest_imports(args.module):
+            print(f"  {line}")
+        return 1
+    print("OK")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
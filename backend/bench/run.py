@@ -0,0 +1,356 @@
+"""Benchmark the extraction pipeline stage by stage.
+
+Runs the bundled sample PDFs and synthetic scaled-up documents through text extraction,
+structured extraction, output writing and the end-to-end pipeline, then reports per-stage
+p50/p95 latency, throughput, peak RSS and Python allocations (tracemalloc, measured in a
+separate pass so it does not skew the timings). Results are written as JSON and compared
+against a stored baseline.
+
+Run from backend/:
+
+    python -m bench.run                          # samples + 60-page x 4-file synthetic set
+    python -m bench.run --pages 200 --files 8 --repeat 3
+    python -m bench.run --save-baseline          # store this run as bench/baseline.json
+    python -m bench.run --fail-on-regression     # exit 1 when a stage regressed
+    python -m bench.run --llm stub --stub-latency-ms 300 --stub-rate-429 0.05
+
+With ``--llm stub`` structured extraction goes over HTTP to the local OpenAI-compatible stub
+(bench/stub_llm.py) instead of MOCK_LLM, so retries, concurrency and fallbacks are exercised.
+"""
+from dataclasses import asdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from bench.stub_llm import add_stub_arguments, config_from_args, start_in_thread, stop
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SAMPLES_DIR = os.path.join(BENCH_DIR, "..", "..", "examples", "sample_pdfs")
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+DEFAULT_RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+# template1/template2 return static rows, so structured extraction is measured with a generic template
+BENCH_TEMPLATE: Dict[str, Any] = {
+    "templateId": "bench",
+    "description": "Benchmark template",
+    "fields": [
+        {"key": "fund_name", "header": "Fund Name"},
+        {"key": "manager", "header": "Manager"},
+        {"key": "investor_name", "header": "Investor"},
+        {"key": "currency", "header": "Currency"},
+        {"key": "report_date", "header": "Report Date"},
+        {"key": "total_commitment", "header": "Total Commitment"},
+        {"key": "contact_email", "header": "Contact Email"},
+    ],
+}
+
+# Metrics where larger is worse; throughput is compared the other way round
+LATENCY_METRICS = ("p50_ms", "p95_ms")
+
+Work = Callable[[], Union[Any, Awaitable[Any]]]
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def _peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+async def _call(work: Work) -> Any:
+    result = work()
+    if asyncio.iscoroutine(result):
+        result = await result
+    return result
+
+
+async def _timed(work: Work) -> Tuple[float, Any]:
+    t0 = time.perf_counter()
+    result = await _call(work)
+    return (time.perf_counter() - t0) * 1000, result
+
+
+async def _allocations(work: Work) -> Dict[str, Any]:
+    """Python-heap allocations for one run of ``work``; native (MuPDF) memory shows up in RSS only."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        await _call(work)
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    diff = after.compare_to(before, "filename")
+    return {
+        "alloc_peak_kb": round(peak / 1024, 1),
+        "alloc_new_blocks": sum(max(0, stat.count_diff) for stat in diff),
+    }
+
+
+def _summarize(samples: List[float], units: float, unit: str) -> Dict[str, Any]:
+    total_s = sum(samples) / 1000
+    return {
+        "n": len(samples),
+        "p50_ms": round(_percentile(samples, 50), 2),
+        "p95_ms": round(_percentile(samples, 95), 2),
+        "mean_ms": round(sum(samples) / len(samples), 2) if samples else 0.0,
+        "throughput": round(units / total_s, 2) if total_s > 0 else 0.0,
+        "unit": unit,
+    }
+
+
+async def _bench_stage(
+    name: str,
+    works: List[Work],
+    units_per_round: float,
+    unit: str,
+    repeat: int,
+    warmup: int,
+) -> Dict[str, Any]:
+    for _ in range(warmup):
+        for work in works:
+            await _call(work)
+    samples: List[float] = []
+    for _ in range(repeat):
+        for work in works:
+            ms, _ = await _timed(work)
+            samples.append(ms)
+    stats = _summarize(samples, units_per_round * repeat, unit)
+    allocs: Dict[str, Any] = {"alloc_peak_kb": 0.0, "alloc_new_blocks": 0}
+    for work in works:
+        one = await _allocations(work)
+        allocs["alloc_peak_kb"] = max(allocs["alloc_peak_kb"], one["alloc_peak_kb"])
+        allocs["alloc_new_blocks"] += one["alloc_new_blocks"]
+    stats.update(allocs)
+    stats["peak_rss_mb"] = _peak_rss_mb()
+    print(
+        f"  {name:<20} p50 {stats['p50_ms']:>9.2f} ms  p95 {stats['p95_ms']:>9.2f} ms  "
+        f"{stats['throughput']:>9.2f} {unit}  peak alloc {stats['alloc_peak_kb']:>9.1f} KB"
+    )
+    return stats
+
+
+async def run_scenario(
+    name: str,
+    files: List[bytes],
+    template: Dict[str, Any],
+    fmt: str,
+    repeat: int,
+    warmup: int,
+) -> Dict[str, Any]:
+    from app.services.llm_extract import extract_structured_data
+    from app.services.output_formats import write_output
+    from app.services.pdf_extractor import extract_pages
+    from app.services.pipeline import extract_rows_for_files
+
+    print(f"{name}: {len(files)} file(s)")
+    extracted = [extract_pages(data) for data in files]
+    page_count = sum(r.page_count for r in extracted)
+    texts = [(r.text, r.page_texts) for r in extracted]
+    rows: List[Dict[str, Any]] = []
+    for text, pages in texts:
+        rows.extend(await extract_structured_data(text, template, pages))
+
+    async def load(data: bytes) -> bytes:
+        return data
+
+    async def end_to_end() -> None:
+        pipeline_rows = await extract_rows_for_files(files, load, template)
+        write_output(pipeline_rows, template, fmt)
+
+    stages = {
+        "extract_text": await _bench_stage(
+            "extract_text", [lambda d=d: extract_pages(d) for d in files], page_count, "pages/s", repeat, warmup
+        ),
+        "extract_structured": await _bench_stage(
+            "extract_structured",
+            [lambda t=t, p=p: extract_structured_data(t, template, p) for t, p in texts],
+            len(files),
+            "files/s",
+            repeat,
+            warmup,
+        ),
+        "write_output": await _bench_stage(
+            "write_output", [lambda: write_output(rows, template, fmt)], len(rows), "rows/s", repeat, warmup
+        ),
+        "end_to_end": await _bench_stage("end_to_end", [end_to_end], len(files), "files/s", repeat, warmup),
+    }
+    return {"files": len(files), "pages": page_count, "bytes": sum(len(d) for d in files), "stages": stages}
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float, min_ms: float) -> List[str]:
+    """Regressions of ``results`` against ``baseline``: latency up or throughput down by more than ``tolerance``."""
+    regressions: List[str] = []
+    print(f"\nComparison against baseline ({baseline.get('meta', {}).get('timestamp', 'unknown')}):")
+    for scenario, current in results.get("scenarios", {}).items():
+        base_scenario = baseline.get("scenarios", {}).get(scenario)
+        if base_scenario is None:
+            print(f"  {scenario}: not in baseline")
+            continue
+        for stage, stats in current["stages"].items():
+            base = base_scenario["stages"].get(stage)
+            if base is None:
+                continue
+            notes = []
+            for metric in LATENCY_METRICS:
+                old, new = base[metric], stats[metric]
+                change = (new - old) / old if old else 0.0
+                notes.append(f"{metric} {old:.2f}->{new:.2f} ({change:+.0%})")
+                # Sub-millisecond stages are too noisy for a relative threshold alone
+                if change > tolerance and new - old > min_ms:
+                    regressions.append(f"{scenario}/{stage} {metric} {old:.2f} -> {new:.2f} ms ({change:+.0%})")
+            old_tp, new_tp = base["throughput"], stats["throughput"]
+            if old_tp and new_tp < old_tp / (1 + tolerance):
+                regressions.append(f"{scenario}/{stage} throughput {old_tp:.2f} -> {new_tp:.2f} {stats['unit']}")
+            print(f"  {scenario}/{stage}: " + ", ".join(notes))
+    return regressions
+
+
+def _load_files(args: argparse.Namespace) -> List[Tuple[str, List[bytes]]]:
+    from bench.synthetic import make_pdf
+
+    scenarios: List[Tuple[str, List[bytes]]] = []
+    if not args.no_samples:
+        samples = []
+        for name in sorted(os.listdir(SAMPLES_DIR)):
+            if name.lower().endswith(".pdf"):
+                with open(os.path.join(SAMPLES_DIR, name), "rb") as f:
+                    samples.append(f.read())
+        scenarios.append(("samples", samples))
+    if args.files > 0 and args.pages > 0:
+        synthetic = [make_pdf(args.pages, seed=i) for i in range(args.files)]
+        scenarios.append((f"synthetic_{args.pages}p_x{args.files}", synthetic))
+    return scenarios
+
+
+def _configure_env(args: argparse.Namespace, output_dir: str, stub_url: Optional[str]) -> None:
+    # Measure the work itself: no result caching, no LLM spend, outputs kept out of examples/
+    os.environ["CACHE_ENABLED"] = "false"
+    os.environ["OUTPUT_DIR"] = output_dir
+    if stub_url is None:
+        os.environ["MOCK_LLM"] = "true"
+    else:
+        os.environ["MOCK_LLM"] = "false"
+        os.environ["OPENAI_BASE_URL"] = stub_url
+        os.environ["OPENAI_API_KEY"] = "stub"
+        os.environ.pop("GEMINI_API_KEY", None)
+
+
+async def _run_all(args: argparse.Namespace, template: Dict[str, Any]) -> Dict[str, Any]:
+    from app.services.llm_client import shutdown_llm_clients
+    from app.services.pdf_extractor import shutdown_process_pool
+    from app.settings import get_pdf_backend
+
+    scenarios = {}
+    try:
+        for name, files in _load_files(args):
+            scenarios[name] = await run_scenario(name, files, template, args.format, args.repeat, args.warmup)
+    finally:
+        await shutdown_llm_clients()
+        shutdown_process_pool()
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "pdf_backend": get_pdf_backend(),
+            "llm": args.llm,
+            "template": template.get("templateId"),
+            "format": args.format,
+            "repeat": args.repeat,
+            "peak_rss_mb": _peak_rss_mb(),
+        },
+        "scenarios": scenarios,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the PDF extraction pipeline")
+    parser.add_argument("--pages", type=int, default=60, help="pages per synthetic PDF (0 to skip)")
+    parser.add_argument("--files", type=int, default=4, help="number of synthetic PDFs (0 to skip)")
+    parser.add_argument("--no-samples", action="store_true", help="skip examples/sample_pdfs")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--template", default=None, help="template id (default: built-in bench template)")
+    parser.add_argument("--format", default="xlsx", help="output format for write_output")
+    parser.add_argument("--llm", choices=["mock", "stub"], default="mock", help="structured extraction backend")
+    parser.add_argument("--output", default=None, help="results JSON path (default: bench/results/)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown")
+    parser.add_argument("--min-ms", type=float, default=1.0, help="ignore latency changes smaller than this")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    add_stub_arguments(parser, prefix="stub-")
+    args = parser.parse_args(argv)
+
+    server, stub_url = None, None
+    if args.llm == "stub":
+        server, stub_url = start_in_thread(config_from_args(args, prefix="stub-"))
+    try:
+        with tempfile.TemporaryDirectory(prefix="bench_output_") as output_dir:
+            _configure_env(args, output_dir, stub_url)
+            if args.template:
+                from app.services.templates import load_template
+
+                template = load_template(args.template)
+            else:
+                template = BENCH_TEMPLATE
+            results = asyncio.run(_run_all(args, template))
+        if server is not None:
+            results["meta"]["stub"] = {**server.config.app.state.stub.stats, "config": asdict(server.config.app.state.stub.config)}
+    finally:
+        if server is not None:
+            stop(server)
+
+    output = args.output or os.path.join(DEFAULT_RESULTS_DIR, f"bench_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    regressions: List[str] = []
+    if not os.path.exists(args.baseline) and not args.save_baseline:
+        print(f"\nNo baseline at {args.baseline}; record one with --save-baseline")
+        if args.fail_on_regression:
+            return 1
+    elif not args.save_baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.min_ms)
+        if regressions:
+            print("\nRegressions:")
+            for line in regressions:
+                print(f"  {line}")
+        else:
+            print("\nNo regressions beyond tolerance.")
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,263 @@
+"""Local OpenAI-compatible Chat Completions stub for load and failure testing.
+
+Answers ``POST /v1/chat/completions`` with deterministic JSON shaped like the template in the
+prompt (the same prompt always gets the same answer; batched multi-document prompts get a JSON
+array with one object per document), after a configurable latency, and injects
+server errors, 429s (with ``Retry-After``) and malformed JSON at configurable rates.
+
+    python -m bench.stub_llm --port 8100 --latency-ms 400 --latency-dist lognormal --rate-429 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:8100/v1 OPENAI_API_KEY=stub uvicorn app.main:app
+
+``GET /stats`` reports request counts and peak concurrency; ``POST /stats/reset`` clears them.
+"""
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+LATENCY_DISTS = ("fixed", "uniform", "lognormal")
+
+_FIELD_LINE = re.compile(r"^- (\w+)\s*$", re.MULTILINE)
+_SHEET_FIELDS = re.compile(r"^\s*Fields: (.+)$", re.MULTILINE)
+_DOCUMENT = re.compile(r"^=== DOCUMENT (\S+) ===\n(.*?)\n=== END DOCUMENT \1 ===$", re.MULTILINE | re.DOTALL)
+
+
+@dataclass
+class StubConfig:
+    latency_ms: float = 200.0
+    latency_dist: str = "lognormal"
+    # uniform: +/- jitter_ms around latency_ms; lognormal: sigma of the log (latency_ms is the median)
+    jitter_ms: float = 100.0
+    sigma: float = 0.5
+    error_rate: float = 0.0
+    rate_429: float = 0.0
+    retry_after_s: float = 1.0
+    malformed_rate: float = 0.0
+    # Requests beyond this many in flight get a 429, like a provider concurrency limit (0: unlimited)
+    max_concurrency: int = 0
+    model: str = "stub-1"
+    seed: int = 0
+
+
+def prompt_fields(prompt: str) -> List[str]:
+    """Field keys listed in a prompt from llm_extract._build_prompt or batching.build_batch_prompt."""
+    header = re.split(r"PDF Text:|Documents:", prompt, maxsplit=1)[0]
+    keys = _FIELD_LINE.findall(header)
+    for line in _SHEET_FIELDS.findall(header):
+        keys.extend(k.strip() for k in line.split(",") if k.strip())
+    return list(dict.fromkeys(keys))
+
+
+def _fake_value(key: str, digest: bytes) -> Any:
+    n = int.from_bytes(digest[:4], "big")
+    lowered = key.lower()
+    if "date" in lowered:
+        return f"2025-{n % 12 + 1:02d}-{n % 28 + 1:02d}"
+    if "email" in lowered:
+        return f"contact{n % 1000}@example.com"
+    if "currency" in lowered:
+        return ("USD", "EUR", "GBP")[n % 3]
+    if any(word in lowered for word in ("amount", "commitment", "value", "nav", "size", "cost")):
+        return n % 100_000_000
+    return f"{key.replace('_', ' ').title()} {digest.hex()[:6]}"
+
+
+def _fake_object(keys: List[str], seed: str) -> Dict[str, Any]:
+    result: Dict[str, Any] = {}
+    for key in keys:
+        digest = hashlib.sha256(f"{key}\0{seed}".encode("utf-8")).digest()
+        result[key] = _fake_value(key, digest)
+    return result
+
+
+def fake_completion(prompt: str) -> Any:
+    """Deterministic template-shaped object for ``prompt``; a list of them for a batched prompt."""
+    keys = prompt_fields(prompt)
+    documents = _DOCUMENT.findall(prompt)
+    if documents:
+        return [{"document_id": doc_id, **_fake_object(keys, text)} for doc_id, text in documents]
+    return _fake_object(keys, prompt)
+
+
+class StubState:
+    def __init__(self, config: StubConfig):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.in_flight = 0
+        self.reset()
+
+    def reset(self) -> None:
+        self.stats = {"requests": 0, "ok": 0, "errors": 0, "rate_limited": 0, "malformed": 0, "peak_in_flight": 0}
+
+    def latency_s(self) -> float:
+        c = self.config
+        if c.latency_dist == "uniform":
+            ms = self.rng.uniform(c.latency_ms - c.jitter_ms, c.latency_ms + c.jitter_ms)
+        elif c.latency_dist == "lognormal":
+            ms = self.rng.lognormvariate(0.0, c.sigma) * c.latency_ms
+        else:
+            ms = c.latency_ms
+        return max(0.0, ms) / 1000
+
+    def fault(self) -> Optional[str]:
+        c = self.config
+        roll = self.rng.random()
+        if roll < c.rate_429:
+            return "429"
+        if roll < c.rate_429 + c.error_rate:
+            return "error"
+        if roll < c.rate_429 + c.error_rate + c.malformed_rate:
+            return "malformed"
+        return None
+
+
+def _completion_body(model: str, content: str, prompt_chars: int) -> Dict[str, Any]:
+    prompt_tokens, completion_tokens = prompt_chars // 4, len(content) // 4
+    return {
+        "id": f"chatcmpl-stub-{hashlib.sha1(content.encode('utf-8')).hexdigest()[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def _error(status: int, message: str, kind: str, headers: Optional[Dict[str, str]] = None) -> JSONResponse:
+    return JSONResponse({"error": {"message": message, "type": kind}}, status_code=status, headers=headers)
+
+
+def create_app(config: Optional[StubConfig] = None) -> FastAPI:
+    state = StubState(config or StubConfig())
+    app = FastAPI(title="Stub LLM")
+    app.state.stub = state
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        messages = body.get("messages") or []
+        prompt = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+        stats = state.stats
+        stats["requests"] += 1
+
+        c = state.config
+        if c.max_concurrency and state.in_flight >= c.max_concurrency:
+            stats["rate_limited"] += 1
+            return _error(429, "Too many concurrent requests", "rate_limit_exceeded", {"Retry-After": str(c.retry_after_s)})
+        fault = state.fault()
+        if fault == "429":
+            stats["rate_limited"] += 1
+            return _error(429, "Rate limit reached", "rate_limit_exceeded", {"Retry-After": str(c.retry_after_s)})
+
+        state.in_flight += 1
+        stats["peak_in_flight"] = max(stats["peak_in_flight"], state.in_flight)
+        try:
+            await asyncio.sleep(state.latency_s())
+        finally:
+            state.in_flight -= 1
+
+        if fault == "error":
+            stats["errors"] += 1
+            return _error(503, "The server is overloaded", "server_error")
+        content = json.dumps(fake_completion(prompt))
+        if fault == "malformed":
+            stats["malformed"] += 1
+            content = content[: max(1, len(content) // 2)]  # truncated mid-object
+        else:
+            stats["ok"] += 1
+        return _completion_body(body.get("model") or c.model, content, len(prompt))
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": state.config.model, "object": "model", "owned_by": "stub"}]}
+
+    @app.get("/stats")
+    async def stats():
+        return {**state.stats, "in_flight": state.in_flight, "config": asdict(state.config)}
+
+    @app.post("/stats/reset")
+    async def reset_stats():
+        state.reset()
+        return {"ok": True}
+
+    return app
+
+
+def start_in_thread(config: Optional[StubConfig] = None, host: str = "127.0.0.1", port: int = 0) -> Tuple[Any, str]:
+    """Serve the stub from a background thread; returns (server, base_url). Stop with ``stop(server)``."""
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(create_app(config), host=host, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="stub-llm", daemon=True)
+    thread.start()
+    server._stub_thread = thread  # type: ignore[attr-defined]
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if not thread.is_alive() or time.monotonic() > deadline:
+            raise RuntimeError("stub LLM server failed to start")
+        time.sleep(0.01)
+    bound_port = server.servers[0].sockets[0].getsockname()[1]
+    return server, f"http://{host}:{bound_port}/v1"
+
+
+def stop(server: Any) -> None:
+    server.should_exit = True
+    server._stub_thread.join(timeout=10)
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser, prefix: str = "") -> None:
+    defaults = StubConfig()
+    parser.add_argument(f"--{prefix}latency-ms", type=float, default=defaults.latency_ms)
+    parser.add_argument(f"--{prefix}latency-dist", choices=LATENCY_DISTS, default=defaults.latency_dist)
+    parser.add_argument(f"--{prefix}jitter-ms", type=float, default=defaults.jitter_ms)
+    parser.add_argument(f"--{prefix}sigma", type=float, default=defaults.sigma)
+    parser.add_argument(f"--{prefix}error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument(f"--{prefix}rate-429", type=float, default=defaults.rate_429)
+    parser.add_argument(f"--{prefix}retry-after-s", type=float, default=defaults.retry_after_s)
+    parser.add_argument(f"--{prefix}malformed-rate", type=float, default=defaults.malformed_rate)
+    parser.add_argument(f"--{prefix}max-concurrency", type=int, default=defaults.max_concurrency)
+    parser.add_argument(f"--{prefix}seed", type=int, default=defaults.seed)
+
+
+def config_from_args(args: argparse.Namespace, prefix: str = "") -> StubConfig:
+    attr = prefix.replace("-", "_")
+    return StubConfig(
+        latency_ms=getattr(args, f"{attr}latency_ms"),
+        latency_dist=getattr(args, f"{attr}latency_dist"),
+        jitter_ms=getattr(args, f"{attr}jitter_ms"),
+        sigma=getattr(args, f"{attr}sigma"),
+        error_rate=getattr(args, f"{attr}error_rate"),
+        rate_429=getattr(args, f"{attr}rate_429"),
+        retry_after_s=getattr(args, f"{attr}retry_after_s"),
+        malformed_rate=getattr(args, f"{attr}malformed_rate"),
+        max_concurrency=getattr(args, f"{attr}max_concurrency"),
+        seed=getattr(args, f"{attr}seed"),
+    )
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(config_from_args(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Synthetic fund-report PDFs for scaling the benchmark past the two bundled samples."""
+from typing import List
+import random
+
+import fitz  # PyMuPDF
+
+FUNDS = ["Horizon Growth Fund III", "Linolex Fund LP", "Northgate Capital Partners Fund II", "Bluewater Credit Fund"]
+MANAGERS = ["Horizon Capital Management LLC", "Linolex Advisors", "Northgate GP Ltd", "Bluewater Investment Manager"]
+COMPANIES = ["Acme Robotics", "Brightline Health", "Cobalt Logistics", "Delta Foods", "Everest Software", "Fjord Energy"]
+SECTIONS = ["Capital Account Statement", "Schedule of Investments", "Portfolio Company Update", "Notes to Financial Statements"]
+
+
+def _page_lines(rng: random.Random, fund: str, manager: str, page_no: int) -> List[str]:
+    lines = [
+        f"{fund} - Quarterly Report",
+        f"{rng.choice(SECTIONS)} (page {page_no + 1})",
+        f"Manager: {manager}",
+        f"Report Date: 2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "Currency: USD",
+        "",
+    ]
+    for company in rng.sample(COMPANIES, 4):
+        cost = rng.randint(1_000, 90_000) * 1_000
+        value = int(cost * rng.uniform(0.6, 2.4))
+        lines.append(f"{company:<22} Cost ${cost:,}   Fair Value ${value:,}   MOIC {value / cost:.2f}x")
+    lines.append("")
+    lines.append(f"Total Commitment: ${rng.randint(10, 500) * 1_000_000:,}")
+    lines.append(f"Net Asset Value: ${rng.randint(5, 400) * 1_000_000:,}   Net IRR {rng.uniform(-5, 30):.1f}%")
+    lines.append("Investor: Limited Partner Pension Plan")
+    lines.append("Contact: investor.relations@example.com")
+    # Filler prose so page text is closer to a real report's size
+    for _ in range(12):
+        lines.append(" ".join(rng.choice(["capital", "distribution", "valuation", "portfolio", "fund", "quarter", "market"]) for _ in range(14)))
+    return lines
+
+
+def make_pdf(pages: int, seed: int = 0) -> bytes:
+    """A deterministic ``pages``-page PDF; the same seed always gives the same text."""
+    rng = random.Random(seed)
+    fund = FUNDS[seed % len(FUNDS)]
+    manager = MANAGERS[seed % len(MANAGERS)]
+    doc = fitz.open()
+    try:
+        for page_no in range(pages):
+            page = doc.new_page()
+            page.insert_text((48, 60), "\n".join(_page_lines(rng, fund, manager, page_no)), fontsize=9)
+        return doc.tobytes()
+    finally:
+        doc.close()
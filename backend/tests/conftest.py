@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+
+# Keep caches, artifacts and spooled uploads of the test run out of the working tree
+_tmp = tempfile.mkdtemp(prefix="pdf_extraction_tests_")
+for name in ("CACHE_DIR", "DATA_DIR", "OUTPUT_DIR", "UPLOAD_SPOOL_DIR"):
+    os.environ.setdefault(name, os.path.join(_tmp, name.lower()))
+os.environ.setdefault("MOCK_LLM", "true")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,117 @@
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routes import download as download_route
+from app.services.artifact_store import ArtifactStore
+
+CONTENT = bytes(range(256)) * 4
+
+
+def _store(tmp_path, **kwargs):
+    root = tmp_path / "artifacts"
+    root.mkdir(exist_ok=True)
+    return ArtifactStore(str(root), kwargs.pop("memory_max_bytes", 10_000), kwargs.pop("ttl_seconds", 3600), **kwargs)
+
+
+def test_put_keeps_new_artifacts_in_memory(tmp_path):
+    store = _store(tmp_path)
+    store.put("a.xlsx", CONTENT)
+    artifact = store.get("a.xlsx")
+    assert artifact.content == CONTENT and artifact.path is None
+    assert store.stats()["disk_items"] == 0
+
+
+def test_memory_eviction_spills_to_disk(tmp_path):
+    store = _store(tmp_path, memory_max_bytes=1500, disk_max_bytes=100_000)
+    store.put("a.csv", b"a" * 1000)
+    store.put("b.csv", b"b" * 1000)
+    spilled = store.get("a.csv")
+    assert spilled.path is not None and os.path.exists(spilled.path)
+    assert store.get("b.csv").content == b"b" * 1000
+
+
+def test_disk_cap_drops_oldest_blob_and_its_aliases(tmp_path):
+    store = _store(tmp_path, memory_max_bytes=500, disk_max_bytes=2000)
+    for name in ("a", "b", "c"):
+        store.put(f"{name}.csv", name.encode() * 1000)
+    assert store.get("a.csv") is None
+    assert store.get("c.csv") is not None
+    assert store.stats()["disk_bytes"] <= 2000
+
+
+def test_identical_content_is_stored_once(tmp_path):
+    store = _store(tmp_path)
+    first = store.put("one.csv", CONTENT)
+    second = store.put("two.csv", CONTENT)
+    assert first.digest == second.digest
+    assert store.stats()["memory_items"] == 1
+
+
+def test_restart_reindexes_disk_blobs(tmp_path):
+    store = _store(tmp_path, memory_max_bytes=0, disk_max_bytes=100_000)
+    store.put("a.csv", CONTENT)
+    reopened = _store(tmp_path, memory_max_bytes=0, disk_max_bytes=100_000)
+    assert reopened.get("a.csv") is not None
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    store = _store(tmp_path)
+    store.put("report.csv", CONTENT)
+    monkeypatch.setattr(download_route, "get_artifact_store", lambda: store)
+    app = FastAPI()
+    app.include_router(download_route.router, prefix="/api")
+    return TestClient(app)
+
+
+def test_download_serves_etag_and_not_modified(client):
+    r = client.get("/api/download/report.csv")
+    assert r.status_code == 200 and r.content == CONTENT
+    etag = r.headers["etag"]
+    assert client.get("/api/download/report.csv", headers={"If-None-Match": etag}).status_code == 304
+
+
+@pytest.mark.parametrize(
+    "header, start, end",
+    [("bytes=0-9", 0, 9), ("bytes=1000-", 1000, 1023), ("bytes=-4", 1020, 1023), ("bytes=1020-5000", 1020, 1023)],
+)
+def test_download_serves_byte_ranges(client, header, start, end):
+    r = client.get("/api/download/report.csv", headers={"Range": header})
+    assert r.status_code == 206
+    assert r.content == CONTENT[start : end + 1]
+    assert r.headers["content-range"] == f"bytes {start}-{end}/{len(CONTENT)}"
+
+
+def test_download_rejects_unsatisfiable_range(client):
+    r = client.get("/api/download/report.csv", headers={"Range": "bytes=5000-"})
+    assert r.status_code == 416
+    assert r.headers["content-range"] == f"bytes */{len(CONTENT)}"
+
+
+def test_download_ignores_range_for_stale_if_range(client):
+    r = client.get("/api/download/report.csv", headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert r.status_code == 200 and r.content == CONTENT
+
+
+def test_download_unknown_file_is_404(client):
+    assert client.get("/api/download/missing.csv").status_code == 404
+
+
+def test_download_directory_in_output_dir_is_404(client, tmp_path, monkeypatch):
+    (tmp_path / "out" / ".artifacts").mkdir(parents=True)
+    monkeypatch.setattr(download_route, "get_output_dir", lambda: str(tmp_path / "out"))
+    assert client.get("/api/download/.artifacts").status_code == 404
+
+
+def test_writers_leave_the_output_dir_alone(tmp_path, monkeypatch):
+    from app.services.output_formats import write_output
+
+    monkeypatch.setenv("OUTPUT_DIR", str(tmp_path / "out"))
+    template = {"templateId": "t", "fields": [{"key": "a", "header": "A"}]}
+    for fmt in ("xlsx", "csv"):
+        filename, content = write_output([{"a": 1}], template, fmt)
+        assert filename.endswith(f".{fmt}") and content
+    assert not (tmp_path / "out").exists() or os.listdir(tmp_path / "out") == []
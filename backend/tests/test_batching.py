@@ -0,0 +1,76 @@
+import asyncio
+import json
+import re
+
+from app.services.batching import DOC_ID_KEY, DocumentBatcher, _Pending, validate_batch
+
+TEMPLATE = {"templateId": "notice", "fields": [{"key": "fund_name", "header": "Fund Name"}, {"key": "call_amount", "header": "Call Amount"}]}
+DOCS = ["Capital call notice\nFund: Alpha Fund I\nAmount 100", "Capital call notice\nFund: Beta Fund II\nAmount 200"]
+
+
+class FakeLLM:
+    """Answers a batched prompt with one object per document, read back from its text."""
+
+    def __init__(self):
+        self.prompts = []
+
+    async def __call__(self, prompt):
+        self.prompts.append(prompt)
+        answers = []
+        for doc_id, text in re.findall(r"=== DOCUMENT (\w+) ===\n(.*?)\n=== END DOCUMENT", prompt, re.S):
+            fund = re.search(r"Fund: (.+)", text).group(1)
+            answers.append({DOC_ID_KEY: doc_id, "fund_name": fund, "call_amount": ""})
+        return json.dumps(answers)
+
+
+async def _extract_all(batcher, texts, call):
+    async def one(text):
+        with batcher.in_flight():
+            return await batcher.extract(text, TEMPLATE, call)
+
+    return await asyncio.wait_for(asyncio.gather(*(one(t) for t in texts)), timeout=5)
+
+
+def test_documents_in_flight_share_one_prompt_without_the_window():
+    llm = FakeLLM()
+    # A window far beyond the timeout: the batch must flush once both documents joined
+    rows = asyncio.run(_extract_all(DocumentBatcher(8, 60.0, 8000), DOCS, llm))
+    assert len(llm.prompts) == 1
+    assert [r["fund_name"] for r in rows] == ["Alpha Fund I", "Beta Fund II"]
+
+
+def test_lone_document_is_not_held_back():
+    llm = FakeLLM()
+    rows = asyncio.run(_extract_all(DocumentBatcher(8, 60.0, 8000), DOCS[:1], llm))
+    # Nothing to share the prompt with: the caller prompts it on its own
+    assert rows == [None] and llm.prompts == []
+
+
+def test_full_batch_is_prompted_and_next_document_starts_another():
+    llm = FakeLLM()
+    texts = DOCS + ["Capital call notice\nFund: Gamma Fund III\nAmount 300"]
+    rows = asyncio.run(_extract_all(DocumentBatcher(2, 0.05, 8000), texts, llm))
+    assert len(llm.prompts) == 1
+    assert [r and r["fund_name"] for r in rows] == ["Alpha Fund I", "Beta Fund II", None]
+
+
+def test_failed_call_leaves_every_document_to_its_own_prompt():
+    async def failing(prompt):
+        raise RuntimeError("rate limited")
+
+    rows = asyncio.run(_extract_all(DocumentBatcher(8, 60.0, 8000), DOCS, failing))
+    assert rows == [None, None]
+
+
+def test_answer_found_in_another_document_is_rejected():
+    loop = asyncio.new_event_loop()
+    try:
+        docs = [_Pending(f"D{i + 1}", text, loop.create_future()) for i, text in enumerate(DOCS)]
+    finally:
+        loop.close()
+    answers = [
+        {DOC_ID_KEY: "D1", "fund_name": "Beta Fund II"},  # the other document's value
+        {DOC_ID_KEY: "D2", "fund_name": "Beta Fund II"},
+        {DOC_ID_KEY: "D9", "fund_name": "Alpha Fund I"},  # not in the batch
+    ]
+    assert validate_batch(answers, docs) == {"D2": {"fund_name": "Beta Fund II"}}
@@ -0,0 +1,65 @@
+import asyncio
+
+from app.services.cache import DiskCache, LRUCache, TieredCache
+
+
+def _keys(disk):
+    return sorted(r[0] for r in disk._conn.execute("SELECT key FROM entries"))
+
+
+def test_disk_cache_evicts_least_recently_used(tmp_path):
+    disk = DiskCache(str(tmp_path / "cache.sqlite3"), max_bytes=300)
+    for i in range(3):
+        disk.set(f"k{i}", b"x" * 100)
+    # A read is only buffered, but still protects the entry from the next eviction
+    assert disk.get("k0") == b"x" * 100
+    disk.set("k3", b"y" * 100)
+    assert _keys(disk) == ["k0", "k2", "k3"]
+    assert disk.size_bytes() == 300
+
+
+def test_disk_cache_tracks_size_on_replace_and_clear(tmp_path):
+    disk = DiskCache(str(tmp_path / "cache.sqlite3"), max_bytes=1000)
+    disk.set("a", b"x" * 100)
+    disk.set("a", b"x" * 40)
+    assert disk.size_bytes() == 40
+    disk.set("too-big", b"x" * 1001)
+    assert disk.get("too-big") is None
+    disk.clear()
+    assert disk.size_bytes() == 0
+
+
+def test_disk_cache_size_survives_reopen(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    DiskCache(path, max_bytes=1000).set("a", b"x" * 123)
+    assert DiskCache(path, max_bytes=1000).size_bytes() == 123
+
+
+def test_memory_lru_evicts_oldest():
+    lru = LRUCache(2)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    lru.get("a")
+    lru.set("c", 3)
+    assert lru.get("b") is None
+    assert lru.get("a") == 1 and lru.get("c") == 3
+
+
+def test_tiered_cache_returns_copies(tmp_path):
+    cache = TieredCache("rows", LRUCache(4), DiskCache(str(tmp_path / "cache.sqlite3"), 10_000))
+    rows = [{"fund_name": "Alpha"}]
+    cache.set("k", rows)
+    rows[0]["fund_name"] = "changed after set"
+    hit = cache.get("k")
+    hit[0]["fund_name"] = "changed after get"
+    assert cache.get("k") == [{"fund_name": "Alpha"}]
+
+
+def test_tiered_cache_async_reads_disk_tier(tmp_path):
+    disk = DiskCache(str(tmp_path / "cache.sqlite3"), 10_000)
+    TieredCache("pages", LRUCache(4), disk).set("k", ["page 1"])
+    # A fresh memory tier, as after a restart
+    cache = TieredCache("pages", LRUCache(4), disk)
+    assert asyncio.run(cache.aget("k")) == ["page 1"]
+    assert asyncio.run(cache.aget("missing")) is None
+    assert cache.stats["disk_hits"] == 1 and cache.stats["misses"] == 1
@@ -0,0 +1,62 @@
+from app.services.chunking import CHARS_PER_TOKEN, chunk_pages, reduce_chunk_results
+
+
+def _template(**merge):
+    fields = [{"key": k, "header": k} for k in ("fund_name", "nav", "notes", "status")]
+    for f in fields:
+        if f["key"] in merge:
+            f["merge"] = merge[f["key"]]
+    return {"templateId": "chunk_test", "fields": fields}
+
+
+def test_pages_pack_into_chunks_on_page_boundaries():
+    pages = ["a" * 40, "b" * 40, "c" * 40, "   ", "d" * 40]
+    chunks = chunk_pages(pages, max_tokens=100 // CHARS_PER_TOKEN, max_chunks=8)
+    assert [(c.first_page, c.last_page) for c in chunks] == [(0, 1), (2, 4)]
+    assert chunks[0].text == "a" * 40 + "\n" + "b" * 40
+    # The blank page is skipped rather than joined in
+    assert chunks[1].text == "c" * 40 + "\n" + "d" * 40
+
+
+def test_oversized_page_is_split_on_lines():
+    page = "\n".join(["x" * 30] * 4)
+    chunks = chunk_pages([page], max_tokens=64 // CHARS_PER_TOKEN, max_chunks=8)
+    assert len(chunks) > 1
+    assert all(len(c.text) <= 64 for c in chunks)
+    assert all(c.first_page == c.last_page == 0 for c in chunks)
+    assert "".join(c.text for c in chunks).replace("\n", "") == "x" * 120
+
+
+def test_only_max_chunks_are_kept():
+    chunks = chunk_pages(["p" * 40] * 5, max_tokens=40 // CHARS_PER_TOKEN, max_chunks=2)
+    assert [c.index for c in chunks] == [0, 1]
+
+
+def test_first_non_empty_value_wins_by_default():
+    results = [{"fund_name": ""}, {"fund_name": "Alpha Fund"}, {"fund_name": "Alpha Fund II"}]
+    merged, conflicts = reduce_chunk_results(results, _template())
+    assert merged["fund_name"] == "Alpha Fund"
+    assert conflicts["fund_name"] == ["Alpha Fund", "Alpha Fund II"]
+    assert merged["nav"] == "" and "nav" not in conflicts
+
+
+def test_field_merge_rules():
+    results = [
+        {"nav": "1,200", "notes": "short", "status": "draft"},
+        {"nav": "(5,000)", "notes": "a much longer note", "status": "final"},
+        {"nav": "950", "notes": None, "status": "  "},
+    ]
+    merged, _ = reduce_chunk_results(results, _template(nav="max", notes="longest", status="last"))
+    assert merged["nav"] == "1,200"
+    assert merged["notes"] == "a much longer note"
+    assert merged["status"] == "final"
+
+
+def test_max_rule_falls_back_to_first_when_nothing_is_numeric():
+    merged, _ = reduce_chunk_results([{"nav": "n/a"}, {"nav": "unknown"}], _template(nav="max"))
+    assert merged["nav"] == "n/a"
+
+
+def test_non_dict_chunk_results_are_ignored():
+    merged, _ = reduce_chunk_results([None, "oops", {"fund_name": "Alpha"}], _template())
+    assert merged["fund_name"] == "Alpha"
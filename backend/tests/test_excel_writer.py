@@ -0,0 +1,61 @@
+import io
+
+from openpyxl import load_workbook
+
+from app.services.excel_writer import TITLE, sheet_rows, write_excel
+
+FLAT = {
+    "templateId": "flat",
+    "fields": [
+        {"key": "fund_name", "header": "Fund Name"},
+        {"key": "report_date", "header": "Report Date"},
+        {"key": "nav", "header": "NAV"},
+    ],
+}
+
+MULTI = {
+    "templateId": "multi",
+    "multiSheet": True,
+    "sheets": [
+        {"name": "Fund", "fields": [{"key": "fund_name", "header": "Fund Name"}]},
+        {"name": "Holdings", "fields": [{"key": "company", "header": "Company"}, {"key": "cost", "header": "Cost"}]},
+    ],
+}
+
+
+def _load(content):
+    return load_workbook(io.BytesIO(content))
+
+
+def test_flat_workbook_has_a_merged_title_over_the_headers():
+    filename, content = write_excel([{"fund_name": "Alpha", "nav": 12}, {"fund_name": "Beta"}], FLAT)
+    assert filename.startswith("extracted_data_flat_") and filename.endswith(".xlsx")
+    ws = _load(content)["Sheet1"]
+    assert [str(r) for r in ws.merged_cells.ranges] == ["A1:C1"]
+    assert ws["A1"].value == TITLE and ws["A1"].font.bold
+    assert [list(r) for r in ws.iter_rows(min_row=2, values_only=True)] == [
+        ["Fund Name", "Report Date", "NAV"],
+        ["Alpha", None, 12],
+        ["Beta", None, None],
+    ]
+
+
+def test_single_column_title_is_not_merged():
+    template = {"templateId": "one", "fields": [{"key": "fund_name", "header": "Fund Name"}]}
+    ws = _load(write_excel([], template)[1])["Sheet1"]
+    assert not ws.merged_cells.ranges
+    assert [c.value for c in ws[2]] == ["Fund Name"]
+
+
+def test_multi_sheet_rows_go_to_the_sheets_whose_fields_they_carry():
+    rows = [{"fund_name": "Alpha"}, {"company": "Acme", "cost": 100}, {"company": "Beta", "cost": 50}]
+    wb = _load(write_excel(rows, MULTI)[1])
+    assert wb.sheetnames == ["Fund", "Holdings"]
+    assert [list(r) for r in wb["Fund"].iter_rows(values_only=True)] == [["Fund Name"], ["Alpha"]]
+    assert [list(r) for r in wb["Holdings"].iter_rows(values_only=True)] == [["Company", "Cost"], ["Acme", 100], ["Beta", 50]]
+
+
+def test_sheet_rows_keeps_rows_with_any_of_the_fields():
+    rows = [{"a": 1}, {"b": ""}, {"c": 3}]
+    assert sheet_rows(rows, ["a", "b"]) == [{"a": 1}, {"b": ""}]
+    assert sheet_rows(rows, ["d"]) == []
@@ -0,0 +1,23 @@
+import json
+import os
+import subprocess
+import sys
+
+from bench import import_budget
+
+
+def test_serverless_entry_point_stays_within_import_budget():
+    # api.index runs warm_up() at import, so its cost is inside the measured time
+    best, failures = import_budget.check("api.index", runs=3, budget_s=float(os.getenv("IMPORT_BUDGET_S", "2.0")))
+    assert failures == [], f"best {best * 1000:.0f} ms: {failures}"
+
+
+def test_warm_up_runs_during_the_measured_import():
+    code = (
+        "import json, api.index\n"
+        "from app.services import templates\n"
+        "print(json.dumps([list(api.index.WARM_TEMPLATES), sorted(templates._registry)]))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], cwd=import_budget.BACKEND_DIR, capture_output=True, text=True, check=True)
+    expected, warmed = json.loads(out.stdout.strip().splitlines()[-1])
+    assert expected and set(expected) <= set(warmed)
@@ -0,0 +1,39 @@
+from app.services.lineage import Lineage, lineage_key, merge_rows, page_fingerprints
+
+FIELDS = ["fund_name", "report_date", "nav"]
+OLD_PAGES = ["Alpha Fund II quarterly report", "Report date 2025-06-30", "NAV 1,000,000"]
+
+
+def _lineage(row, field_pages):
+    return Lineage("old", "alpha.pdf", "filename", 1.0, set(page_fingerprints(OLD_PAGES)), row, field_pages)
+
+
+def _located():
+    fps = page_fingerprints(OLD_PAGES)
+    return {"fund_name": [fps[0]], "report_date": [fps[1]], "nav": [fps[2]]}
+
+
+def test_lineage_key_strips_version_decorations():
+    assert lineage_key("reports/Fund_Q3_v2 (1).pdf") == lineage_key("Fund_Q3.pdf") == "fund_q3"
+
+
+def test_fresh_values_refresh_and_unchanged_pages_are_reused():
+    old_row = {"fund_name": "Alpha Fund II", "report_date": "2025-06-30", "nav": 1000000}
+    pages = [OLD_PAGES[0], "Report date 2025-09-30", OLD_PAGES[2]]
+    row, refreshed, reused = merge_rows(_lineage(old_row, _located()), {"report_date": "2025-09-30"}, pages, page_fingerprints(pages), FIELDS)
+    assert row == {"fund_name": "Alpha Fund II", "report_date": "2025-09-30", "nav": 1000000}
+    assert refreshed == ["report_date"] and reused == ["fund_name", "nav"]
+
+
+def test_value_gone_from_changed_page_is_cleared():
+    old_row = {"fund_name": "Alpha Fund II", "report_date": "2025-06-30", "nav": 1000000}
+    pages = [OLD_PAGES[0], OLD_PAGES[1], "NAV not reported this quarter"]
+    row, refreshed, _ = merge_rows(_lineage(old_row, _located()), {}, pages, page_fingerprints(pages), FIELDS)
+    assert row["nav"] == "" and refreshed == ["nav"]
+
+
+def test_value_moved_to_another_page_is_kept():
+    old_row = {"fund_name": "Alpha Fund II", "report_date": "2025-06-30", "nav": 1000000}
+    pages = [OLD_PAGES[0] + " NAV 1,000,000", OLD_PAGES[1], "Appendix"]
+    row, _, reused = merge_rows(_lineage(old_row, _located()), {}, pages, page_fingerprints(pages), FIELDS)
+    assert row["nav"] == 1000000 and "nav" in reused
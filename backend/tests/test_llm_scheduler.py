@@ -0,0 +1,159 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services import llm_scheduler
+from app.services.llm_scheduler import MIN_RATE_FRACTION, RECOVERY_STEP, LLMScheduler, TokenBucket, llm_priority
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class _Response:
+    def __init__(self, headers):
+        self.headers = headers
+
+
+class _ProviderError(Exception):
+    def __init__(self, code, retry_after=None):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+        self.response = _Response({"retry-after": retry_after} if retry_after is not None else {})
+
+
+def _scheduler(rpm=0, tpm=0, max_attempts=3):
+    return LLMScheduler("test", rpm=rpm, tpm=tpm, max_attempts=max_attempts, backoff_base=0.001, backoff_max=0.002)
+
+
+def test_token_bucket_refills_at_the_admitted_rate(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(llm_scheduler.time, "monotonic", clock)
+    bucket = TokenBucket(60)
+    assert bucket.delay(60) == 0.0
+    bucket.take(60)
+    assert bucket.delay(1) == pytest.approx(1.0)
+    clock.now += 0.5
+    assert bucket.delay(1) == pytest.approx(0.5)
+    # Halving the rate doubles the wait for the rest
+    bucket.rate_fraction = 0.5
+    assert bucket.delay(1) == pytest.approx(1.0)
+    # Requests bigger than the burst wait for a full bucket rather than forever
+    clock.now += 1000
+    assert bucket.delay(500) == 0.0
+
+
+def test_zero_limit_never_blocks():
+    bucket = TokenBucket(0)
+    bucket.take(10**6)
+    assert bucket.delay(10**6) == 0.0
+
+
+def test_interactive_calls_are_admitted_before_queued_batch_calls():
+    async def run():
+        scheduler = _scheduler()
+        order = []
+
+        async def call(prompt):
+            order.append(prompt)
+            return prompt
+
+        # Hold the provider paused so both calls queue up before either is admitted
+        scheduler._cooldown_until = time.monotonic() + 0.05
+        with llm_priority("batch"):
+            batch = asyncio.ensure_future(scheduler.submit("batch", call))
+        await asyncio.sleep(0)
+        interactive = asyncio.ensure_future(scheduler.submit("interactive", call))
+        await asyncio.gather(batch, interactive)
+        return order
+
+    assert asyncio.run(run()) == ["interactive", "batch"]
+
+
+def test_retry_after_sets_the_minimum_backoff():
+    scheduler = _scheduler()
+    assert scheduler._backoff(0, _ProviderError(429, "2")) >= 2.0
+    assert scheduler._backoff(0, _ProviderError(429)) <= 0.002
+
+
+def test_rate_limit_halves_the_rate_and_success_recovers_it():
+    async def run():
+        scheduler = _scheduler()
+        attempts = []
+
+        async def call(prompt):
+            attempts.append(prompt)
+            if len(attempts) == 1:
+                raise _ProviderError(429, "0")
+            return "ok"
+
+        result = await scheduler.submit("p", call)
+        return scheduler, result, attempts
+
+    scheduler, result, attempts = asyncio.run(run())
+    assert result == "ok" and len(attempts) == 2
+    assert scheduler.stats["rate_limited"] == 1 and scheduler.stats["retries"] == 1
+    assert scheduler.requests.rate_fraction == pytest.approx(0.5 + RECOVERY_STEP)
+    assert scheduler.tokens.rate_fraction == pytest.approx(0.5 + RECOVERY_STEP)
+
+
+def test_rate_fraction_is_floored_and_capped():
+    scheduler = _scheduler()
+    for _ in range(10):
+        scheduler._on_rate_limited(0)
+    assert scheduler.requests.rate_fraction == MIN_RATE_FRACTION
+    for _ in range(100):
+        scheduler._on_success()
+    assert scheduler.requests.rate_fraction == 1.0
+
+
+def test_non_retryable_errors_are_raised_without_retrying():
+    async def run():
+        scheduler = _scheduler()
+
+        async def call(prompt):
+            raise _ProviderError(400)
+
+        with pytest.raises(_ProviderError):
+            await scheduler.submit("p", call)
+        return scheduler
+
+    scheduler = asyncio.run(run())
+    assert scheduler.stats["calls"] == 1 and scheduler.stats["failures"] == 1
+
+
+def test_retries_stop_after_max_attempts():
+    async def run():
+        scheduler = _scheduler(max_attempts=2)
+
+        async def call(prompt):
+            raise _ProviderError(503)
+
+        with pytest.raises(_ProviderError):
+            await scheduler.submit("p", call)
+        return scheduler
+
+    assert asyncio.run(run()).stats["calls"] == 2
+
+
+def test_identical_concurrent_prompts_share_one_call():
+    async def run():
+        scheduler = _scheduler()
+        calls = []
+
+        async def call(prompt):
+            calls.append(prompt)
+            await asyncio.sleep(0.01)
+            return prompt.upper()
+
+        results = await asyncio.gather(*(scheduler.submit("same", call) for _ in range(3)))
+        return scheduler, results, calls
+
+    scheduler, results, calls = asyncio.run(run())
+    assert results == ["SAME"] * 3 and calls == ["same"]
+    assert scheduler.stats["coalesced"] == 2
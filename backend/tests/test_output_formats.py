@@ -0,0 +1,72 @@
+import csv
+import io
+import json
+import zipfile
+
+import pandas as pd
+import pytest
+
+from app.services.output_formats import media_type_for, write_output
+
+FLAT = {
+    "templateId": "flat",
+    "fields": [
+        {"key": "fund_name", "header": "Fund Name"},
+        {"key": "nav", "header": "NAV"},
+    ],
+}
+
+MULTI = {
+    "templateId": "multi",
+    "multiSheet": True,
+    "sheets": [
+        {"name": "Fund Info", "fields": [{"key": "fund_name", "header": "Fund Name"}]},
+        {"name": "Holdings", "fields": [{"key": "company", "header": "Company"}, {"key": "cost", "header": "Cost"}]},
+    ],
+}
+
+ROWS = [{"fund_name": "Alpha", "nav": 12}, {"fund_name": "Beta", "extra": "ignored"}]
+MULTI_ROWS = [{"fund_name": "Alpha"}, {"company": "Acme", "cost": 100}]
+
+
+def test_csv_columns_follow_the_template():
+    filename, content = write_output(ROWS, FLAT, "csv")
+    assert filename.endswith(".csv") and media_type_for(filename) == "text/csv"
+    assert list(csv.reader(io.StringIO(content.decode("utf-8")))) == [["fund_name", "nav"], ["Alpha", "12"], ["Beta", ""]]
+
+
+def test_ndjson_keeps_numbers_and_fills_missing_fields():
+    filename, content = write_output(ROWS, FLAT, "NDJSON")
+    assert filename.endswith(".ndjson")
+    assert [json.loads(line) for line in content.decode("utf-8").splitlines()] == [
+        {"fund_name": "Alpha", "nav": 12},
+        {"fund_name": "Beta", "nav": ""},
+    ]
+
+
+def test_parquet_stores_values_as_strings():
+    filename, content = write_output(ROWS, FLAT, "parquet")
+    assert filename.endswith(".parquet")
+    frame = pd.read_parquet(io.BytesIO(content))
+    assert frame.to_dict("records") == [{"fund_name": "Alpha", "nav": "12"}, {"fund_name": "Beta", "nav": ""}]
+
+
+def test_multi_sheet_csv_is_a_zip_of_one_file_per_sheet():
+    filename, content = write_output(MULTI_ROWS, MULTI, "csv")
+    assert filename.endswith("_csv.zip") and media_type_for(filename) == "application/zip"
+    with zipfile.ZipFile(io.BytesIO(content)) as zf:
+        assert zf.namelist() == ["Fund_Info.csv", "Holdings.csv"]
+        assert zf.read("Holdings.csv").decode("utf-8").splitlines() == ["company,cost", "Acme,100"]
+
+
+def test_multi_sheet_parquet_uses_a_partitioned_layout():
+    _, content = write_output(MULTI_ROWS, MULTI, "parquet")
+    with zipfile.ZipFile(io.BytesIO(content)) as zf:
+        assert zf.namelist() == ["sheet=Fund_Info/part-0.parquet", "sheet=Holdings/part-0.parquet"]
+        frame = pd.read_parquet(io.BytesIO(zf.read("sheet=Holdings/part-0.parquet")))
+    assert frame.to_dict("records") == [{"company": "Acme", "cost": "100"}]
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        write_output(ROWS, FLAT, "xml")
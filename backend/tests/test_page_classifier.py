@@ -0,0 +1,57 @@
+from app.services.page_classifier import classify_pages, select_pages
+
+STATEMENT = """Statement of Assets and Liabilities
+Total assets $ 125,400,000
+Total liabilities $ 2,100,000
+Net asset value $ 123,300,000
+Partners' capital 123,300,000
+Unrealized gains 4,500,000
+Management fees (1,250,000)"""
+
+TOC = """Table of Contents
+Letter to Limited Partners ........ 2
+Statement of Operations ........ 4
+Schedule of Investments ........ 6
+Legal Notice ........ 12"""
+
+LEGAL = (
+    "This report is confidential and is not an offer or solicitation to buy any security in any jurisdiction. "
+    "Past performance is no guarantee of future results and no representation or warranty is made herein. "
+    "It may not be reproduced without the prior written consent of the general partner and includes "
+    "forward-looking statements subject to risk factors described in the prospectus."
+)
+
+LETTER = """Dear Partners,
+The partnership had a steady quarter.
+The manager continued to work closely with its teams
+on planning for the coming year."""
+
+BLANK = "   \n  Page intentionally left blank \n"
+
+
+def test_pages_are_labelled():
+    assert classify_pages([STATEMENT, TOC, LEGAL, BLANK, LETTER]) == ["financial_statement", "toc", "legal", "blank", "other"]
+
+
+def test_default_policy_drops_blank_and_toc_pages_and_demotes_legal():
+    pages = [TOC, LEGAL, STATEMENT, BLANK, LETTER]
+    selection = select_pages(pages, {"templateId": "t"})
+    assert selection.dropped == [0, 3]
+    assert selection.demoted == [1]
+    assert selection.order == [2, 4, 1]
+    assert selection.pages == [STATEMENT, LETTER, LEGAL]
+    assert selection.bytes_dropped == len(TOC.encode("utf-8")) + len(BLANK.encode("utf-8"))
+
+
+def test_template_page_filter_overrides_the_defaults():
+    pages = [TOC, LEGAL, STATEMENT]
+    selection = select_pages(pages, {"templateId": "t", "pageFilter": {"drop": ["legal"], "demote": []}})
+    assert selection.dropped == [1]
+    assert selection.order == [0, 2]
+
+
+def test_document_of_only_dropped_pages_is_passed_through():
+    pages = [TOC, BLANK]
+    selection = select_pages(pages, {"templateId": "t"})
+    assert selection.pages == pages
+    assert selection.dropped == [] and selection.bytes_dropped == 0
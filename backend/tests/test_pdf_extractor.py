@@ -0,0 +1,41 @@
+import asyncio
+
+from app.services import pdf_extractor
+from app.services.pdf_extractor import extract_pages, extract_pages_async
+from bench.synthetic import make_pdf
+
+
+def _counting(monkeypatch):
+    calls = []
+    count = pdf_extractor._count_pages
+
+    def counted(source, name):
+        calls.append(name)
+        return count(source, name)
+
+    monkeypatch.setattr(pdf_extractor, "_count_pages", counted)
+    return calls
+
+
+def test_pages_come_back_in_order():
+    result = extract_pages(make_pdf(3, seed=1), parallel=False)
+    assert [p.index for p in result.pages] == [0, 1, 2]
+    assert all("Quarterly Report" in p.text for p in result.pages)
+
+
+def test_async_extraction_counts_pages_once(monkeypatch):
+    monkeypatch.setenv("PDF_WORKERS", "1")
+    calls = _counting(monkeypatch)
+    result = asyncio.run(extract_pages_async(make_pdf(4, seed=2)))
+    assert len(result.page_texts) == 4
+    assert len(calls) == 1
+
+
+def test_given_page_count_is_not_rederived(monkeypatch):
+    calls = _counting(monkeypatch)
+    result = extract_pages(make_pdf(2, seed=3), "pymupdf", parallel=False, page_count=2)
+    assert len(result.pages) == 2 and calls == []
+
+
+def test_unreadable_document_gives_no_pages():
+    assert extract_pages(b"not a pdf", parallel=False).pages == []
@@ -0,0 +1,97 @@
+import asyncio
+import random
+
+import pytest
+
+from app.services import pipeline
+from app.services.pipeline import extract_rows_for_files, gather_bounded
+from bench.synthetic import FUNDS, make_pdf
+
+
+@pytest.fixture(autouse=True)
+def fresh_global_semaphore(monkeypatch):
+    # The process-wide bound is created on first use; each test runs its own event loop
+    monkeypatch.setattr(pipeline, "_global_semaphore", None)
+
+
+class Tracker:
+    def __init__(self):
+        self.running = 0
+        self.peak = 0
+
+    async def work(self, item):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await asyncio.sleep(random.uniform(0, 0.01))
+            return item * 10
+        finally:
+            self.running -= 1
+
+
+def test_results_keep_input_order():
+    tracker = Tracker()
+    assert asyncio.run(gather_bounded(list(range(20)), tracker.work, limit=5)) == [i * 10 for i in range(20)]
+
+
+def test_per_call_limit_bounds_concurrency():
+    tracker = Tracker()
+    asyncio.run(gather_bounded(list(range(12)), tracker.work, limit=3))
+    assert tracker.peak == 3
+
+
+def test_per_call_limit_defaults_to_setting(monkeypatch):
+    monkeypatch.setenv("EXTRACT_MAX_CONCURRENCY_PER_REQUEST", "2")
+    tracker = Tracker()
+    asyncio.run(gather_bounded(list(range(8)), tracker.work))
+    assert tracker.peak == 2
+
+
+def test_global_limit_bounds_concurrent_calls(monkeypatch):
+    monkeypatch.setenv("EXTRACT_MAX_CONCURRENCY", "3")
+    tracker = Tracker()
+
+    async def two_requests():
+        return await asyncio.gather(
+            gather_bounded(list(range(6)), tracker.work, limit=4),
+            gather_bounded(list(range(6)), tracker.work, limit=4),
+        )
+
+    first, second = asyncio.run(two_requests())
+    assert first == second == [i * 10 for i in range(6)]
+    assert tracker.peak == 3
+
+
+def test_worker_errors_propagate():
+    async def worker(item):
+        if item == 2:
+            raise ValueError("bad file")
+        return item
+
+    with pytest.raises(ValueError, match="bad file"):
+        asyncio.run(gather_bounded([0, 1, 2, 3], worker, limit=2))
+
+
+def test_rows_from_several_files_keep_file_order(monkeypatch):
+    monkeypatch.setenv("MOCK_LLM", "true")
+    template = {"templateId": "order", "fields": [{"key": "fund_name", "header": "Fund Name"}]}
+    files = [make_pdf(1, seed=i) for i in range(4)]
+    done = []
+
+    async def load(pdf):
+        return pdf
+
+    rows = asyncio.run(extract_rows_for_files(files, load, template, on_file_done=done.append))
+    assert [row["fund_name"].split(" - ")[0] for row in rows] == FUNDS[:4]
+    assert done == [1, 1, 1, 1]
+
+
+def test_first_result_only_templates_load_one_file():
+    loaded = []
+
+    async def load(pdf):
+        loaded.append(pdf)
+        return pdf
+
+    rows = asyncio.run(extract_rows_for_files([make_pdf(1, seed=0), make_pdf(1, seed=1)], load, {"templateId": "template1"}))
+    assert len(loaded) == 1 and rows
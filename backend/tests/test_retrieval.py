@@ -0,0 +1,58 @@
+from app.services.retrieval import FieldGroup, Passage, PassageIndex, Selection, field_groups, split_passages, tokenize
+
+PAGES = [
+    "Alpha Fund II\n\nQuarterly report to limited partners",
+    "Net asset value at quarter end was 12.4m\n\nManagement fee charged for the quarter",
+    "Legal notice\n\nThis report is confidential and for limited partners only",
+]
+
+
+def test_tokenize_drops_stopwords_and_single_characters():
+    assert tokenize("The NAV of a Fund, net 5%") == ["nav", "fund", "net"]
+
+
+def test_split_passages_packs_paragraphs_and_cuts_long_pages():
+    passages = split_passages(["one\n\ntwo", "x" * 10 + "\n" + "y" * 10], max_chars=12)
+    assert [(p.index, p.page, p.text) for p in passages] == [
+        (0, 0, "one\ntwo"),
+        (1, 1, "x" * 10),
+        (2, 1, "y" * 10),
+    ]
+
+
+def test_bm25_ranks_the_passage_naming_the_query_terms_first():
+    index = PassageIndex.from_pages(PAGES)
+    ranked = index.top_k(tokenize("net asset value"), 3)
+    assert ranked[0][0].text.startswith("Net asset value")
+    # Passages sharing no query term are left out rather than padded in with a zero score
+    assert all(score > 0 for _, score in ranked)
+    assert len(ranked) == 1
+
+
+def test_bm25_weights_rare_terms_above_common_ones():
+    index = PassageIndex.from_pages(PAGES)
+    scores = index.scores(["partners", "fee"])
+    # "fee" appears in one passage, "partners" in two, so the fee passage wins
+    assert max(range(len(scores)), key=lambda i: scores[i]) == 1
+
+
+def test_top_k_on_empty_index():
+    assert PassageIndex([]).top_k(["nav"], 3) == []
+
+
+def test_field_groups_slice_flat_templates_and_split_sheets():
+    flat = {"fields": [{"key": f"f{i}"} for i in range(5)]}
+    assert [len(g.fields) for g in field_groups(flat, 2)] == [2, 2, 1]
+    multi = {"multiSheet": True, "sheets": [{"name": "Fees", "fields": [{"key": "fee"}]}, {"name": "Empty", "fields": []}]}
+    assert [g.name for g in field_groups(multi, 2)] == ["Fees"]
+
+
+def test_sub_template_keeps_only_the_group_fields():
+    template = {"templateId": "t1", "fields": [{"key": "nav"}, {"key": "fee"}], "header": {"title": "x"}}
+    selection = Selection(FieldGroup("g", [{"key": "fee"}]))
+    assert selection.sub_template(template) == {"templateId": "t1", "fields": [{"key": "fee"}]}
+
+
+def test_selection_text_follows_document_order():
+    selection = Selection(FieldGroup("g", []), [(Passage(2, 1, "later"), 3.0), (Passage(0, 0, "earlier"), 1.0)])
+    assert selection.text == "[page 1]\nearlier\n\n[page 2]\nlater"
@@ -0,0 +1,57 @@
+from app.services.rules import RuleSet, extract_with_rules
+
+
+def _scan(specs, text):
+    return RuleSet(tuple(specs), specs).scan(text)
+
+
+def test_prefilter_skips_lines_and_keeps_matches():
+    specs = {
+        "fund_size": [{"regex": r"Fund Size:\s*(?P<value>.+)"}],
+        "currency": [{"type": "currency"}],
+    }
+    matches = _scan(specs, "Cover page\nFund Size: 120,000,000\nReported in USD")
+    assert matches["fund_size"].value == "120,000,000"
+    assert (matches["currency"].value, matches["currency"].line) == ("USD", 2)
+
+
+def test_more_preferred_rule_replaces_earlier_fallback():
+    specs = {"nav": [{"label": "Net Asset Value", "type": "amount"}, {"type": "amount"}]}
+    match = _scan(specs, "Called 1,000\nNet Asset Value: 5,250,000")["nav"]
+    assert (match.value, match.rule, match.confidence) == ("5,250,000", 0, 0.85)
+
+
+def test_numbered_backreferences_survive_the_combined_prefilter():
+    # Joined into one alternation, \1 of the second rule would point at the first rule's group
+    specs = {"a": [{"regex": r"(a)(b)\2"}], "b": [{"regex": r"(c)\1"}]}
+    matches = _scan(specs, "cc\nabb")
+    assert matches["a"].value == "abb" and matches["b"].value == "cc"
+
+
+def test_named_backreference_rule_is_checked_on_every_line():
+    specs = {"pair": [{"regex": r"(?P<w>zz)-(?P=w)"}], "amount": [{"type": "amount"}]}
+    matches = _scan(specs, "nothing here\nzz-zz\n1,000")
+    assert matches["pair"].line == 1 and matches["amount"].value == "1,000"
+
+
+def test_default_rules_apply_to_well_known_keys():
+    template = {"templateId": "t", "fields": [{"key": "contact_email", "header": "Contact"}, {"key": "report_date", "header": "Date"}]}
+    matches = extract_with_rules("Contact: ir@fund.example.com\nAs of 2025-06-30", template)
+    assert matches["contact_email"].value == "ir@fund.example.com"
+    assert matches["report_date"].value == "2025-06-30"
+    assert (matches["report_date"].start, matches["report_date"].end) == (6, 16)
+
+
+def test_first_currency_symbol_decides_when_no_code_is_given():
+    template = {"templateId": "t", "fields": [{"key": "currency", "header": "Currency"}]}
+    assert extract_with_rules("Fund size €120m\nFees paid $1.2m", template)["currency"].value == "EUR"
+    assert extract_with_rules("Fees £2m, notes $1m", template)["currency"].value == "GBP"
+    assert extract_with_rules("Fees paid $1.2m", template)["currency"].value == "USD"
+    # A currency code anywhere outranks the symbols
+    assert extract_with_rules("Fees paid $1.2m\nReported in eur", template)["currency"].value == "EUR"
+
+
+def test_map_translates_the_matched_text():
+    specs = {"status": [{"regex": r"\b(?:open|closed)\b", "flags": "i", "map": {"open": "Active"}}]}
+    assert _scan(specs, "Fund is open")["status"].value == "Active"
+    assert _scan(specs, "Fund is closed")["status"].value == "closed"
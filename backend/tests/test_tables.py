@@ -0,0 +1,77 @@
+import math
+
+from app.services.pdf_extractor import PdfTable
+from app.services.tables import map_tables, merge_table_rows, parse_numbers, remaining_template
+
+HOLDINGS = [
+    {"key": "company", "header": "Company"},
+    {"key": "cost", "header": "Cost"},
+    {"key": "fair_value", "header": "Fair Value"},
+]
+
+MULTI = {
+    "templateId": "soi",
+    "multiSheet": True,
+    "sheets": [
+        {"name": "Fund", "fields": [{"key": "fund_name", "header": "Fund Name"}, {"key": "nav", "header": "NAV"}]},
+        {"name": "Holdings", "fields": HOLDINGS},
+    ],
+}
+
+
+def _table(cells, page=0, top=100.0):
+    return PdfTable(page, (0.0, top, 500.0, top + 200.0), cells, "test")
+
+
+def test_parse_numbers_handles_financial_formats():
+    parsed = parse_numbers(["$1,234.50", "(2,000)", "-15", "12.5%", "EUR 3 000", "-", "—", "n/a", ""]).tolist()
+    assert parsed[:7] == [1234.5, -2000.0, -15.0, 12.5, 3000.0, 0.0, 0.0]
+    assert all(math.isnan(v) for v in parsed[7:])
+
+
+def test_table_under_a_title_row_maps_onto_its_sheet():
+    table = _table([
+        ["Schedule of Investments", "", ""],
+        ["Company", "Cost", "Fair Value"],
+        ["Acme Corp", "1,000", "$1,250"],
+        ["Beta LLC", "(500)", "-"],
+        ["", "", ""],
+    ])
+    mapping = map_tables([table], MULTI, min_coverage=0.5)
+    assert mapping.sections == ["Holdings"]
+    assert mapping.rows == [
+        {"company": "Acme Corp", "cost": 1000, "fair_value": 1250},
+        {"company": "Beta LLC", "cost": -500, "fair_value": 0},
+    ]
+    assert mapping.matches[0].columns == {"Company": "company", "Cost": "cost", "Fair Value": "fair_value"}
+    assert remaining_template(MULTI, mapping)["sheets"] == [MULTI["sheets"][0]]
+
+
+def test_tables_below_the_coverage_threshold_are_ignored():
+    table = _table([["Company", "Sector", "Country"], ["Acme Corp", "Industrials", "US"]])
+    mapping = map_tables([table], MULTI, min_coverage=0.5)
+    assert mapping.rows == [] and mapping.sections == []
+    assert remaining_template(MULTI, mapping) is MULTI
+
+
+def test_tables_are_read_in_page_order():
+    later = _table([["Company", "Cost"], ["Later Co", "2"]], page=1)
+    earlier = _table([["Company", "Cost"], ["Earlier Co", "1"]], page=0, top=400.0)
+    mapping = map_tables([later, earlier], MULTI, min_coverage=0.5)
+    assert [row["company"] for row in mapping.rows] == ["Earlier Co", "Later Co"]
+
+
+def test_flat_template_stays_with_the_llm_until_tables_name_every_field():
+    flat = {"templateId": "flat", "fields": HOLDINGS + [{"key": "fund_name", "header": "Fund Name"}]}
+    mapping = map_tables([_table([["Company", "Cost", "Fair Value"], ["Acme Corp", "1", "2"]])], flat, min_coverage=0.5)
+    assert mapping.sections == [None]
+    assert remaining_template(flat, mapping) is flat
+
+
+def test_merge_table_rows_fills_missing_fields_from_the_document_row():
+    rows = [{"company": "Acme Corp", "cost": 1000}, {"company": "Beta LLC", "cost": 500}]
+    document_row = {"fund_name": "Alpha Fund II", "company": "ignored"}
+    assert merge_table_rows(rows, document_row) == [
+        {"fund_name": "Alpha Fund II", "company": "Acme Corp", "cost": 1000},
+        {"fund_name": "Alpha Fund II", "company": "Beta LLC", "cost": 500},
+    ]
@@ -0,0 +1,37 @@
+import copy
+import pickle
+
+import pytest
+
+from app.services.templates import get_compiled, load_compiled_template, load_template
+
+
+def test_loaded_template_is_shared_and_compiled_once():
+    template = load_template("template2")
+    assert load_template("template2") is template
+    assert get_compiled(template) is load_compiled_template("template2")
+
+
+def test_loaded_template_cannot_be_mutated():
+    template = load_template("template2")
+    with pytest.raises(TypeError):
+        template["templateId"] = "changed"
+    with pytest.raises(TypeError):
+        template["fields"].append({"key": "extra", "header": "Extra"})
+    with pytest.raises(TypeError):
+        template["fields"][0]["key"] = "renamed"
+    assert load_template("template2")["fields"][0]["key"] != "renamed"
+
+
+def test_deepcopy_gives_a_mutable_dict():
+    template = load_template("template2")
+    mine = copy.deepcopy(template)
+    mine["fields"].append({"key": "extra", "header": "Extra"})
+    assert type(mine) is dict and type(mine["fields"]) is list
+    assert "extra" in get_compiled(mine).field_keys
+    assert "extra" not in get_compiled(template).field_keys
+
+
+def test_loaded_template_survives_pickling():
+    template = load_template("template2")
+    assert pickle.loads(pickle.dumps(template)) == template
@@ -0,0 +1,78 @@
+import asyncio
+import hashlib
+import os
+
+import pytest
+
+from app.services.uploads import UploadError, UploadTooLarge, spool_multipart
+
+BOUNDARY = "testboundary"
+
+
+class FakeRequest:
+    """Just enough of a Starlette request: headers and a chunked body stream."""
+
+    def __init__(self, body, chunk_size=1024, content_length=True, content_type=f"multipart/form-data; boundary={BOUNDARY}"):
+        self.headers = {"content-type": content_type}
+        if content_length:
+            self.headers["content-length"] = str(len(body))
+        self._body = body
+        self._chunk_size = chunk_size
+
+    async def stream(self):
+        for i in range(0, len(self._body), self._chunk_size):
+            yield self._body[i : i + self._chunk_size]
+
+
+def _multipart(files, fields=None):
+    parts = []
+    for name, value in (fields or {}).items():
+        parts.append(f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for filename, content in files:
+        head = f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="files"; filename="{filename}"\r\nContent-Type: application/pdf\r\n\r\n'
+        parts.append(head.encode() + content + b"\r\n")
+    return b"".join(parts) + f"--{BOUNDARY}--\r\n".encode()
+
+
+def _spool(request, spool_dir, **caps):
+    return asyncio.run(spool_multipart(request, spool_dir=str(spool_dir), **caps))
+
+
+def test_files_are_spooled_and_hashed(tmp_path):
+    pdf = b"%PDF-1.4 " + b"x" * 5000
+    form = _spool(FakeRequest(_multipart([("a.pdf", pdf)], {"template_id": "template1"})), tmp_path, max_file_bytes=10_000, max_request_bytes=100_000)
+    try:
+        assert form.fields == {"template_id": "template1"}
+        [upload] = form.files
+        assert (upload.filename, upload.size, upload.sha256) == ("a.pdf", len(pdf), hashlib.sha256(pdf).hexdigest())
+        with open(upload.path, "rb") as f:
+            assert f.read() == pdf
+    finally:
+        form.cleanup()
+
+
+def test_per_file_cap_rejects_and_cleans_the_spool(tmp_path):
+    body = _multipart([("small.pdf", b"x" * 100), ("big.pdf", b"x" * 5000)])
+    with pytest.raises(UploadTooLarge, match="big.pdf"):
+        _spool(FakeRequest(body), tmp_path, max_file_bytes=4096, max_request_bytes=0)
+    assert os.listdir(tmp_path) == []
+
+
+def test_declared_request_size_is_rejected_before_reading(tmp_path):
+    request = FakeRequest(_multipart([("a.pdf", b"x" * 5000)]))
+    request.stream = None  # reading the body would fail
+    with pytest.raises(UploadTooLarge, match="upload limit"):
+        _spool(request, tmp_path, max_file_bytes=0, max_request_bytes=4096)
+    assert os.listdir(tmp_path) == []
+
+
+def test_streamed_request_size_is_capped_without_content_length(tmp_path):
+    request = FakeRequest(_multipart([("a.pdf", b"x" * 3000), ("b.pdf", b"x" * 3000)]), content_length=False)
+    with pytest.raises(UploadTooLarge, match="upload limit"):
+        _spool(request, tmp_path, max_file_bytes=0, max_request_bytes=4096)
+    assert os.listdir(tmp_path) == []
+
+
+def test_non_multipart_request_is_rejected(tmp_path):
+    with pytest.raises(UploadError):
+        _spool(FakeRequest(b"{}", content_type="application/json"), tmp_path)